@@ -0,0 +1,4 @@
+"""Standalone performance benchmarks for the traffic simulation.
+
+Run each module from the repository root, e.g. ``python -m benchmarks.message_types``.
+"""
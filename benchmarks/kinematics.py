@@ -0,0 +1,81 @@
+"""
+Micro-benchmark: per-vehicle motion updates vs the vectorized FleetKinematics.
+
+Advances a synthetic fleet along random roads of the complete map, once with
+the scalar arithmetic VehicleAssistant._advance / update_coordinates does per
+agent and once with a single FleetKinematics.integrate() call per tick.
+
+Usage:
+    python -m benchmarks.kinematics [--vehicles N] [--ticks N]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from main import prepare_road_tuples
+from sim.kinematics import FleetKinematics, ROAD_END
+from sim.network import RoadNetwork
+
+
+class _Owner:
+    """Stand-in for a vehicle; road ends simply wrap around"""
+
+
+def build_fleet(network, count, seed):
+    rng = random.Random(seed)
+    kinematics = FleetKinematics(network, capacity=count)
+    for _ in range(count):
+        slot = kinematics.add(_Owner(), road=rng.randrange(len(network)))
+        kinematics.progress[slot] = rng.random() * 0.9
+    return kinematics
+
+
+def bench_scalar(network, kinematics, ticks):
+    """The per-agent arithmetic, one vehicle at a time"""
+    roads = network.roads
+    state = [[int(kinematics.road[i]), float(kinematics.progress[i]), 0.0, 0.0] for i in range(len(kinematics))]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for vehicle in state:
+            vehicle[1] += 0.05
+            if vehicle[1] >= ROAD_END:
+                vehicle[1] = 0.0
+            x1, y1, x2, y2 = roads[vehicle[0]][:4]
+            vehicle[2] = x1 + (x2 - x1) * vehicle[1]
+            vehicle[3] = y1 + (y2 - y1) * vehicle[1]
+    return time.perf_counter() - start
+
+
+def bench_vectorized(kinematics, ticks):
+    """One integrate() for the whole fleet per tick"""
+    n = len(kinematics)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        kinematics.pending[:n] = 1  # ADVANCE
+        road_ends, _ = kinematics.integrate()
+        kinematics.progress[road_ends] = 0.0
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare scalar and vectorized vehicle kinematics")
+    parser.add_argument("--vehicles", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--map", default="map_config.json")
+    args = parser.parse_args(argv)
+
+    with open(args.map) as f:
+        network = RoadNetwork(prepare_road_tuples(json.load(f)["roads"]))
+
+    scalar_s = bench_scalar(network, build_fleet(network, args.vehicles, 1), args.ticks)
+    vector_s = bench_vectorized(build_fleet(network, args.vehicles, 1), args.ticks)
+    per_tick = lambda seconds: seconds / args.ticks * 1e3
+    print(f"{args.vehicles} vehicles, {args.ticks} ticks")
+    print(f"scalar      {per_tick(scalar_s):8.3f} ms/tick")
+    print(f"vectorized  {per_tick(vector_s):8.3f} ms/tick   x{scalar_s / vector_s:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark: pydantic MyMessageType vs the slotted simulation messages.
+
+Measures per-message construction cost, serializer round-trips and a full
+send_message request/response through a SingleThreadedAgentRuntime, which is
+the path every vehicle step takes.
+
+Usage:
+    python -m benchmarks.message_types [--count N]
+"""
+
+import argparse
+import asyncio
+import time
+import timeit
+
+from autogen_core import (
+    AgentId, MessageContext, RoutedAgent, SingleThreadedAgentRuntime,
+    message_handler, try_get_known_serializers_for_type
+)
+
+from messages.types import MyMessageType, StateQuery, LightState
+
+
+class EchoAgent(RoutedAgent):
+    """Answers both message flavours the way a traffic light does"""
+
+    def __init__(self):
+        super().__init__("echo")
+
+    @message_handler
+    async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
+        return MyMessageType(content="RED", source="light")
+
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> LightState:
+        return LightState(light_id="light", state="RED")
+
+
+def per_call_us(seconds, count):
+    return seconds / count * 1e6
+
+
+def bench_construction(count):
+    """Time building one request and one reply"""
+    pydantic_s = timeit.timeit(
+        lambda: (MyMessageType(content="request_state", source="vehicle_1"),
+                 MyMessageType(content="RED", source="light")),
+        number=count)
+    slotted_s = timeit.timeit(
+        lambda: (StateQuery(source="vehicle_1"), LightState(light_id="light", state="RED")),
+        number=count)
+    return pydantic_s, slotted_s
+
+
+def bench_serialization(count):
+    """Time a serialize/deserialize round-trip with the runtime's serializers"""
+    results = []
+    for message in (MyMessageType(content="request_state", source="vehicle_1"), StateQuery(source="vehicle_1")):
+        serializer = try_get_known_serializers_for_type(type(message))[0]
+        results.append(timeit.timeit(
+            lambda: serializer.deserialize(serializer.serialize(message)),
+            number=count))
+    return tuple(results)
+
+
+async def bench_send_message(count):
+    """Time a request/response through the runtime"""
+    runtime = SingleThreadedAgentRuntime()
+    await EchoAgent.register(runtime, "echo", EchoAgent)
+    runtime.start()
+    target = AgentId("echo", "default")
+    results = []
+    try:
+        for make in (lambda: MyMessageType(content="request_state", source="vehicle_1"),
+                     lambda: StateQuery(source="vehicle_1")):
+            start = time.perf_counter()
+            for _ in range(count):
+                await runtime.send_message(make(), target)
+            results.append(time.perf_counter() - start)
+    finally:
+        await runtime.stop()
+    return tuple(results)
+
+
+def report(label, count, pydantic_s, slotted_s):
+    print(f"{label:<24} pydantic {per_call_us(pydantic_s, count):8.2f} us   "
+          f"slotted {per_call_us(slotted_s, count):8.2f} us   "
+          f"x{pydantic_s / slotted_s:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare message type overhead")
+    parser.add_argument("--count", type=int, default=100000,
+                        help="Messages per measurement (send_message uses a tenth of this)")
+    args = parser.parse_args(argv)
+
+    print(f"Per-message cost ({args.count} iterations)")
+    report("construct request+reply", args.count, *bench_construction(args.count))
+    report("serializer round-trip", args.count, *bench_serialization(args.count))
+    sends = max(1, args.count // 10)
+    report("send_message round-trip", sends, *asyncio.run(bench_send_message(sends)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Benchmark suite: the full main.py pipeline, headless, on a ladder of scenarios.
+
+Each scenario runs in its own process, so its peak RSS is measured alone. The
+ladder goes from the bundled maps up to generated cities (see sim/mapgen.py)
+with thousands of vehicles. Every run records:
+- startup time: from main() starting until the first step;
+- wall time per simulated step;
+- runtime messages (sends plus publishes) per step and per second, and the
+  handler invocations they cause (deliveries) per step;
+- peak RSS.
+
+Results are written as JSON and can be compared against a stored baseline.
+A metric counts as a regression, and makes the suite exit with status 1,
+when it got worse by more than its tolerance plus the run-to-run spread seen
+in the baseline and in the new run. Timings on a shared machine easily move
+by a quarter between identical runs, so they get looser tolerances than the
+message counts, which are deterministic for a given seed.
+
+Usage:
+    python -m benchmarks.suite [--quick] [--scenarios a,b] [--repeat N]
+    python -m benchmarks.suite --output results.json --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# name -> main.py arguments, simulated steps and, for generated cities, the sim.mapgen spec
+SCENARIOS = {
+    "basic": {"args": ["basic"], "steps": 300},
+    "complete": {"args": ["complete"], "steps": 300},
+    "complete_rl": {"args": ["complete", "--use-rl"], "steps": 300},
+    "complete_demand": {"args": ["complete", "--demand-rate", "4", "--demand-seed", "1"], "steps": 300},
+    "grid_1k_100": {"map": {"layout": "grid", "roads": 1000, "vehicles": 100}, "steps": 200},
+    "radial_1k_100": {"map": {"layout": "radial", "roads": 1000, "vehicles": 100}, "steps": 200},
+    "grid_1k_1000": {"map": {"layout": "grid", "roads": 1000, "vehicles": 1000}, "steps": 100},
+    "grid_10k_2000": {"map": {"layout": "grid", "roads": 10000, "vehicles": 2000}, "steps": 50},
+}
+QUICK = ("basic", "complete", "grid_1k_100")
+
+# Metrics compared against the baseline; all of them are better when lower
+COMPARED = ("step_ms", "startup_s", "messages_per_step", "deliveries_per_step", "peak_rss_mb")
+
+# metric -> (relative tolerance, smallest absolute change that can count as a regression)
+TOLERANCES = {
+    "step_ms": (0.25, 0.25),
+    "startup_s": (0.25, 0.2),
+    "messages_per_step": (0.05, 0.0),
+    "deliveries_per_step": (0.05, 0.0),
+    "peak_rss_mb": (0.15, 5.0),
+}
+
+# Fewest runs per scenario when comparing with a baseline: a single run has no spread to go by
+MIN_REPEAT = 3
+
+
+def generate_map(spec, directory, seed=0):
+    """Write the generated city for `spec` into `directory` and return its path"""
+    from sim.mapgen import grid_city, radial_city, size_for_roads
+
+    path = os.path.join(directory, f"{spec['layout']}_{spec['roads']}_{spec['vehicles']}_{seed}.json")
+    if not os.path.exists(path):
+        a, b = size_for_roads(spec["layout"], spec["roads"])
+        build = grid_city if spec["layout"] == "grid" else radial_city
+        with open(path, "w") as f:
+            json.dump(build(a, b, seed=seed, vehicles=spec["vehicles"]), f)
+    return path
+
+
+def run_worker(argv, seed):
+    """Run main.main(argv) in this process and return its measurements"""
+    import main as simulation
+
+    random.seed(seed)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stats = asyncio.run(simulation.main(argv, headless=True))
+    steps = max(stats["steps"], 1)
+    messages = stats["messages"]
+    total = messages["sent"] + messages["published"]
+    return {
+        "startup_s": stats["startup_time"],
+        "run_s": stats["run_time"],
+        "steps": stats["steps"],
+        "step_ms": stats["run_time"] * 1e3 / steps,
+        "steps_per_sec": steps / stats["run_time"] if stats["run_time"] else 0.0,
+        "messages": total,
+        "messages_per_step": total / steps,
+        "messages_per_sec": total / stats["run_time"] if stats["run_time"] else 0.0,
+        "deliveries_per_step": messages["deliveries"] / steps,
+        "replies": messages["responses"],
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "vehicles_entered": stats["vehicles_entered"],
+        "vehicles_exited": stats["vehicles_exited"],
+    }
+
+
+def scenario_argv(scenario, map_dir, seed=0):
+    argv = list(scenario.get("args", []))
+    if "map" in scenario:
+        argv += ["--config", generate_map(scenario["map"], map_dir, seed)]
+    argv += ["--headless", "--real-time-factor", "0", "--sim-time", str(scenario["steps"]),
+             "--count-messages", "--log-level", "OFF"]
+    return argv
+
+
+def run_scenario(name, scenario, map_dir, repeat=1, seed=0, timeout=None):
+    """Run a scenario `repeat` times in fresh processes
+
+    Returns:
+        dict: Median of every metric, plus "spread": the relative range
+        ((max - min) / median) of each compared metric over the runs
+    """
+    runs = []
+    for _ in range(repeat):
+        command = [sys.executable, "-m", "benchmarks.suite", "--worker", json.dumps(scenario_argv(scenario, map_dir, seed)),
+                   "--seed", str(seed)]
+        done = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        if done.returncode != 0:
+            raise RuntimeError(f"Scenario {name} failed:\n{done.stderr[-2000:]}")
+        runs.append(json.loads(done.stdout.strip().splitlines()[-1]))
+    metrics = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+    metrics["spread"] = {
+        metric: (max(run[metric] for run in runs) - min(run[metric] for run in runs)) / metrics[metric]
+        if metrics[metric] else 0.0
+        for metric in COMPARED
+    }
+    return metrics
+
+
+def compare(results, baseline, tolerance=None):
+    """Compare results with a baseline
+
+    A change counts when it is larger than the metric's tolerance plus the
+    spread of that metric over the runs of the baseline and of the results,
+    and larger than the metric's absolute minimum (see TOLERANCES).
+
+    Args:
+        results (dict): Scenario name -> metrics, as returned by run_scenario
+        baseline (dict): A results file written by this suite
+        tolerance (float): Relative tolerance for every metric instead of the per-metric ones
+
+    Returns:
+        list: (scenario, metric, baseline value, new value, relative change) of every regression
+    """
+    regressions = []
+    print(f"\n{'scenario':<18}{'metric':<20}{'baseline':>12}{'now':>12}{'change':>9}{'allowed':>9}")
+    for name, metrics in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            print(f"{name:<18}(not in baseline)")
+            continue
+        for metric in COMPARED:
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            relative, absolute = TOLERANCES[metric]
+            if tolerance is not None:
+                relative = tolerance
+            # Baselines from before the spread was recorded count as noiseless
+            allowed = relative + base.get("spread", {}).get(metric, 0.0) + metrics.get("spread", {}).get(metric, 0.0)
+            change = (new - old) / old
+            flag = ""
+            if change > allowed and new - old > absolute:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, old, new, change))
+            elif change < -allowed and old - new > absolute:
+                flag = "  improved"
+            print(f"{name:<18}{metric:<20}{old:>12.2f}{new:>12.2f}{change:>+9.1%}{allowed:>9.0%}{flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the simulation benchmark ladder and compare with a baseline")
+    parser.add_argument("--scenarios", default=None, help=f"Comma separated scenario names (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--quick", action="store_true", help=f"Only run {', '.join(QUICK)}")
+    parser.add_argument("--repeat", type=int, default=MIN_REPEAT,
+                        help=f"Runs per scenario; the median of each metric is kept (at least {MIN_REPEAT} with --quick or --baseline)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated maps and of the vehicles' random choices")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds before a scenario run is abandoned")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help=f"Compare with this results file (e.g. {os.path.relpath(BASELINE)})")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store the results as the new baseline ({os.path.relpath(BASELINE)})")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Relative slowdown/growth that counts as a regression for every metric "
+                             "(default: per metric, 25%% for timings)")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_worker(json.loads(args.worker), args.seed)))
+        return 0
+
+    names = args.scenarios.split(",") if args.scenarios else list(QUICK if args.quick else SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    if (args.quick or args.baseline or args.save_baseline) and args.repeat < MIN_REPEAT:
+        print(f"Running {MIN_REPEAT} repeats per scenario: comparisons need the spread of several runs")
+        args.repeat = MIN_REPEAT
+
+    results = {}
+    print(f"{'scenario':<18}{'startup s':>10}{'ms/step':>10}{'steps/s':>10}{'msgs/step':>11}{'msgs/s':>10}{'RSS MB':>9}")
+    with tempfile.TemporaryDirectory(prefix="traffic_bench_") as map_dir:
+        for name in names:
+            metrics = run_scenario(name, SCENARIOS[name], map_dir, args.repeat, args.seed, args.timeout)
+            results[name] = metrics
+            print(f"{name:<18}{metrics['startup_s']:>10.2f}{metrics['step_ms']:>10.2f}{metrics['steps_per_sec']:>10.1f}"
+                  f"{metrics['messages_per_step']:>11.1f}{metrics['messages_per_sec']:>10.0f}{metrics['peak_rss_mb']:>9.1f}")
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "scenarios": results,
+    }
+    for path in filter(None, (args.output, BASELINE if args.save_baseline else None)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond the allowed change")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark: steps/sec of the vehicle tick broadcast versus fleet size.
+
+Registers N vehicles on the complete map (no lights, crossings or parking,
+so only message dispatch and driving are measured), lets them all enter and
+times broadcast_tick in each tick mode.
+
+Usage:
+    python -m benchmarks.tick_broadcast [--sizes 10,100,1000] [--steps N]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from autogen_core import AgentId, TypeSubscription
+
+from main import TICK_MODES, TICK_TOPIC, broadcast_tick, prepare_road_tuples, register_vehicles
+from runtime import setup_runtime
+from sim.clock import SimulationClock, set_clock
+from sim.controls import ControlIndex, ControlStateTable
+from sim.network import RoadNetwork
+from sim.occupancy import RoadOccupancy
+
+
+async def measure(config, size, steps, mode):
+    """Return steps/sec for `size` vehicles"""
+    random.seed(0)
+    clock = set_clock(SimulationClock(real_time_factor=0))
+    network = RoadNetwork(prepare_road_tuples(config["roads"]))
+    runtime, _, _, _ = await setup_runtime()
+    runtime.start()
+    vehicles_config = [{"id": f"bench_{size}_{i}", "spawn": True} for i in range(size)]
+    vehicles = await register_vehicles(
+        runtime, vehicles_config, network, [], [], [], None, config.get("spawn_points", []),
+        RoadOccupancy(network), ControlIndex(network, [], []), ControlStateTable()
+    )
+    for _, agent in vehicles:
+        agent.parking_desire = 0
+        agent.enter_environment()
+        await runtime.add_subscription(TypeSubscription(TICK_TOPIC, agent.name))
+    recipients = [AgentId(vehicle_id, "default") for vehicle_id, _ in vehicles]
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        await broadcast_tick(runtime, recipients, mode)
+        await clock.advance(0.1)
+    elapsed = time.perf_counter() - start
+
+    clock.cancel_all()
+    await runtime.stop()
+    return steps / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tick broadcast steps/sec vs fleet size")
+    parser.add_argument("--sizes", default="10,100,1000",
+                        help="Comma separated fleet sizes")
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--map", default="map_config.json")
+    args = parser.parse_args(argv)
+
+    with open(args.map) as f:
+        config = json.load(f)
+
+    modes = tuple(reversed(TICK_MODES))
+    print(f"{'vehicles':>8}" + "".join(f"  {mode:>12}" for mode in modes) + "  (steps/sec)")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rates = [asyncio.run(measure(config, size, args.steps, mode)) for mode in modes]
+        print(f"{size:>8}" + "".join(f"  {rate:>12.1f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,46 +6,66 @@ and the main simulation loop.
 """
 
 import asyncio
+import functools
 import json
 import sys
 import argparse
-import io
 import datetime
+import logging
 import os
-from contextlib import redirect_stdout
-from autogen_core import AgentId
-from messages.types import MyMessageType
-from runtime import setup_runtime
-from vis.simui import (
-    TrafficSimulationVisualizer,
-    VehicleObject,
-    TrafficLightObject,
-    PedestrianCrossingObject,
-    RoadObject,
-    ParkingAreaObject
-)
+import time
+from autogen_core import AgentId, TopicId, TypeSubscription
+from messages.types import Move
+from runtime import MessageAccounting, message_queue, setup_runtime
+from sim.clock import SimulationClock, set_clock
+from sim.network import RoadNetwork
+from sim.occupancy import RoadOccupancy
+from sim.controls import ControlIndex, ControlStateTable, StateQueryCache
+from sim.parking import ParkingIndex
+from sim.routing import RoutePlanner
+from sim.congestion import TravelTimeEstimator
+from sim.spawning import DemandModel, VehiclePool
+from sim.kinematics import FleetKinematics
+from sim.active import ActiveSet
+from sim.profiling import HandlerProfiler, set_profiler
+from sim.stats import SimulationStats, set_stats
+from sim.trajectory import TrajectoryRecorder
+from sim.log import get_logger, configure_logging, shutdown_logging, parse_level, parse_levels
 from traffic_agents import (
     VehicleAssistant, 
     TrafficLightAssistant,
     TrafficLightRLAssistant,  # Import the RL traffic light agent 
     PedestrianCrossingAssistant,
     PedestrianCrossingRLAssistant,  # Import the RL pedestrian crossing agent
-    ParkingAssistant
+    ParkingAssistant,
+    FleetVehicleAssistant,
+    LightGroupCoordinator
+)
+from traffic_agents.vehicle import MOVEMENT_STEP
+
+logger = get_logger("main")
+
+# (title, kind, metric) of the per-entity statistics tables printed after a run
+STATS_TABLES = (
+    ("Waits by Road", "road", "wait"),
+    ("Waits by Traffic Light", "light", "wait"),
+    ("Waits by Pedestrian Crossing", "crossing", "wait"),
+    ("Crossing Occupation Times", "crossing", "occupied_time"),
+    ("Pedestrian Queues at Crossings", "crossing", "queue"),
 )
 
-# Track pedestrian crossing statistics for analysis
-crossing_stats = {
-    "queue_sizes": {},     # Track queue sizes over time
-    "occupation_times": {},  # Track how long crossings are occupied
-    "vehicle_waits": {}    # Track how long vehicles wait at each crossing
-}
 
+def parse_command_line_args(argv=None):
+    """Parse and return command-line arguments for the simulation
 
-def parse_command_line_args():
-    """Parse and return command-line arguments for the simulation"""
+    Args:
+        argv (list, optional): Argument list to parse instead of sys.argv
+    """
     parser = argparse.ArgumentParser(description='Traffic Simulation Parameters')
     parser.add_argument('mode', nargs='?', default='complete', choices=['basic', 'complete'], 
                         help='Simulation mode: basic (no parking) or complete')
+    parser.add_argument('--config', default=None,
+                        help='Map config file to load instead of the mode\'s default (e.g. one made by python -m sim.mapgen)')
     parser.add_argument('--sim-time', type=int, default=50, 
                         help='Total number of seconds/iterations to be simulated')
     parser.add_argument('--lane-capacity', type=int, default=None, 
@@ -66,19 +86,62 @@ def parse_command_line_args():
                         help='Exploration rate for RL agents (epsilon value)')
     parser.add_argument('--learning-rate', type=float, default=0.1, 
                         help='Learning rate for RL agents (alpha value)')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run without the Tkinter visualizer (batch mode for servers)')
+    parser.add_argument('--real-time-factor', type=float, default=1.0,
+                        help='Simulated seconds per wall-clock second (0 = as fast as possible)')
+    parser.add_argument('--kinematics', default='scalar', choices=['scalar', 'numpy'],
+                        help='Vehicle motion engine: per-agent (scalar) or vectorized over the fleet (numpy)')
+    parser.add_argument('--tick-mode', default='publish', choices=TICK_MODES,
+                        help='How each step\'s vehicle moves are delivered: one publish to the tick topic, '
+                             'gathered sends, or one awaited send per vehicle')
+    parser.add_argument('--routing', default='shortest', choices=['shortest', 'random'],
+                        help='Vehicle trips: shortest route to a despawn road, or random turns until a despawn fallback')
+    parser.add_argument('--control-states', default='push', choices=['push', 'query', 'direct'],
+                        help='How vehicles learn light/crossing states: read the states the controls push, '
+                             'poll them through a per-step reply cache, or send one query per check')
+    parser.add_argument('--demand-rate', type=float, default=None,
+                        help='Generate vehicles at every spawn point at this rate (vehicles per simulated minute, '
+                             'overrides the config\'s demand rate)')
+    parser.add_argument('--demand-seed', type=int, default=None,
+                        help='Seed of the demand model\'s random arrivals')
+    parser.add_argument('--count-messages', action='store_true',
+                        help='Account for every runtime message (by sender, recipient and command, with queue delay '
+                             'and handler time) and report the totals with the statistics')
+    parser.add_argument('--message-output', default=None,
+                        help='Write the message accounting, including per-step totals, to this JSON file '
+                             '(implies --count-messages)')
+    parser.add_argument('--profile-handlers', action='store_true',
+                        help='Time every agent message handler and print the hottest ones with the statistics')
+    parser.add_argument('--profile-output', default=None,
+                        help='Write the handler profile to this JSON file (implies --profile-handlers)')
+    parser.add_argument('--stats-output', default=None,
+                        help='Write the per-vehicle, road, light and crossing statistics to this JSON file')
+    parser.add_argument('--trajectory-output', default=None,
+                        help='Record every vehicle\'s road, progress, position and parking state at every step '
+                             'to this binary file (read it with python -m sim.trajectory)')
+    parser.add_argument('--trajectory-delta', action='store_true',
+                        help='Only record vehicle states that changed since the previous step, plus periodic keyframes')
+    parser.add_argument('--log-level', type=parse_level, default='WARNING',
+                        help='Default log level for all subsystems (DEBUG, INFO, WARNING, ERROR, OFF)')
+    parser.add_argument('--log-levels', type=parse_levels, default={},
+                        help='Per-subsystem overrides, e.g. vehicle=DEBUG,parking=OFF')
     
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def load_and_override_config(args):
     """Load configuration file and apply command-line overrides"""
     # Choose config file based on simulation mode
-    if args.mode == "basic":
+    if args.config:
+        config_file = args.config
+        logger.info("Using map config %s", config_file)
+    elif args.mode == "basic":
         config_file = "basic_map_config.json"
-        print("Using basic traffic scenario without parking areas")
+        logger.info("Using basic traffic scenario without parking areas")
     else:
         config_file = "map_config.json"
-        print("Using complete traffic scenario with parking areas")
+        logger.info("Using complete traffic scenario with parking areas")
         
     # Load map config
     with open(config_file) as f:
@@ -86,12 +149,12 @@ def load_and_override_config(args):
 
     # Apply command-line overrides to config
     if args.lane_capacity:
-        print(f"Overriding lane capacity to {args.lane_capacity}")
+        logger.info("Overriding lane capacity to %s", args.lane_capacity)
         for road in config.get("roads", []):
             road["capacity"] = args.lane_capacity
     
     if args.parking_capacity and "parking_areas" in config:
-        print(f"Overriding parking capacity to {args.parking_capacity}")
+        logger.info("Overriding parking capacity to %s", args.parking_capacity)
         for parking in config.get("parking_areas", []):
              if parking.get("type") == "building":
                  parking["capacity"] = args.parking_capacity * 2
@@ -99,14 +162,18 @@ def load_and_override_config(args):
                  parking["capacity"] = args.parking_capacity
             
     if args.parking_time and "parking_areas" in config:
-        print(f"Overriding parking time to {args.parking_time}")
+        logger.info("Overriding parking time to %s", args.parking_time)
         for parking in config.get("parking_areas", []):
             parking["parking_time"] = args.parking_time
             
     if args.exit_time and "parking_areas" in config:
-        print(f"Overriding parking exit time to {args.exit_time}")
+        logger.info("Overriding parking exit time to %s", args.exit_time)
         for parking in config.get("parking_areas", []):
             parking["exit_time"] = args.exit_time
+
+    if args.demand_rate is not None:
+        logger.info("Overriding demand rate to %s vehicles/minute per spawn point", args.demand_rate)
+        config.setdefault("demand", {})["rate"] = args.demand_rate
             
     return config
 
@@ -136,7 +203,7 @@ def prepare_road_tuples(raw_roads):
                 if conn_id in road_id_map:
                     connections.append(road_id_map[conn_id])
                 else:
-                    print(f"Warning: Road {road_id} has connection to unknown road ID: {conn_id}")
+                    logger.warning("Road %s has connection to unknown road ID: %s", road_id, conn_id)
         
         # Create enhanced road tuple with all properties and resolved connections
         road_tuple = (r["x1"], r["y1"], r["x2"], r["y2"], capacity, road_id, 
@@ -146,9 +213,15 @@ def prepare_road_tuples(raw_roads):
     return road_tuples
 
 
-async def initialize_visualizer(raw_roads):
-    """Create and initialize the traffic simulation visualizer"""
-    visualizer = TrafficSimulationVisualizer()
+async def initialize_visualizer(raw_roads, occupancy=None):
+    """Create and initialize the traffic simulation visualizer
+
+    Road vehicle counts are read from `occupancy` when it is given.
+    """
+    # Imported here so headless runs never load Tkinter
+    from vis.simui import TrafficSimulationVisualizer, RoadObject
+
+    visualizer = TrafficSimulationVisualizer(occupancy=occupancy)
 
     # Draw roads first
     for r in raw_roads:
@@ -165,8 +238,11 @@ async def initialize_visualizer(raw_roads):
     return visualizer
 
 
-async def register_parking_areas(runtime, parking_areas, visualizer, use_rl=False, epsilon=0.1, learning_rate=None):
-    """Register and visualize parking area agents"""
+async def register_parking_areas(runtime, parking_areas, visualizer, use_rl=False, epsilon=0.1, learning_rate=None, parking_index=None):
+    """Register and visualize parking area agents (visualizer may be None when headless)
+
+    Every parking agent publishes its occupancy to the shared `parking_index`, if given.
+    """
     parking_agents = []
     from traffic_agents import ParkingRLAssistant
     for p in parking_areas:
@@ -177,38 +253,113 @@ async def register_parking_areas(runtime, parking_areas, visualizer, use_rl=Fals
                     p["id"],
                     lambda name=p["id"], x=p["x"], y=p["y"], capacity=p["capacity"], \
                            parking_time=p.get("parking_time", 2), exit_time=p.get("exit_time", 1):
-                        ParkingRLAssistant(name, x, y, capacity, parking_time, exit_time, epsilon=epsilon, learning_rate=learning_rate)
+                        ParkingRLAssistant(name, x, y, capacity, parking_time, exit_time, epsilon=epsilon, learning_rate=learning_rate,
+                                           parking_index=parking_index)
                 )
-                print(f"Registered RL Parking Agent: {p['id']}")
+                logger.info("Registered RL Parking Agent: %s", p['id'])
             else:
                 await ParkingAssistant.register(
                     runtime,
                     p["id"],
                     lambda name=p["id"], x=p["x"], y=p["y"], capacity=p["capacity"], \
                            parking_time=p.get("parking_time", 2), exit_time=p.get("exit_time", 1):
-                        ParkingAssistant(name, x, y, capacity, parking_time, exit_time)
+                        ParkingAssistant(name, x, y, capacity, parking_time, exit_time, parking_index=parking_index)
                 )
         except ValueError:
             pass  # Agent already exists
         agent = await runtime._get_agent(AgentId(p["id"], "default"))
         parking_agents.append((p["id"], agent))
-        visualizer.add_object(ParkingAreaObject(
-            p["id"], agent, x=p["x"], y=p["y"],
-            parking_type=p.get("type", "street")
-        ))
+        if visualizer is not None:
+            from vis.simui import ParkingAreaObject
+            visualizer.add_object(ParkingAreaObject(
+                p["id"], agent, x=p["x"], y=p["y"],
+                parking_type=p.get("type", "street")
+            ))
     return parking_agents
 
 
-async def register_vehicles(runtime, vehicles_config, road_tuples, crossings, lights, parking_areas, visualizer, spawn_points):
-    """Register and visualize vehicle agents"""
+def vehicle_agent_setup(network, crossings, lights, parking_areas, occupancy=None, controls=None, control_states=None, kinematics=None, active_set=None, parking_index=None, route_planner=None, travel_times=None, pool=None, state_queries=None):
+    """Return the vehicle agent class and the constructor kwargs every vehicle shares
+
+    All vehicles share the same compiled RoadNetwork, RoadOccupancy,
+    ControlIndex, ControlStateTable and ParkingIndex by reference. When a FleetKinematics
+    engine is given, FleetVehicleAssistant agents keep their motion state in it.
+    Without a ControlStateTable, vehicles poll lights and crossings with
+    state queries, coalesced per step by `state_queries` if given.
+    With a RoutePlanner, vehicles drive shortest-route trips to a despawn road,
+    and report their time on each road to `travel_times`, if given.
+    Vehicles report parking and exits to `active_set` and return to `pool`, if given.
+    """
+    agent_class = VehicleAssistant if kinematics is None else FleetVehicleAssistant
+    agent_kwargs = {
+        "network": network,
+        "occupancy": occupancy,
+        "controls": controls,
+        "control_states": control_states,
+        "state_queries": state_queries,
+        "crossings": crossings,
+        "traffic_lights": lights,
+        "parking_areas": parking_areas,
+        "scheduler": active_set,
+        "parking_index": parking_index,
+        "route_planner": route_planner,
+        "travel_times": travel_times,
+        "pool": pool,
+    }
+    if kinematics is not None:
+        agent_kwargs["kinematics"] = kinematics
+    return agent_class, agent_kwargs
+
+
+async def register_vehicle(runtime, vehicle_id, position, start_x, start_y, agent_class, agent_kwargs, visualizer=None, registry=None):
+    """Register one vehicle agent starting at (start_x, start_y) on road `position` and return it
+
+    The vehicle has not entered the environment yet. It is added to the
+    shared collision `registry` and to the visualizer, if given.
+    """
+    try:
+        await agent_class.register(
+            runtime,
+            vehicle_id,
+            lambda name=vehicle_id, x=start_x, y=start_y, position=position: agent_class(
+                name,
+                current_position=position,
+                start_x=x,
+                start_y=y,
+                **agent_kwargs
+            )
+        )
+    except ValueError:
+        pass  # Agent already exists
+
+    agent = await runtime._get_agent(AgentId(vehicle_id, "default"))
+    agent.entered = False
+    agent.start_x = start_x
+    agent.start_y = start_y
+    if registry is not None:
+        registry[vehicle_id] = agent
+        agent.set_vehicle_registry(registry)
+    if visualizer is not None:
+        from vis.simui import VehicleObject
+        visualizer.add_object(VehicleObject(vehicle_id, agent, x=start_x, y=start_y))
+    return agent
+
+
+async def register_vehicles(runtime, vehicles_config, network, crossings, lights, parking_areas, visualizer, spawn_points, occupancy=None, controls=None, control_states=None, kinematics=None, active_set=None, parking_index=None, route_planner=None, travel_times=None, pool=None, state_queries=None):
+    """Register and visualize the vehicle agents listed in the config (visualizer may be None when headless)
+
+    See vehicle_agent_setup for what the vehicles share.
+    """
     vehicles = []
+    agent_class, agent_kwargs = vehicle_agent_setup(
+        network, crossings, lights, parking_areas, occupancy, controls, control_states,
+        kinematics, active_set, parking_index, route_planner, travel_times, pool, state_queries
+    )
+    # Shared registry for collision detection
+    vehicle_registry = {}
     
-    # Create a mapping of road IDs to their indices in the road_tuples list
-    road_id_to_index = {}
-    for i, road_tuple in enumerate(road_tuples):
-        if len(road_tuple) >= 6:  # Make sure the road has an ID
-            road_id = road_tuple[5]
-            road_id_to_index[road_id] = i
+    # Mapping of road IDs to their indices in the road network
+    road_id_to_index = network.road_index
     
     # Filter out any spawn points that don't match valid road IDs
     valid_spawn_points = []
@@ -216,12 +367,12 @@ async def register_vehicles(runtime, vehicles_config, road_tuples, crossings, li
         if "road_id" in sp and sp["road_id"] in road_id_to_index:
             valid_spawn_points.append(sp)
         else:
-            print(f"WARNING: Invalid spawn point {sp.get('id', 'unknown')} references nonexistent road: {sp.get('road_id', 'none')}")
+            logger.warning("Invalid spawn point %s references nonexistent road: %s", sp.get('id', 'unknown'), sp.get('road_id', 'none'))
     
     if not valid_spawn_points:
-        print("ERROR: No valid spawn points found! Vehicles may spawn at incorrect locations.")
+        logger.error("No valid spawn points found! Vehicles may spawn at incorrect locations.")
     else:
-        print(f"Found {len(valid_spawn_points)} valid spawn points: {[sp['id'] for sp in valid_spawn_points]}")
+        logger.info("Found %s valid spawn points: %s", len(valid_spawn_points), [sp['id'] for sp in valid_spawn_points])
     
     # Initialize spawn point rotation counter
     spawn_point_index = 0
@@ -242,48 +393,25 @@ async def register_vehicles(runtime, vehicles_config, road_tuples, crossings, li
             
             # Set the starting road position to the corresponding road index
             starting_position = road_id_to_index[spawn_point["road_id"]]
-            print(f"Vehicle {v['id']} spawning at {spawn_point['id']} on road {spawn_point['road_id']} (index: {starting_position})")
+            logger.debug("Vehicle %s spawning at %s on road %s (index: %s)", v['id'], spawn_point['id'], spawn_point['road_id'], starting_position)
         else:
             # For non-spawn vehicles, just use their configured position
-            print(f"Vehicle {v['id']} using fixed position (x: {start_x}, y: {start_y})")
+            logger.debug("Vehicle %s using fixed position (x: %s, y: %s)", v['id'], start_x, start_y)
         
-        try:
-            await VehicleAssistant.register(
-                runtime,
-                v["id"],
-                lambda name=v["id"], x=start_x, y=start_y, position=starting_position: VehicleAssistant(
-                    name,
-                    current_position=position,
-                    start_x=x,
-                    start_y=y,
-                    roads=road_tuples,
-                    crossings=crossings,
-                    traffic_lights=lights,
-                    parking_areas=parking_areas
-                )
-            )
-        except ValueError:
-            pass  # Agent already exists
-
-        agent = await runtime._get_agent(AgentId(v["id"], "default"))
-        agent.entered = False
-        agent.start_x = start_x
-        agent.start_y = start_y
+        agent = await register_vehicle(runtime, v["id"], starting_position, start_x, start_y,
+                                       agent_class, agent_kwargs, visualizer, vehicle_registry)
         vehicles.append((v["id"], agent))
-        visualizer.add_object(VehicleObject(v["id"], agent, x=start_x, y=start_y))
-    
-    # Create a registry for collision detection
-    vehicle_registry = {vehicle_id: agent for vehicle_id, agent in vehicles}
-    
-    # Register the vehicle_registry with each vehicle
-    for vehicle_id, agent in vehicles:
-        agent.set_vehicle_registry(vehicle_registry)
         
     return vehicles
 
 
-async def register_traffic_lights(runtime, lights, sim_params, visualizer, use_rl=False, epsilon=0.1, learning_rate=None):
-    """Register and visualize traffic light agents"""
+async def register_traffic_lights(runtime, lights, sim_params, visualizer, use_rl=False, epsilon=0.1, learning_rate=None, state_table=None,
+                                  coordinator=None):
+    """Register and visualize traffic light agents (visualizer may be None when headless)
+
+    Lights publish their state changes into `state_table`. Standard lights
+    switch in groups through `coordinator`, the run's LightGroupCoordinator.
+    """
     for tl in lights:
         try:
             if use_rl:
@@ -293,29 +421,37 @@ async def register_traffic_lights(runtime, lights, sim_params, visualizer, use_r
                     lambda name=tl["id"]: TrafficLightRLAssistant(
                         name,
                         epsilon=epsilon,
-                        learning_rate=learning_rate
+                        learning_rate=learning_rate,
+                        state_table=state_table
                     )
                 )
-                print(f"Registered RL Traffic Light Agent: {tl['id']}")
+                logger.info("Registered RL Traffic Light Agent: %s", tl['id'])
             else:
                 # Use standard traffic light agent
                 await TrafficLightAssistant.register(
                     runtime, tl["id"], 
                     lambda name=tl["id"]: TrafficLightAssistant(
                         name,
-                        change_time=sim_params.get("traffic_light_wait")
+                        change_time=sim_params.get("traffic_light_wait"),
+                        state_table=state_table,
+                        coordinator=coordinator
                     )
                 )
-                print(f"Registered Standard Traffic Light Agent: {tl['id']}")
+                logger.info("Registered Standard Traffic Light Agent: %s", tl['id'])
         except ValueError:
             pass  # Agent already exists
             
         agent = await runtime._get_agent(AgentId(tl["id"], "default"))
-        visualizer.add_object(TrafficLightObject(tl["id"], agent, x=tl["x"], y=tl["y"]))
+        if visualizer is not None:
+            from vis.simui import TrafficLightObject
+            visualizer.add_object(TrafficLightObject(tl["id"], agent, x=tl["x"], y=tl["y"]))
+
 
+async def register_pedestrian_crossings(runtime, crossings, sim_params, visualizer, use_rl=False, epsilon=0.1, learning_rate=None, state_table=None):
+    """Register and visualize pedestrian crossing agents (visualizer may be None when headless)
 
-async def register_pedestrian_crossings(runtime, crossings, sim_params, visualizer, use_rl=False, epsilon=0.1, learning_rate=None):
-    """Register and visualize pedestrian crossing agents"""
+    Crossings publish their occupied/free changes into `state_table`.
+    """
     for c in crossings:
         try:
             if use_rl:
@@ -327,86 +463,234 @@ async def register_pedestrian_crossings(runtime, crossings, sim_params, visualiz
                         name,
                         road_type=road_type,
                         epsilon=epsilon,
-                        learning_rate=learning_rate
+                        learning_rate=learning_rate,
+                        state_table=state_table
                     )
                 )
-                print(f"Registered RL Pedestrian Crossing Agent: {c['id']} for {road_type} road")
+                logger.info("Registered RL Pedestrian Crossing Agent: %s for %s road", c['id'], road_type)
             else:
                 # Use standard pedestrian crossing agent
                 await PedestrianCrossingAssistant.register(
                     runtime, c["id"], 
                     lambda name=c["id"]: PedestrianCrossingAssistant(
                         name,
-                        wait_time=sim_params.get("pedestrian_wait")
+                        wait_time=sim_params.get("pedestrian_wait"),
+                        state_table=state_table
                     )
                 )
-                print(f"Registered Standard Pedestrian Crossing Agent: {c['id']}")
+                logger.info("Registered Standard Pedestrian Crossing Agent: %s", c['id'])
         except ValueError:
             pass  # Agent already exists
             
         agent = await runtime._get_agent(AgentId(c["id"], "default"))
-        visualizer.add_object(PedestrianCrossingObject(c["id"], agent, x=c["x"], y=c["y"]))
-
+        if visualizer is not None:
+            from vis.simui import PedestrianCrossingObject
+            visualizer.add_object(PedestrianCrossingObject(c["id"], agent, x=c["x"], y=c["y"]))
+
+
+# Simulated seconds covered by one simulation step
+STEP_SECONDS = 0.1
+
+# Move carries no data and is frozen, so one instance serves every vehicle and step
+MOVE = Move()
+
+# Topic every vehicle subscribes to for the "publish" tick mode
+TICK_TOPIC = "tick"
+TICK_MODES = ("publish", "gather", "sequential")
+
+# Agent type prefix of the vehicles generated by the demand model
+DEMAND_VEHICLE_PREFIX = "demand_vehicle_"
+
+
+async def broadcast_tick(runtime, recipients, mode="publish"):
+    """Deliver one Move to every recipient and return once all have handled it
+
+    Modes:
+        publish: a single publish_message on the tick topic. The runtime fans
+            it out to every subscribed vehicle and runs their handlers
+            concurrently.
+        gather: one send_message per vehicle, all issued at once and gathered.
+        sequential: one awaited send_message after another (the old loop).
+
+    In every mode, returning is the step barrier: all Move handlers, and any
+    messages they sent, have finished before the next tick starts. In
+    publish mode the barrier is the runtime's message queue draining (see
+    runtime.message_queue); a runtime without one gets gathered sends instead.
+
+    Args:
+        runtime: The agent runtime
+        recipients (list): AgentIds of the vehicles to move. In publish mode
+            this must match the tick topic's subscribers.
+        mode (str): One of TICK_MODES
+
+    Returns:
+        int: Number of sends that raised (always 0 in publish mode, where
+            handler errors are logged by the runtime)
+    """
+    if mode == "publish":
+        queue = message_queue(runtime)
+        if queue is not None:
+            if recipients:
+                await runtime.publish_message(MOVE, TopicId(TICK_TOPIC, "default"))
+                await queue.join()
+            return 0
+        mode = "gather"  # nothing to wait on for a publish
+
+    if mode == "gather":
+        results = await asyncio.gather(
+            *(runtime.send_message(MOVE, recipient) for recipient in recipients),
+            return_exceptions=True
+        )
+    else:
+        results = []
+        for recipient in recipients:
+            try:
+                results.append(await runtime.send_message(MOVE, recipient))
+            except Exception as e:
+                results.append(e)
+
+    failures = 0
+    for recipient, result in zip(recipients, results):
+        if isinstance(result, BaseException):
+            failures += 1
+            logger.warning("Move to %s failed: %s", recipient.type, result)
+    return failures
+
+
+async def sync_tick_subscriptions(runtime, active_set, subscriptions):
+    """Mirror the active set's membership changes onto the tick topic
+
+    Args:
+        runtime: The agent runtime
+        active_set (ActiveSet): The scheduler whose changes are applied
+        subscriptions (dict): vehicle_id -> subscription id, updated in place
+    """
+    for vehicle_id, is_active in active_set.drain_changes().items():
+        if is_active and vehicle_id not in subscriptions:
+            subscription = TypeSubscription(TICK_TOPIC, vehicle_id)
+            await runtime.add_subscription(subscription)
+            subscriptions[vehicle_id] = subscription.id
+        elif not is_active and vehicle_id in subscriptions:
+            await runtime.remove_subscription(subscriptions.pop(vehicle_id))
+
+
+async def spawn_vehicles(demand, pool, active_set, network, now, create_vehicle):
+    """Generate this step's arrivals from the demand model and queue them to enter
+
+    Each arriving vehicle reuses an idle agent from `pool` when there is one;
+    otherwise `create_vehicle(vehicle_id, position, x, y)` registers a new agent.
+
+    Returns:
+        list: (vehicle_id, agent) of the vehicles spawned
+    """
+    spawned = []
+    for spawn_point in demand.arrivals(now, STEP_SECONDS):
+        position = network.road_index.get(spawn_point.get("road_id"))
+        if position is None:
+            continue
+        x, y = spawn_point["x"], spawn_point["y"]
+        agent = pool.acquire()
+        if agent is None:
+            agent = pool.add(await create_vehicle(f"{DEMAND_VEHICLE_PREFIX}{pool.size}", position, x, y))
+        else:
+            agent.respawn(position, x, y)
+        active_set.enqueue(agent.name, agent)
+        spawned.append((agent.name, agent))
+        logger.debug("Spawned %s at %s", agent.name, spawn_point.get("id"))
+    return spawned
+
+
+async def run_simulation(runtime, vehicles, simulation_steps, clock, kinematics=None, tick_mode="publish", active_set=None, spawn=None,
+                         message_accounting=None, recorder=None):
+    """Run the main simulation loop for the specified number of steps
+
+    Each step advances the shared simulation clock by STEP_SECONDS, which also
+    runs the traffic light, crossing and parking events that are due, in a
+    fixed order. With a
+    FleetKinematics engine, the motion queued by the vehicles is applied to
+    the whole fleet at once after they have all handled their Move message.
+
+    Only the vehicles in the ActiveSet are moved. Vehicles enter from its
+    entry queue, parked vehicles sleep until they are due to leave and exited
+    vehicles drop out, so a step costs O(moving vehicles). Moves are
+    delivered with broadcast_tick in `tick_mode`. The tick topic's
+    subscriptions follow the active set.
+
+    `spawn(now)`, if given, is awaited at the start of every step to queue
+    the vehicles generated by the demand model. `message_accounting`, if
+    given, has its per-step message totals closed at the end of every step.
+    `recorder`, if given, gets the state of every vehicle in the environment
+    once the step's moves are done.
+    """
+    if active_set is None:
+        active_set = ActiveSet()
+    for vehicle_id, agent in vehicles:
+        if not agent.entered:
+            active_set.enqueue(vehicle_id, agent)
+    subscriptions = {}
 
-async def run_simulation(runtime, vehicles, parking_areas, simulation_steps):
-    """Run the main simulation loop for the specified number of steps"""
     for i in range(simulation_steps):
-        print(f"Simulation step {i}/{simulation_steps}")
+        logger.debug("Simulation step %s/%s", i, simulation_steps)
 
-        for idx, (vehicle_id, agent) in enumerate(vehicles):
-            if agent.entered:
-                continue  # Skip already entered
+        if spawn is not None:
+            await spawn(clock.now)
 
-            if idx == 0 or (vehicles[idx - 1][1].x != vehicles[idx - 1][1].start_x or vehicles[idx - 1][1].y != vehicles[idx - 1][1].start_y):
-                agent.entered = True
-                print(f"{vehicle_id} has entered the environment.")
-                break 
+        entered = active_set.begin_step(i)
+        if entered is not None:
+            logger.info("%s has entered the environment.", entered)
         
-        # Every 10 steps, send a park command to the first vehicle, but only if using the parking scenario
-        if parking_areas and i > 0 and i % 10 == 0 and vehicles:
-            vehicle_id, _ = vehicles[0]
-            await runtime.send_message(
-                MyMessageType(content="park", source="user"),
-                AgentId(vehicle_id, "default")
-            )
-            print(f"Sent park command to {vehicle_id}")
-            
-        # Regular movement for all vehicles
-        for vehicle_id, agent in vehicles:
-            if agent.entered:
-                await runtime.send_message(
-                    MyMessageType(content="move", source="user"),
-                    AgentId(vehicle_id, "default")
-                )
-                print(f"Vehicle {vehicle_id} moved to coordinates ({agent.x}, {agent.y})")
+        # Regular movement for the active vehicles, with a barrier at the end of the step
+        await sync_tick_subscriptions(runtime, active_set, subscriptions)
+        await broadcast_tick(
+            runtime,
+            [AgentId(vehicle_id, "default") for vehicle_id in active_set.recipients()],
+            tick_mode
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for vehicle_id, agent in active_set.active.items():
+                logger.debug("Vehicle %s moved to coordinates (%s, %s)", vehicle_id, agent.x, agent.y)
+
+        if kinematics is not None:
+            await kinematics.step()
+        if recorder is not None:
+            recorder.record_step(i, active_set.members())
             
-        await asyncio.sleep(0.1)
+        await clock.advance(STEP_SECONDS)
+        if message_accounting is not None:
+            message_accounting.end_step()
 
 
-async def main():
-    """Main entry point for the traffic simulation"""
-    # Setup log capture
-    log_buffer = io.StringIO()
-    original_stdout = sys.stdout
-    
+async def main(argv=None, headless=False):
+    """Main entry point for the traffic simulation
+
+    Args:
+        argv (list, optional): Command-line arguments to use instead of sys.argv
+        headless (bool): Skip the Tkinter visualizer entirely; equivalent to --headless
+
+    Returns:
+        dict: The collected simulation statistics
+    """
     # Initialize statistics tracking
     simulation_stats = {
         "vehicles_entered": 0,
         "vehicles_exited": 0,
-        "wait_times": [],
         "start_time": datetime.datetime.now()
     }
+    started = time.perf_counter()
     
+    # Parse command-line arguments
+    args = parse_command_line_args(argv)
+    headless = headless or args.headless
+
+    # Stream log records to a rotating file under LOGS/ from a background thread
+    log_filename = configure_logging(args.log_level, args.log_levels)
+
+    clock = runtime = visualizer = visualizer_task = None
     try:
-        # Redirect stdout to our buffer
-        sys.stdout = log_writer = io.StringIO()
-        
-        # Parse command-line arguments
-        args = parse_command_line_args()
         
         # Print information about RL mode
         if args.use_rl:
-            print(f"Using Reinforcement Learning agents with epsilon={args.epsilon}, learning_rate={args.learning_rate}")
+            logger.info("Using Reinforcement Learning agents with epsilon=%s, learning_rate=%s", args.epsilon, args.learning_rate)
         
         # Load and override configuration
         config = load_and_override_config(args)
@@ -419,8 +703,23 @@ async def main():
         vehicles_config = config.get("vehicles", [])
         spawn_points = config.get("spawn_points", [])
 
-        # Convert roads to enhanced format
+        # Convert roads to enhanced format and compile the shared road network once
         road_tuples = prepare_road_tuples(raw_roads)
+        network = RoadNetwork(road_tuples)
+        occupancy = RoadOccupancy(network)
+        controls = ControlIndex(network, lights, crossings)
+        control_states = ControlStateTable()
+        # Vehicles read the pushed states, or poll the controls (optionally through the per-step cache)
+        vehicle_states = control_states if args.control_states == "push" else None
+        state_queries = StateQueryCache(control_states) if args.control_states == "query" else None
+        parking_index = ParkingIndex(parking_areas)
+        demand = DemandModel.from_config(config, spawn_points, seed=args.demand_seed)
+        pool = VehiclePool() if demand is not None else None
+        route_planner = RoutePlanner(network) if args.routing == "shortest" else None
+        # Congestion-aware re-routing: a road takes 1 / MOVEMENT_STEP steps at free flow
+        travel_times = TravelTimeEstimator(route_planner, STEP_SECONDS / MOVEMENT_STEP) if route_planner is not None else None
+        kinematics = FleetKinematics(network, capacity=len(vehicles_config)) if args.kinematics == "numpy" else None
+        active_set = ActiveSet()
         
         # Store simulation parameters for agents
         sim_params = {
@@ -428,34 +727,83 @@ async def main():
             "pedestrian_wait": args.pedestrian_wait
         }
             
+        # Install the shared simulation clock before any agent is created
+        clock = set_clock(SimulationClock(real_time_factor=args.real_time_factor))
+        # Standard traffic lights switch in groups on this run's clock
+        light_coordinator = LightGroupCoordinator(clock)
+        # Agents record waits, travel and state times into it as they happen
+        stats = set_stats(SimulationStats())
+
+        # Handlers are wrapped as the agents are created, so install the profiler first
+        profiler = None
+        if args.profile_handlers or args.profile_output:
+            profiler = set_profiler(HandlerProfiler())
+
         # Setup runtime
-        runtime, _, _, _ = await setup_runtime()
+        message_accounting = MessageAccounting() if args.count_messages or args.message_output else None
+        runtime, _, _, _ = await setup_runtime(message_accounting)
         runtime.start()
+        if profiler is not None:
+            profiler.attach(runtime)
         await asyncio.sleep(1)
 
-        # Initialize visualizer and components
-        visualizer = await initialize_visualizer(raw_roads)
+        # Initialize visualizer and components (skipped in headless mode)
+        visualizer = None if headless else await initialize_visualizer(raw_roads, occupancy)
         
         # Register all agent types
-        parking_agents = await register_parking_areas(runtime, parking_areas, visualizer, use_rl=args.use_rl, epsilon=args.epsilon, learning_rate=args.learning_rate)
-        vehicles = await register_vehicles(runtime, vehicles_config, road_tuples, crossings, lights, parking_areas, visualizer, spawn_points)
+        parking_agents = await register_parking_areas(runtime, parking_areas, visualizer, use_rl=args.use_rl, epsilon=args.epsilon, learning_rate=args.learning_rate,
+                                               parking_index=parking_index)
+        vehicles = await register_vehicles(runtime, vehicles_config, network, crossings, lights, parking_areas, visualizer, spawn_points,
+                                           occupancy, controls, vehicle_states, kinematics, active_set, parking_index,
+                                           route_planner, travel_times, pool, state_queries)
+
+        # Vehicles generated on the fly reuse the agents of vehicles that left
+        spawn = None
+        if demand is not None:
+            agent_class, agent_kwargs = vehicle_agent_setup(
+                network, crossings, lights, parking_areas, occupancy, controls, vehicle_states,
+                kinematics, active_set, parking_index, route_planner, travel_times, pool, state_queries
+            )
+            vehicle_registry = vehicles[0][1].vehicle_registry if vehicles else {}
+
+            async def create_vehicle(vehicle_id, position, x, y):
+                agent = await register_vehicle(runtime, vehicle_id, position, x, y,
+                                               agent_class, agent_kwargs, visualizer, vehicle_registry)
+                vehicles.append((vehicle_id, agent))
+                return agent
+
+            spawn = functools.partial(spawn_vehicles, demand, pool, active_set, network, create_vehicle=create_vehicle)
         
         # Register traffic lights and pedestrian crossings with RL agents if specified
         await register_traffic_lights(
             runtime, lights, sim_params, visualizer, 
-            use_rl=args.use_rl, epsilon=args.epsilon, learning_rate=args.learning_rate
+            use_rl=args.use_rl, epsilon=args.epsilon, learning_rate=args.learning_rate,
+            state_table=control_states, coordinator=light_coordinator
         )
         
         await register_pedestrian_crossings(
             runtime, crossings, sim_params, visualizer, 
-            use_rl=args.use_rl, epsilon=args.epsilon, learning_rate=args.learning_rate
+            use_rl=args.use_rl, epsilon=args.epsilon, learning_rate=args.learning_rate,
+            state_table=control_states
         )
 
         # Launch visualizer
-        visualizer_task = asyncio.create_task(visualizer.run())
+        if visualizer is not None:
+            visualizer_task = asyncio.create_task(visualizer.run())
+
+        recorder = None
+        if args.trajectory_output:
+            recorder = TrajectoryRecorder(args.trajectory_output, road_ids=[road[5] for road in network.roads],
+                                          delta=args.trajectory_delta)
 
         # Run simulation
-        await run_simulation(runtime, vehicles, parking_areas, args.sim_time)
+        loop_started = time.perf_counter()
+        simulation_stats["startup_time"] = loop_started - started
+        await run_simulation(runtime, vehicles, args.sim_time, clock, kinematics,
+                             tick_mode=args.tick_mode, active_set=active_set, spawn=spawn,
+                             message_accounting=message_accounting, recorder=recorder)
+        simulation_stats["steps"] = args.sim_time
+        simulation_stats["run_time"] = time.perf_counter() - loop_started
         
         # Additional statistics for RL agents if used
         if args.use_rl:
@@ -495,78 +843,121 @@ async def main():
 
         # Collect final statistics from vehicles
         print("\n=== Simulation Statistics ===")
-        all_wait_times = []
+        # Pooled agents drive several trips; count every one of them (and each agent once,
+        # even if the config lists its ID twice)
+        agents = {id(agent): agent for _, agent in vehicles}.values()
+        simulation_stats["vehicles_entered"] = sum(agent.trips for agent in agents)
+        simulation_stats["vehicles_exited"] = sum(agent.exits for agent in agents)
         for vehicle_id, agent in vehicles:
             if agent.entered:
-                simulation_stats["vehicles_entered"] += 1
-                # Check if vehicle has exited the simulation (despawned)
-                if not hasattr(agent, 'x') or agent.x == -9999:
-                    simulation_stats["vehicles_exited"] += 1
-                
-                # Collect wait times from vehicles
-                if hasattr(agent, 'wait_times') and agent.wait_times:
-                    simulation_stats["wait_times"].extend(agent.wait_times)
-                    all_wait_times.extend(agent.wait_times)
-                    # Print sum of wait times instead of the full list
-                    total_wait = sum(agent.wait_times)
-                    avg_wait = total_wait / len(agent.wait_times) if agent.wait_times else 0
-                    print(f"{vehicle_id} - Total wait time: {total_wait} seconds, Waits: {len(agent.wait_times)}, Avg: {avg_wait:.2f} sec/wait")
+                waits = agent.wait_stats
+                if waits.count:
+                    print(f"{vehicle_id} - Total wait time: {waits.total:g} seconds, Waits: {waits.count}, Avg: {waits.mean:.2f} sec/wait")
         
-        # Calculate wait time statistics
-        if all_wait_times:
-            max_wait = max(all_wait_times)
-            min_wait = min(all_wait_times)
-            avg_wait = sum(all_wait_times) / len(all_wait_times)
-            total_wait_time = sum(all_wait_times)
+        # Wait time statistics, accumulated while the simulation ran
+        all_waits = stats.aggregate("vehicle", "wait")
+        simulation_stats["wait_time"] = all_waits.summary()
+        if all_waits.count:
             print(f"\nWait Time Statistics:")
-            print(f"  Maximum wait time: {max_wait} seconds")
-            print(f"  Minimum wait time: {min_wait} seconds")
-            print(f"  Average wait time: {avg_wait:.2f} seconds")
-            print(f"  Total wait time (all vehicles): {total_wait_time} seconds")
-            print(f"  Total number of waits: {len(all_wait_times)}")
+            print(f"  Maximum wait time: {all_waits.max:g} seconds")
+            print(f"  Minimum wait time: {all_waits.min:g} seconds")
+            print(f"  Average wait time: {all_waits.mean:.2f} seconds (std {all_waits.std:.2f})")
+            print(f"  Median / 95th percentile: {all_waits.quantile(0.5):.2f} / {all_waits.quantile(0.95):.2f} seconds")
+            print(f"  Total wait time (all vehicles): {all_waits.total:g} seconds")
+            print(f"  Total number of waits: {all_waits.count}")
         else:
             print("No wait times recorded in this simulation.")
             
         print("\n=== Detailed Wait Time per Vehicle ===")
         for vehicle_id, agent in vehicles:
-            if agent.wait_times:
-                max_wait_time = max(agent.wait_times)
-                min_wait_time = min(agent.wait_times)
-                avg_wait_time = sum(agent.wait_times) / len(agent.wait_times)
-
+            waits = agent.wait_stats
+            if waits.count:
                 print(f"\nVehicle ID: {vehicle_id}")
-                print(f"  Max Wait Time: {max_wait_time} sec")
-                print(f"  Min Wait Time: {min_wait_time} sec")
-                print(f"  Average Wait Time: {avg_wait_time:.2f} sec")
+                print(f"  Max Wait Time: {waits.max:g} sec")
+                print(f"  Min Wait Time: {waits.min:g} sec")
+                print(f"  Average Wait Time: {waits.mean:.2f} sec")
             else:
                 print(f"\nVehicle ID: {vehicle_id} has no wait times recorded.")
+
+        for title, kind, metric in STATS_TABLES:
+            if any(metric in metrics for metrics in stats.series[kind].values()):
+                print(f"\n=== {title} (largest total first) ===")
+                print(stats.format_report(kind, metric))
+        if args.stats_output:
+            stats.dump(args.stats_output)
+            print(f"Statistics written to {args.stats_output}")
+        if recorder is not None:
+            recorder.close()
+            print(f"Trajectory: {recorder.records} vehicle states of {len(recorder.vehicle_ids)} vehicles "
+                  f"({recorder.size / 1e6:.2f} MB) written to {args.trajectory_output}")
             
+        print("\n=== Road Occupancy (current/capacity, peak) ===")
+        simulation_stats["road_occupancy"] = occupancy.snapshot()
+        for road_id, (count, capacity, peak) in simulation_stats["road_occupancy"].items():
+            print(f"{road_id}: {count}/{capacity}, peak {peak}")
+
         print(f"\nVehicles that entered the system: {simulation_stats['vehicles_entered']}")
         print(f"Vehicles that exited the system: {simulation_stats['vehicles_exited']}")
+        if demand is not None:
+            print(f"Demand: {pool.spawned} vehicles spawned, {pool.reused} reused an idle agent, "
+                  f"{pool.size} agents created")
+        if travel_times is not None:
+            print(f"Re-routing: {travel_times.updates} road cost updates from {travel_times.observations} "
+                  f"travel times, {travel_times.routes_dropped} cached routes dropped")
+        if state_queries is not None:
+            print(f"State queries: {state_queries.sent} sent, {state_queries.coalesced} answered from the per-step cache")
         
+        if message_accounting is not None:
+            report = message_accounting.report()
+            simulation_stats["messages"] = dict(report["totals"], per_step=report["per_step"])
+            print("\n=== Runtime Messages (busiest routes first) ===")
+            print(message_accounting.format_report())
+            print(f"Messages: {message_accounting.sent} sent, {message_accounting.published} published, "
+                  f"{message_accounting.deliveries} deliveries, {message_accounting.responses} replies "
+                  f"({message_accounting.total / max(args.sim_time, 1):.1f} messages and "
+                  f"{message_accounting.deliveries / max(args.sim_time, 1):.1f} deliveries per step)")
+            if args.message_output:
+                message_accounting.export(args.message_output)
+                print(f"Message accounting written to {args.message_output}")
+        if profiler is not None:
+            simulation_stats["handler_profile"] = profiler.report()
+            print("\n=== Message Handler Profile (hottest first) ===")
+            print(profiler.format_report())
+            if args.profile_output:
+                profiler.dump(args.profile_output)
+                print(f"Handler profile written to {args.profile_output}")
+        print(f"Startup: {simulation_stats['startup_time']:.2f} seconds, {args.sim_time} steps in "
+              f"{simulation_stats['run_time']:.2f} seconds ({simulation_stats['run_time'] * 1e3 / max(args.sim_time, 1):.2f} ms/step)")
+
         # Calculate total simulation time
         simulation_end_time = datetime.datetime.now()
         simulation_duration = (simulation_end_time - simulation_stats["start_time"]).total_seconds()
         print(f"Total simulation time: {simulation_duration:.2f} seconds")
         print("===========================\n")
+        simulation_stats["duration"] = simulation_duration
 
-        # Cleanup
-        await runtime.stop()
-        visualizer.stop()
-        await visualizer_task
-        
-        # Save log file
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"LOGS/simulation_log_{timestamp}.txt"
-        
-        # with open(log_filename, "w", encoding="utf-8") as log_file:
-            # log_file.write(log_writer.getvalue())
-            
-        # print(f"\nSimulation logs saved to {log_filename}", file=original_stdout)
-        
     finally:
-        # Restore original stdout
-        sys.stdout = original_stdout
+        # Cleanup, also after an error: a later main() call in this process
+        # must not inherit this run's clock events, stats sink or profiler
+        try:
+            if clock is not None:
+                clock.cancel_all()
+            if runtime is not None:
+                await runtime.stop()
+            set_stats(None)
+            set_profiler(None)
+            if visualizer is not None:
+                visualizer.stop()
+                if visualizer_task is not None:
+                    await visualizer_task
+        finally:
+            # Flush queued records and close the log file
+            shutdown_logging()
+
+    if log_filename and os.path.exists(log_filename):
+        print(f"Simulation logs saved to {log_filename}")
+
+    return simulation_stats
 
 
 if __name__ == '__main__':
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -17,4 +18,147 @@ class MyMessageType(BaseModel):
     content: str
     source: str
     message_id: Optional[str] = None
-    timestamp: Optional[float] = None
\ No newline at end of file
+    timestamp: Optional[float] = None
+
+
+# Typed simulation messages. Each type gets its own routed message_handler, so
+# agents dispatch on the message class instead of scanning strings, and replies
+# carry numeric fields directly instead of "key=value" text.
+#
+# These are sent tens of thousands of times per simulated minute, so they are
+# frozen slotted dataclasses rather than pydantic models: no validation on
+# construction, no per-instance __dict__. MyMessageType stays pydantic for the
+# admin commands, where validation and JSON round-tripping matter more.
+
+
+@dataclass(frozen=True, slots=True)
+class Move:
+    """Advance a vehicle by one simulation step"""
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class StateQuery:
+    """Ask a traffic light, crossing or parking area for its current state
+
+    Attributes:
+        source (str): The identifier of the asking agent
+    """
+    source: str
+
+
+@dataclass(frozen=True, slots=True)
+class LightState:
+    """Traffic light reply to a StateQuery
+
+    Attributes:
+        light_id (str): The traffic light's identifier
+        state (str): "RED" or "GREEN"
+        queue_length (int): Vehicles queued at the light (RL lights only, else 0)
+    """
+    light_id: str
+    state: str
+    queue_length: int = 0
+
+    @property
+    def is_red(self) -> bool:
+        return self.state == "RED"
+
+
+@dataclass(frozen=True, slots=True)
+class CrossingState:
+    """Pedestrian crossing reply to a StateQuery
+
+    Attributes:
+        crossing_id (str): The crossing's identifier
+        occupied (bool): True while pedestrians are crossing
+        queue_length (int): Pedestrians waiting to cross
+    """
+    crossing_id: str
+    occupied: bool
+    queue_length: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class ParkingState:
+    """Parking area reply to a StateQuery
+
+    Attributes:
+        parking_id (str): The parking area's identifier
+        occupancy (int): Vehicles currently using the area
+        capacity (int): Total spaces
+    """
+    parking_id: str
+    occupancy: int
+    capacity: int
+
+    @property
+    def available(self) -> bool:
+        return self.occupancy < self.capacity
+
+
+@dataclass(frozen=True, slots=True)
+class ParkRequest:
+    """Vehicle asks a parking area for a space
+
+    Attributes:
+        vehicle_id (str): The requesting vehicle
+    """
+    vehicle_id: str
+
+
+@dataclass(frozen=True, slots=True)
+class ParkReply:
+    """Parking area answer to a ParkRequest
+
+    Attributes:
+        accepted (bool): True if a space was assigned
+        parking_time (int): Seconds the parking manoeuvre takes (0 if rejected)
+        occupancy (int): Occupancy after handling the request
+        capacity (int): Total spaces
+    """
+    accepted: bool
+    parking_time: int = 0
+    occupancy: int = 0
+    capacity: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class ExitRequest:
+    """Vehicle asks a parking area to leave
+
+    Attributes:
+        vehicle_id (str): The requesting vehicle
+    """
+    vehicle_id: str
+
+
+@dataclass(frozen=True, slots=True)
+class ExitReply:
+    """Parking area answer to an ExitRequest
+
+    Attributes:
+        accepted (bool): False while the vehicle is still parking
+        exit_time (int): Seconds the exit manoeuvre takes (0 if rejected)
+    """
+    accepted: bool
+    exit_time: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class ExitNotification:
+    """Tells a vehicle it should leave its parking area
+
+    Attributes:
+        vehicle_id (str): The vehicle concerned
+        source (str): The identifier of the notifying agent
+    """
+    vehicle_id: str
+    source: str
+
+
+# Every internal message type, for registering serializers with the runtime
+SIM_MESSAGE_TYPES = (
+    Move, StateQuery, LightState, CrossingState, ParkingState,
+    ParkRequest, ParkReply, ExitRequest, ExitReply, ExitNotification,
+)
@@ -5,20 +5,232 @@ This module handles the setup of the agent runtime environment for the traffic s
 It provides a clean interface for initializing the runtime with necessary agent types.
 """
 
-from autogen_core import SingleThreadedAgentRuntime
+import json
+import time
+import uuid
+
+from autogen_core import DefaultInterventionHandler, SingleThreadedAgentRuntime, try_get_known_serializers_for_type
 from traffic_agents import VehicleAssistant, TrafficLightAssistant, PedestrianCrossingAssistant, MyAssistant
+from messages.types import MyMessageType, SIM_MESSAGE_TYPES
+from sim.profiling import command_of
+from sim.stats import RunningStats
+
+
+def register_message_serializers(runtime):
+    """
+    Register serializers for every simulation message type with the runtime.
+
+    Agents only register the types they handle, so reply types (LightState,
+    ParkReply, ...) would otherwise be unknown to the runtime's serializer
+    registry.
+
+    Args:
+        runtime: The agent runtime to register the serializers with
+    """
+    for message_type in (MyMessageType,) + SIM_MESSAGE_TYPES:
+        runtime.add_message_serializer(try_get_known_serializers_for_type(message_type))
+
+
+class MessageAccounting(DefaultInterventionHandler):
+    """
+    Intervention handler that accounts for every message passing through the runtime.
+
+    Messages are counted by sender type, recipient type and command. Agent
+    types are agent class names; "external" is code outside any agent, such as
+    the main loop. A publish's recipient is its topic. The command is the
+    first word of a MyMessageType, otherwise the message type name.
+
+    `attach(runtime)` also timestamps each direct send. That gives its queue
+    delay (submission until the runtime dispatches it) and its service time
+    (dispatch until the reply arrives, i.e. the handler's run time). Per-step
+    totals are closed by `end_step()`. Only installed when asked for (see
+    setup_runtime), so a normal run pays nothing for it.
+
+    Attributes:
+        sent (int): Direct messages submitted with send_message
+        published (int): Messages published to a topic
+        deliveries (int): Handler invocations the messages caused (one per send, one per subscriber of a publish)
+        responses (int): Replies returned by message handlers
+        routes (dict): (sender type, recipient type, command) -> [messages, deliveries, queue delay, service time]
+        queue_delay (RunningStats): Queue delay of the direct sends
+        service_time (RunningStats): Service time of the direct sends
+        steps (list): (sent, published, deliveries, responses) of each finished step
+    """
+
+    STEP_FIELDS = ("sent", "published", "deliveries", "responses")
+
+    def __init__(self):
+        self.runtime = None
+        self.sent = 0
+        self.published = 0
+        self.deliveries = 0
+        self.responses = 0
+        self.routes = {}
+        self.queue_delay = RunningStats()
+        self.service_time = RunningStats()
+        self.steps = []
+        self._step_start = (0, 0, 0, 0)
+        self._agent_types = {}  # AgentId.type -> agent class name
+        self._submitted = {}  # message id -> submission time
+        self._dispatched = {}  # message id -> (route, dispatch time)
+
+    @property
+    def total(self):
+        """Messages submitted to the runtime (direct sends plus publishes)"""
+        return self.sent + self.published
+
+    def attach(self, runtime):
+        """Resolve agent classes through `runtime` and time its direct sends"""
+        self.runtime = runtime
+        send_message = runtime.send_message
 
+        async def timed_send_message(message, recipient, **kwargs):
+            message_id = kwargs.get("message_id") or str(uuid.uuid4())
+            kwargs["message_id"] = message_id
+            self._submitted[message_id] = time.perf_counter()
+            try:
+                return await send_message(message, recipient, **kwargs)
+            finally:
+                self._submitted.pop(message_id, None)
+                dispatched = self._dispatched.pop(message_id, None)
+                if dispatched is not None:
+                    route, dispatch_time = dispatched
+                    service = time.perf_counter() - dispatch_time
+                    route[3] += service
+                    self.service_time.add(service)
 
-async def setup_runtime():
+        runtime.send_message = timed_send_message
+
+    def _agent_type(self, agent_id):
+        if agent_id is None:
+            return "external"
+        name = self._agent_types.get(agent_id.type)
+        if name is None:
+            agent = getattr(self.runtime, "_instantiated_agents", {}).get(agent_id)
+            if agent is None:
+                return agent_id.type  # not instantiated yet; resolved on a later message
+            name = self._agent_types[agent_id.type] = type(agent).__name__
+        return name
+
+    def _route(self, sender, recipient_type, message):
+        key = (self._agent_type(sender), recipient_type, command_of(message))
+        route = self.routes.get(key)
+        if route is None:
+            route = self.routes[key] = [0, 0, 0.0, 0.0]
+        return route
+
+    async def on_send(self, message, *, message_context, recipient):
+        self.sent += 1
+        self.deliveries += 1
+        route = self._route(message_context.sender, self._agent_type(recipient), message)
+        route[0] += 1
+        route[1] += 1
+        submitted = self._submitted.pop(message_context.message_id, None)
+        if submitted is not None:
+            now = time.perf_counter()
+            route[2] += now - submitted
+            self.queue_delay.add(now - submitted)
+            self._dispatched[message_context.message_id] = (route, now)
+        return message
+
+    async def on_publish(self, message, *, message_context):
+        self.published += 1
+        topic = message_context.topic_id
+        route = self._route(message_context.sender, f"topic:{topic.type}", message)
+        route[0] += 1
+        manager = getattr(self.runtime, "_subscription_manager", None)
+        if manager is not None:
+            recipients = await manager.get_subscribed_recipients(topic)
+            delivered = sum(1 for agent_id in recipients if agent_id != message_context.sender)
+            route[1] += delivered
+            self.deliveries += delivered
+        return message
+
+    async def on_response(self, message, *, sender, recipient):
+        self.responses += 1
+        return message
+
+    def end_step(self):
+        """Close the current simulation step and keep its totals"""
+        now = (self.sent, self.published, self.deliveries, self.responses)
+        self.steps.append(tuple(n - start for n, start in zip(now, self._step_start)))
+        self._step_start = now
+
+    def report(self):
+        """Return the totals, the busiest routes first, the latency summaries and the per-step totals"""
+        routes = [
+            {"sender_type": sender, "recipient_type": recipient, "command": command, "messages": messages,
+             "deliveries": deliveries, "queue_delay": queue_delay, "service_time": service_time}
+            for (sender, recipient, command), (messages, deliveries, queue_delay, service_time) in self.routes.items()
+        ]
+        routes.sort(key=lambda route: route["deliveries"], reverse=True)
+        steps = len(self.steps) or 1
+        return {
+            "totals": {"sent": self.sent, "published": self.published, "deliveries": self.deliveries,
+                       "responses": self.responses},
+            "per_step": {field: sum(step[i] for step in self.steps) / steps for i, field in enumerate(self.STEP_FIELDS)},
+            "routes": routes,
+            "queue_delay": self.queue_delay.summary(),
+            "service_time": self.service_time.summary(),
+            "step_fields": list(self.STEP_FIELDS),
+            "steps": [list(step) for step in self.steps],
+        }
+
+    def format_report(self, limit=15):
+        """Return the busiest sender -> recipient routes as a text table"""
+        lines = [f"{'sender':<24}{'recipient':<28}{'command':<18}{'messages':>10}{'deliveries':>11}{'avg wait ms':>12}{'avg svc ms':>11}"]
+        for route in self.report()["routes"][:limit]:
+            sends = route["messages"] if route["queue_delay"] else 0
+            lines.append(
+                f"{route['sender_type']:<24}{route['recipient_type']:<28}{route['command']:<18}{route['messages']:>10}"
+                f"{route['deliveries']:>11}{route['queue_delay'] * 1e3 / sends if sends else 0:>12.3f}"
+                f"{route['service_time'] * 1e3 / sends if sends else 0:>11.3f}"
+            )
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Write report() to `path` as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def message_queue(runtime):
+    """
+    Return the queue of the runtime's undelivered messages, or None if it has none.
+
+    SingleThreadedAgentRuntime keeps its pending messages in the private
+    asyncio.Queue `_message_queue` and marks each one done once its handlers
+    have returned. Joining that queue is the only way to wait for the
+    handlers of a published message without stopping the runtime
+    (stop_when_idle() joins it too). Other runtimes, or a later autogen_core
+    that drops the attribute, get None, and callers fall back to awaiting
+    send_message futures.
+
+    Args:
+        runtime: The agent runtime
+    """
+    queue = getattr(runtime, "_message_queue", None)
+    return queue if callable(getattr(queue, "join", None)) else None
+
+
+async def setup_runtime(message_accounting=None):
     """
     Initialize and setup the agent runtime for the traffic simulation.
+
+    Args:
+        message_accounting (MessageAccounting, optional): Installed as an
+            intervention handler to account for every message
     
     Returns:
         tuple: A tuple containing (runtime, None, None, None) where:
             - runtime: The initialized SingleThreadedAgentRuntime
             - The other None values are placeholders for backward compatibility
     """
-    runtime = SingleThreadedAgentRuntime()
+    handlers = [message_accounting] if message_accounting is not None else None
+    runtime = SingleThreadedAgentRuntime(intervention_handlers=handlers)
+    if message_accounting is not None:
+        message_accounting.attach(runtime)
+    register_message_serializers(runtime)
     
     # Register the base assistant for core messaging functionality
     await MyAssistant.register(
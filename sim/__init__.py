@@ -0,0 +1,13 @@
+from .clock import ScheduledEvent, SimulationClock, get_clock, set_clock
+from .network import RoadNetwork
+from .occupancy import RoadOccupancy
+from .controls import ControlIndex, ControlStateTable, StateQueryCache
+from .log import get_logger, configure_logging, shutdown_logging
+from .kinematics import FleetKinematics
+from .active import ActiveSet
+from .parking import ParkingIndex
+from .routing import RoutePlanner
+from .congestion import TravelTimeEstimator
+from .spawning import DemandModel, VehiclePool
+from .profiling import HandlerProfiler, get_profiler, set_profiler
+from .stats import QuantileSketch, RunningStats, SimulationStats, get_stats, set_stats
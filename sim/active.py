@@ -0,0 +1,128 @@
+import heapq
+import itertools
+from collections import deque
+
+
+class ActiveSet:
+    """Tracks which vehicles need a Move message each simulation step
+
+    Vehicles waiting to enter sit in an entry queue and are admitted one at a
+    time, in order. A vehicle is admitted once the previous entrant has moved
+    off its spawn point and its starting road has room (`agent.can_enter()`). Parked vehicles sleep on a heap keyed by the step
+    they wake up at. Exited vehicles are dropped. Every step therefore costs
+    O(moving vehicles + vehicles waking up), however large the fleet.
+
+    Membership changes are recorded so callers can mirror the set elsewhere
+    (e.g. tick topic subscriptions) with drain_changes().
+
+    Attributes:
+        step (int): Current simulation step
+        active (dict): vehicle_id -> agent for vehicles that move this step, in activation order
+        entry_queue (deque): (vehicle_id, agent) pairs still waiting to enter
+    """
+
+    def __init__(self):
+        self.step = 0
+        self.active = {}
+        self.entry_queue = deque()
+        self._asleep = {}  # vehicle_id -> (agent, wake step)
+        self._wakeups = []  # heap of (wake step, seq, vehicle_id); stale entries are skipped
+        self._seq = itertools.count()
+        self._last_entered = None
+        self._changes = {}
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, vehicle_id):
+        return vehicle_id in self.active
+
+    @property
+    def sleeping(self):
+        """Number of vehicles currently asleep"""
+        return len(self._asleep)
+
+    def members(self):
+        """Yield (vehicle_id, agent) of every vehicle in the environment, moving or asleep"""
+        yield from self.active.items()
+        for vehicle_id, (agent, _) in self._asleep.items():
+            yield vehicle_id, agent
+
+    def enqueue(self, vehicle_id, agent):
+        """Queue a vehicle to enter the environment"""
+        self.entry_queue.append((vehicle_id, agent))
+
+    def begin_step(self, step):
+        """Start step `step`: wake the sleepers that are due, then admit at most one queued vehicle
+
+        Returns:
+            str: The id of the vehicle that entered, or None
+        """
+        self.step = step
+        while self._wakeups and self._wakeups[0][0] <= step:
+            wake_step, _, vehicle_id = heapq.heappop(self._wakeups)
+            entry = self._asleep.get(vehicle_id)
+            if entry is not None and entry[1] == wake_step:
+                del self._asleep[vehicle_id]
+                self._activate(vehicle_id, entry[0])
+        return self._admit()
+
+    def _admit(self):
+        if not self.entry_queue:
+            return None
+        previous = self._last_entered
+        # A previous entrant that has since left (and may be queued again) no longer blocks the spawn point
+        if previous is not None and previous.entered and previous.x == previous.start_x and previous.y == previous.start_y:
+            return None
+        vehicle_id, agent = self.entry_queue[0]
+        # Nor may it enter a road that is already full
+        if not agent.can_enter():
+            return None
+        self.entry_queue.popleft()
+        agent.enter_environment()
+        self._last_entered = agent
+        self._activate(vehicle_id, agent)
+        return vehicle_id
+
+    def _activate(self, vehicle_id, agent):
+        self.active[vehicle_id] = agent
+        self._changes[vehicle_id] = True
+
+    def _deactivate(self, vehicle_id):
+        agent = self.active.pop(vehicle_id, None)
+        if agent is not None:
+            self._changes[vehicle_id] = False
+        return agent
+
+    def sleep(self, vehicle_id, steps):
+        """Take an active vehicle out of the set until `steps` steps from now"""
+        agent = self._deactivate(vehicle_id)
+        if agent is None:
+            return
+        wake_step = self.step + max(1, steps)
+        self._asleep[vehicle_id] = (agent, wake_step)
+        heapq.heappush(self._wakeups, (wake_step, next(self._seq), vehicle_id))
+
+    def wake(self, vehicle_id):
+        """Bring a sleeping vehicle back before its wake-up step (no-op if it is awake)"""
+        entry = self._asleep.pop(vehicle_id, None)
+        if entry is not None:
+            self._activate(vehicle_id, entry[0])
+
+    def remove(self, vehicle_id):
+        """Drop a vehicle for good, e.g. once it has left the simulation"""
+        self._asleep.pop(vehicle_id, None)
+        self._deactivate(vehicle_id)
+
+    def recipients(self):
+        """Return the ids of the vehicles to move this step"""
+        return list(self.active)
+
+    def drain_changes(self):
+        """Return and clear the membership changes since the last call
+
+        Returns:
+            dict: vehicle_id -> True if it is now active, False if it left
+        """
+        changes, self._changes = self._changes, {}
+        return changes
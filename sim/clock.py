@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+
+
+class ScheduledEvent:
+    """Handle for a callback registered with SimulationClock.schedule()
+
+    Attributes:
+        time (float): Simulated time the callback runs at next
+        interval (float|callable): Delay between repeats (or a function returning it), None for one-shot events
+        cancelled (bool): True once the event has been cancelled
+    """
+
+    __slots__ = ("time", "callback", "args", "interval", "cancelled")
+
+    def __init__(self, time, callback, args, interval=None):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        """Stop the event from running again"""
+        self.cancelled = True
+
+    def next_delay(self):
+        """Return the delay until the next repeat"""
+        return self.interval() if callable(self.interval) else self.interval
+
+
+class SimulationClock:
+    """Shared virtual clock and discrete-event scheduler for the simulation
+
+    Agents never sleep on the wall clock and never run background tasks of
+    their own. Periodic work is registered with `schedule()` /
+    `schedule_every()`, and the main simulation loop moves time forward with
+    `advance()`, which runs every callback that is due inline, in (time,
+    registration order) order. The outcome therefore does not depend on how
+    the event loop interleaves tasks, and `cancel_all()` stops everything at
+    once. The real-time factor controls how simulated seconds map onto
+    wall-clock seconds:
+
+    - ``real_time_factor == 1.0`` reproduces the original real-time pacing
+    - ``real_time_factor == 2.0`` runs twice as fast as real time
+    - ``real_time_factor <= 0`` runs as fast as possible (no wall-clock sleeps)
+
+    Attributes:
+        now (float): Current simulated time in seconds
+        real_time_factor (float): Simulated seconds per wall-clock second (0 = as fast as possible)
+    """
+
+    def __init__(self, real_time_factor=1.0):
+        self.now = 0.0
+        self.real_time_factor = real_time_factor
+        self._events = []                   # heap of (time, seq, ScheduledEvent)
+        self._counter = itertools.count()   # tie-breaker keeps registration order stable
+
+    @property
+    def as_fast_as_possible(self):
+        """True when the clock never waits on wall-clock time"""
+        return not self.real_time_factor or self.real_time_factor <= 0
+
+    @property
+    def pending(self):
+        """Number of scheduled events, including cancelled ones not yet dropped"""
+        return len(self._events)
+
+    def schedule(self, delay, callback, *args):
+        """Run `callback(*args)` once, `delay` simulated seconds from now
+
+        The callback may be a plain function or a coroutine function; a
+        coroutine is awaited before the next event runs; the clock only
+        advances once it returns.
+
+        Returns:
+            ScheduledEvent: Handle that can cancel the callback
+        """
+        event = ScheduledEvent(self.now + max(0.0, delay), callback, args)
+        self._push(event)
+        return event
+
+    def schedule_every(self, interval, callback, *args, first_delay=None):
+        """Run `callback(*args)` repeatedly, every `interval` simulated seconds
+
+        Args:
+            interval (float|callable): Delay between runs, or a function returning
+                the next delay (drawn before each wait, e.g. for random timers)
+            callback (callable): Function or coroutine function to run
+            first_delay (float, optional): Delay before the first run; defaults to the interval
+
+        Returns:
+            ScheduledEvent: Handle that cancels every future run
+        """
+        event = ScheduledEvent(self.now, callback, args, interval)
+        event.time += max(0.0, event.next_delay() if first_delay is None else first_delay)
+        self._push(event)
+        return event
+
+    def _push(self, event):
+        heapq.heappush(self._events, (event.time, next(self._counter), event))
+
+    async def _run(self, event):
+        result = event.callback(*event.args)
+        if inspect.isawaitable(result):
+            await result
+        if event.interval is not None and not event.cancelled:
+            event.time = self.now + max(0.0, event.next_delay())
+            self._push(event)
+
+    async def advance(self, seconds):
+        """Move simulated time forward, running every event that is due
+
+        Args:
+            seconds (float): Simulated duration of the step
+        """
+        if self.as_fast_as_possible:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(seconds / self.real_time_factor)
+
+        target = self.now + seconds
+        while self._events and self._events[0][0] <= target:
+            time, _, event = heapq.heappop(self._events)
+            self.now = max(self.now, time)
+            if not event.cancelled:
+                await self._run(event)
+        self.now = target
+
+    def cancel_all(self):
+        """Cancel every scheduled event (used at shutdown)"""
+        for _, _, event in self._events:
+            event.cancel()
+        self._events.clear()
+
+
+# Shared clock used by all agents unless a different one is installed
+_clock = SimulationClock()
+
+
+def get_clock():
+    """Return the shared simulation clock"""
+    return _clock
+
+
+def set_clock(clock):
+    """Install `clock` as the shared simulation clock and return it"""
+    global _clock
+    _clock = clock
+    return _clock
@@ -0,0 +1,77 @@
+from sim.log import get_logger
+
+logger = get_logger("network")
+
+# Weight of the newest observation in the moving average
+DEFAULT_ALPHA = 0.2
+# Relative change of a road's estimate that triggers re-routing
+DEFAULT_THRESHOLD = 0.25
+# Shorter stretches (e.g. entering a road just before its end) are too noisy to scale up
+MIN_FRACTION = 0.2
+
+
+class TravelTimeEstimator:
+    """Online per-road travel-time estimates that steer the route planner
+
+    Vehicles report how long they took to drive each road when they leave it.
+    Every report updates an exponentially weighted moving average (EWMA) of
+    the road's full-length travel time. The planner only hears about a road
+    when its estimate has moved more than `threshold` (relative) away from
+    the value it was last given. At that point the road's cost becomes its
+    length scaled by the congestion factor (estimate / free-flow time), and
+    the planner drops just the cached routes the change can affect. Vehicles
+    pick up the new routes at their next junction, so nobody is re-planned
+    every step.
+
+    Attributes:
+        planner (RoutePlanner): Planner whose road costs are kept up to date
+        free_flow_time (float): Time to drive a full road with no congestion
+        alpha (float): EWMA weight of the newest observation
+        threshold (float): Relative change that is pushed to the planner
+        estimates (list): Current travel-time estimate per road
+        observations (int): Number of reports received
+        updates (int): Number of cost changes pushed to the planner
+        routes_dropped (int): Cached routes invalidated by those changes
+    """
+
+    def __init__(self, planner, free_flow_time, alpha=DEFAULT_ALPHA, threshold=DEFAULT_THRESHOLD):
+        self.planner = planner
+        self.free_flow_time = free_flow_time
+        self.alpha = alpha
+        self.threshold = threshold
+        n = len(planner.network)
+        self.estimates = [free_flow_time] * n
+        self._published = [free_flow_time] * n  # estimate behind the planner's current cost
+        self._base_costs = list(planner.costs)
+        self.observations = 0
+        self.updates = 0
+        self.routes_dropped = 0
+
+    def observe(self, road_idx, duration, fraction=1.0):
+        """Record that a vehicle spent `duration` driving `fraction` of road `road_idx`
+
+        Args:
+            road_idx (int): Road the vehicle just left
+            duration (float): Time it spent on the road
+            fraction (float): Share of the road it covered (vehicles enter mid-road after a turn)
+        """
+        if fraction < MIN_FRACTION or duration < 0:
+            return
+        self.observations += 1
+        estimate = self.estimates[road_idx] + self.alpha * (duration / fraction - self.estimates[road_idx])
+        self.estimates[road_idx] = estimate
+        published = self._published[road_idx]
+        if abs(estimate - published) > self.threshold * published:
+            self._publish(road_idx, estimate)
+
+    def _publish(self, road_idx, estimate):
+        self._published[road_idx] = estimate
+        factor = estimate / self.free_flow_time
+        dropped = self.planner.set_cost(road_idx, self._base_costs[road_idx] * factor)
+        self.updates += 1
+        self.routes_dropped += dropped
+        logger.debug("Road %s travel time now %.2f (x%.2f), %s cached routes dropped", road_idx, estimate, factor, dropped)
+
+    def congestion(self, road_idx):
+        """Return the current estimate of road `road_idx` relative to free flow"""
+        return self.estimates[road_idx] / self.free_flow_time
@@ -0,0 +1,203 @@
+import asyncio
+import math
+from bisect import bisect_left
+
+from sim.clock import get_clock
+
+# Detection ranges the vehicles used with is_nearby()
+LIGHT_RANGE = 50
+CROSSING_RANGE = 40
+
+
+class ControlIndex:
+    """Per-road ordered lookup of traffic lights and pedestrian crossings
+
+    Every light and crossing is projected once onto each road that passes
+    within its detection range. For each road the controls are kept sorted by
+    their parameter along the road (0.0 = start, 1.0 = end) in CSR layout, so
+    a vehicle only has to bisect to its `movement_progress` and look at the
+    next control(s) ahead instead of distance-checking every control on the
+    map each step.
+
+    Attributes:
+        offsets (tuple): Controls of road ``i`` live in ``[offsets[i], offsets[i + 1])``
+        positions (tuple): Parameter along the road of each control
+        kinds (tuple): "light" or "crossing" for each control
+        ids (tuple): Agent ID of each control
+        ranges (tuple): Detection range of each control (map units)
+    """
+
+    def __init__(self, network, traffic_lights=None, crossings=None):
+        self.network = network
+        controls = [("light", c, LIGHT_RANGE) for c in (traffic_lights or [])]
+        controls += [("crossing", c, CROSSING_RANGE) for c in (crossings or [])]
+        reach = max((entry[2] for entry in controls), default=0)
+
+        # Bucket the controls on a grid so each road only projects the ones near it
+        cell = 2 * reach or 1
+        buckets = {}
+        for order, (kind, control, detection_range) in enumerate(controls):
+            key = (math.floor(control["x"] / cell), math.floor(control["y"] / cell))
+            buckets.setdefault(key, []).append((order, kind, control, detection_range))
+
+        offsets = [0]
+        positions, kinds, ids, ranges = [], [], [], []
+        for road in network.roads:
+            x1, y1, x2, y2 = road[:4]
+            on_road = []
+            for i in range(math.floor((min(x1, x2) - reach) / cell), math.floor((max(x1, x2) + reach) / cell) + 1):
+                for j in range(math.floor((min(y1, y2) - reach) / cell), math.floor((max(y1, y2) + reach) / cell) + 1):
+                    for order, kind, control, detection_range in buckets.get((i, j), ()):
+                        t, lateral = self._project(road, control["x"], control["y"])
+                        if lateral < detection_range:
+                            on_road.append((t, order, kind, control["id"], detection_range))
+            on_road.sort(key=lambda entry: entry[:2])
+            for t, _, kind, control_id, detection_range in on_road:
+                positions.append(t)
+                kinds.append(kind)
+                ids.append(control_id)
+                ranges.append(detection_range)
+            offsets.append(len(positions))
+
+        self.offsets = tuple(offsets)
+        self.positions = tuple(positions)
+        self.kinds = tuple(kinds)
+        self.ids = tuple(ids)
+        self.ranges = tuple(ranges)
+        self.max_range = max(self.ranges, default=0)
+
+    @staticmethod
+    def _project(road, x, y):
+        """Return (parameter along road, lateral distance) of point (x, y)"""
+        x1, y1, x2, y2 = road[:4]
+        vx, vy = x2 - x1, y2 - y1
+        length_sq = vx * vx + vy * vy
+        if length_sq < 0.0001:
+            return 0.0, math.hypot(x - x1, y - y1)
+        t = max(0.0, min(1.0, ((x - x1) * vx + (y - y1) * vy) / length_sq))
+        return t, math.hypot(x - (x1 + vx * t), y - (y1 + vy * t))
+
+    def on_road(self, road_idx):
+        """Return [(kind, id, position)] for every control on road `road_idx`"""
+        start, end = self.offsets[road_idx], self.offsets[road_idx + 1]
+        return [(self.kinds[k], self.ids[k], self.positions[k]) for k in range(start, end)]
+
+    def ahead(self, road_idx, progress):
+        """Yield (kind, id) of the controls ahead of `progress` that are within detection range
+
+        Args:
+            road_idx (int): Road the vehicle is on
+            progress (float): Vehicle's movement_progress on that road
+        """
+        if road_idx < 0 or road_idx >= len(self.offsets) - 1:
+            return
+        start, end = self.offsets[road_idx], self.offsets[road_idx + 1]
+        if start == end:
+            return
+        length = self.network.lengths[road_idx]
+        k = bisect_left(self.positions, progress, start, end)
+        while k < end:
+            gap = (self.positions[k] - progress) * length
+            if gap >= self.max_range:
+                break  # sorted by position, so everything after is further away
+            if gap < self.ranges[k]:
+                yield self.kinds[k], self.ids[k]
+            k += 1
+
+
+class ControlStateTable:
+    """Shared, versioned table of current light and crossing states
+
+    Traffic lights and pedestrian crossings publish into the table only when
+    their state actually flips; vehicles read the cached value locally instead
+    of sending a state query to every control they approach. The values are
+    the same typed records a state query returns (without the queue length),
+    so readers test `is_red` / `occupied` instead of parsing strings. The
+    per-control and global version counters let readers cheaply tell whether
+    anything changed since they last looked.
+
+    Attributes:
+        states (dict): Control ID -> current LightState or CrossingState
+        versions (dict): Control ID -> number of state changes published
+        version (int): Total number of state changes published
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.versions = {}
+        self.version = 0
+
+    def publish(self, control_id, state):
+        """Record `state` for `control_id`; returns True if it changed"""
+        if self.states.get(control_id) == state:
+            return False
+        self.states[control_id] = state
+        self.versions[control_id] = self.versions.get(control_id, 0) + 1
+        self.version += 1
+        return True
+
+    def get(self, control_id, default=None):
+        """Return the last published state of `control_id`"""
+        return self.states.get(control_id, default)
+
+
+class StateQueryCache:
+    """Per-step memo of state query replies from lights and crossings
+
+    When vehicles poll controls instead of reading the ControlStateTable,
+    many of them ask the same light the same question in the same step.
+    `query()` sends one request per control per simulated step and hands its
+    reply, or the request still in flight, to every other vehicle asking
+    that control in the same step. An entry is reused only while the
+    simulation clock shows the time it was made and, if the controls publish
+    to a `state_table`, while the control's state version is unchanged. A
+    new step or a state change therefore always triggers a fresh query.
+
+    Attributes:
+        state_table (ControlStateTable): Versions used to invalidate entries on state change (optional)
+        sent (int): Queries actually sent
+        coalesced (int): Queries answered from the memo
+    """
+
+    def __init__(self, state_table=None):
+        self.state_table = state_table
+        self.sent = 0
+        self.coalesced = 0
+        self._entries = {}  # control AgentId -> (simulated time, state version, reply future)
+
+    def _version(self, control_id):
+        return self.state_table.versions.get(control_id.type) if self.state_table is not None else None
+
+    async def query(self, sender, control_id, message):
+        """Return the reply of `control_id` to `message`, sending it only if this step has no answer yet
+
+        Args:
+            sender (BaseAgent): Agent asking; sends the request when one is needed
+            control_id (AgentId): Light or crossing to ask
+            message: The query, e.g. a StateQuery
+        """
+        now = get_clock().now
+        version = self._version(control_id)
+        entry = self._entries.get(control_id)
+        if entry is not None and entry[0] == now and entry[1] == version:
+            self.coalesced += 1
+            return await entry[2]
+        self.sent += 1
+        reply = asyncio.ensure_future(sender.send_message(message, control_id))
+        reply.add_done_callback(lambda done: self._drop_failed(control_id, done))
+        self._entries[control_id] = (now, version, reply)
+        return await reply
+
+    def _drop_failed(self, control_id, reply):
+        """Don't hand a failed request to later askers; they retry instead"""
+        if reply.cancelled() or reply.exception() is not None:
+            entry = self._entries.get(control_id)
+            if entry is not None and entry[2] is reply:
+                del self._entries[control_id]
+
+    def invalidate(self, control_id=None):
+        """Forget the memoized reply of `control_id`, or of every control"""
+        if control_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(control_id, None)
@@ -0,0 +1,146 @@
+import numpy as np
+
+# Motion constants shared with VehicleAssistant._advance / _advance_turn
+ROAD_END = 0.999
+TURN_SPEED = 0.15
+
+# Queued motion per slot for the next integrate()
+IDLE = 0
+ADVANCE = 1
+TURN = 2
+
+
+class FleetKinematics:
+    """Struct-of-arrays motion state for a whole fleet of vehicles
+
+    Each vehicle owns one slot in a set of parallel NumPy arrays (road
+    index, progress, position, turn state, wait counter). Vehicles still take
+    their own decisions (obstacles, parking, which road to turn onto), but
+    instead of moving themselves they queue an ADVANCE or TURN for their slot.
+    Once per tick `step()` integrates every queued slot with a handful of
+    vectorized operations and only calls back into the few vehicles that
+    reached the end of a road or finished a turn.
+
+    Attributes:
+        network (RoadNetwork): Road network the road indices refer to
+        road (ndarray): Current road index per slot
+        progress (ndarray): Parameter t (0.0 to 1.0) along the current road
+        step_size (ndarray): Progress gained per ADVANCE
+        x, y (ndarray): Current coordinates
+        turning (ndarray): True while the slot is on a turn arc
+        turn_progress (ndarray): Progress (0.0 to 1.0) along the turn arc
+        next_road (ndarray): Road the turn ends on, -1 if none
+        origin_x, origin_y, target_x, target_y (ndarray): Turn arc end points, NaN if unset
+        wait (ndarray): Steps spent waiting on the current obstacle
+        pending (ndarray): Motion queued for the next integrate()
+        owners (list): Object owning each slot, called back by step()
+    """
+
+    def __init__(self, network, capacity=64):
+        self.network = network
+        roads = np.array([road[:4] for road in network.roads], dtype=np.float64).reshape(-1, 4)
+        self.road_x1, self.road_y1, self.road_x2, self.road_y2 = (roads[:, k].copy() for k in range(4))
+        self.size = 0
+        self.owners = []
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity):
+        """(Re)allocate every per-slot array with room for `capacity` vehicles"""
+        old = self.size
+        fields = {
+            "road": (np.int32, 0), "progress": (np.float64, 0.0), "step_size": (np.float64, 0.0),
+            "x": (np.float64, 0.0), "y": (np.float64, 0.0),
+            "turning": (np.bool_, False), "turn_progress": (np.float64, 0.0), "next_road": (np.int32, -1),
+            "origin_x": (np.float64, np.nan), "origin_y": (np.float64, np.nan),
+            "target_x": (np.float64, np.nan), "target_y": (np.float64, np.nan),
+            "wait": (np.int32, 0), "pending": (np.int8, IDLE),
+        }
+        for name, (dtype, fill) in fields.items():
+            array = np.full(capacity, fill, dtype=dtype)
+            if old:
+                array[:old] = getattr(self, name)[:old]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.size
+
+    def add(self, owner, road=0, x=0.0, y=0.0, step_size=0.05):
+        """Allocate a slot for `owner` and return its index"""
+        if self.size == self.capacity:
+            self._allocate(self.capacity * 2)
+        slot = self.size
+        self.size += 1
+        self.owners.append(owner)
+        self.road[slot] = road
+        self.x[slot] = x
+        self.y[slot] = y
+        self.step_size[slot] = step_size
+        return slot
+
+    def queue_advance(self, slot):
+        """Move `slot` one step along its road on the next integrate()"""
+        self.pending[slot] = ADVANCE
+
+    def queue_turn(self, slot):
+        """Move `slot` one step along its turn arc on the next integrate()"""
+        self.pending[slot] = TURN
+
+    def integrate(self):
+        """Apply every queued motion at once
+
+        Advancing slots gain `step_size` progress and are placed on their
+        road by linear interpolation. Turning slots gain TURN_SPEED turn
+        progress and are placed on the arc with the same smoothstep easing as
+        VehicleAssistant._turn_arc_position.
+
+        Returns:
+            tuple: (slots that reached the end of their road, slots that finished their turn)
+        """
+        n = self.size
+        pending = self.pending[:n]
+
+        advancing = np.flatnonzero(pending == ADVANCE)
+        if advancing.size:
+            progress = self.progress[advancing] + self.step_size[advancing]
+            self.progress[advancing] = progress
+            at_end = progress >= ROAD_END
+            moving = advancing[~at_end]
+            road = self.road[moving]
+            t = self.progress[moving]
+            self.x[moving] = self.road_x1[road] + (self.road_x2[road] - self.road_x1[road]) * t
+            self.y[moving] = self.road_y1[road] + (self.road_y2[road] - self.road_y1[road]) * t
+            road_ends = advancing[at_end]
+        else:
+            road_ends = advancing
+
+        turning = np.flatnonzero(pending == TURN)
+        if turning.size:
+            turn_progress = self.turn_progress[turning] + TURN_SPEED
+            self.turn_progress[turning] = turn_progress
+            done = turn_progress >= 1.0
+            # Finished turns are placed by the owner, which also switches road
+            arcing = turning[~done]
+            t = self.turn_progress[arcing]
+            eased = t * t * (3 - 2 * t)
+            self.x[arcing] = self.origin_x[arcing] + (self.target_x[arcing] - self.origin_x[arcing]) * eased
+            self.y[arcing] = self.origin_y[arcing] + (self.target_y[arcing] - self.origin_y[arcing]) * eased
+            turns_done = turning[done]
+        else:
+            turns_done = turning
+
+        pending[:] = IDLE
+        return road_ends, turns_done
+
+    async def step(self):
+        """Integrate the queued motion and hand road ends and finished turns back to their owners"""
+        road_ends, turns_done = self.integrate()
+        for slot in road_ends.tolist():
+            await self.owners[slot].on_road_end()
+        for slot in turns_done.tolist():
+            self.owners[slot].on_turn_complete()
+        return len(road_ends) + len(turns_done)
+
+    def positions(self):
+        """Return an (n, 2) view of every slot's coordinates"""
+        return np.column_stack((self.x[:self.size], self.y[:self.size]))
@@ -0,0 +1,138 @@
+"""
+Leveled, streaming logging for the traffic simulation.
+
+Every subsystem logs through its own child of the ``traffic`` logger
+(``traffic.vehicle``, ``traffic.parking``, ...), so levels can be set per
+subsystem. Records are handed to a queue and written by a background
+``QueueListener`` thread to a size-rotated file under ``LOGS/``; nothing is
+kept in memory and the simulation loop never blocks on disk I/O.
+
+Disabled levels cost a single ``isEnabledFor`` check: call sites use lazy
+``%``-style arguments, so no message is formatted unless it will be written.
+"""
+
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+ROOT_LOGGER = "traffic"
+SUBSYSTEMS = ("main", "network", "vehicle", "parking", "light", "crossing", "vis")
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+# "OFF" silences a subsystem completely
+OFF = logging.CRITICAL + 10
+logging.addLevelName(OFF, "OFF")
+
+_listener = None
+
+
+def get_logger(subsystem):
+    """Return the logger for one simulation subsystem
+
+    Args:
+        subsystem (str): One of SUBSYSTEMS
+
+    Returns:
+        logging.Logger: The ``traffic.<subsystem>`` logger
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def parse_level(name):
+    """Turn a level name ("debug", "INFO", "off", ...) into a logging level
+
+    Raises:
+        ValueError: If the name is not a known level
+    """
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"unknown log level: {name}")
+    return level
+
+
+def parse_levels(spec):
+    """Parse a per-subsystem override string such as "vehicle=DEBUG,parking=OFF"
+
+    Args:
+        spec (str): Comma separated subsystem=level pairs
+
+    Returns:
+        dict: Mapping of subsystem name to logging level
+
+    Raises:
+        ValueError: On a malformed pair, unknown subsystem or unknown level
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        subsystem, sep, level = item.partition("=")
+        subsystem = subsystem.strip()
+        if not sep or subsystem not in SUBSYSTEMS:
+            raise ValueError(f"expected <subsystem>=<level> with subsystem in {', '.join(SUBSYSTEMS)}, got {item!r}")
+        levels[subsystem] = parse_level(level.strip())
+    return levels
+
+
+def configure_logging(level="WARNING", levels=None, log_dir="LOGS", max_bytes=DEFAULT_MAX_BYTES,
+                      backup_count=DEFAULT_BACKUP_COUNT, console=False):
+    """Install the queue handler and start the background writer
+
+    Calling it again replaces the previous configuration.
+
+    Args:
+        level (str|int): Default level for every subsystem
+        levels (dict, optional): Per-subsystem overrides, as returned by parse_levels
+        log_dir (str, optional): Directory for the rotating log file; None disables the file
+        max_bytes (int): Size at which the log file is rotated
+        backup_count (int): Number of rotated files to keep
+        console (bool): Also write records to stderr
+
+    Returns:
+        str: Path of the log file, or None if no file is written
+    """
+    global _listener
+    shutdown_logging()
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(parse_level(level) if isinstance(level, str) else level)
+    root.propagate = False
+    for subsystem in SUBSYSTEMS:
+        get_logger(subsystem).setLevel((levels or {}).get(subsystem, logging.NOTSET))
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    log_path = None
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        log_path = os.path.join(log_dir, f"simulation_log_{timestamp}.txt")
+        # delay=True: no file is created for a run that logs nothing
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, *handlers)
+    _listener.start()
+    return log_path
+
+
+def shutdown_logging():
+    """Flush pending records, stop the background writer and close the log file"""
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,306 @@
+"""
+Procedural city generator for scale and benchmark scenarios.
+
+Builds grid and radial cities in the map config schema `main.py` loads:
+two-way streets made of one-way road segments between intersections, traffic
+lights at the intersections, pedestrian crossings and parking areas along the
+blocks, spawn/despawn gateway roads on the city edge and a fleet of vehicles
+entering through the gateways. The same seed always produces the same map.
+
+Usage:
+    python -m sim.mapgen grid --rows 20 --cols 30 --vehicles 200 --seed 1 -o grid.json
+    python -m sim.mapgen radial --rings 6 --spokes 12 -o radial.json
+    python -m sim.mapgen grid --roads 10000 --vehicles 1000 -o grid_10k.json
+
+Run the result with ``python main.py --config grid.json --headless``.
+"""
+
+import argparse
+import json
+import math
+import random
+
+from sim.controls import CROSSING_RANGE, LIGHT_RANGE
+
+# Distance between neighbouring intersections (map units)
+BLOCK_SIZE = 200
+# Parking areas sit this far to the side of their street, like the roadside lots of map_config.json
+PARKING_OFFSET = 20
+PARKING_TYPES = ("roadside", "street", "building")
+
+
+class CityBuilder:
+    """Accumulates intersections and streets and turns them into a map config
+
+    Every street between two intersections becomes a pair of one-way road
+    segments, one per direction, sharing the intersections' exact
+    coordinates so that the road network finds the turns between them. A
+    gateway adds an entry road (a spawn point) leading into an edge
+    intersection and an exit road (a despawn point) leading out of it.
+
+    Attributes:
+        random (random.Random): Generator behind every random choice
+        nodes (dict): Intersection name -> (x, y)
+        streets (list): (node, node) pairs, one per two-way street
+        gateways (list): (node, outside x, outside y) of each gateway
+    """
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+        self.nodes = {}
+        self.streets = []
+        self.gateways = []
+
+    def add_node(self, name, x, y):
+        self.nodes[name] = (round(x, 2), round(y, 2))
+
+    def add_street(self, a, b):
+        self.streets.append((a, b))
+
+    def add_gateway(self, node, x, y):
+        self.gateways.append((node, round(x, 2), round(y, 2)))
+
+    def build(self, vehicles=0, light_ratio=1.0, crossing_ratio=0.25, parking_ratio=0.1, capacity=2, demand_rate=None):
+        """Return the map config dict
+
+        Args:
+            vehicles (int): Size of the fleet, spread over the spawn points
+            light_ratio (float): Share of intersections (3+ streets) that get a traffic light
+            crossing_ratio (float): Share of streets that get a pedestrian crossing
+            parking_ratio (float): Share of streets that get a parking area
+            capacity (int): Vehicle capacity of every road
+            demand_rate (float, optional): Adds a ``demand`` section with this
+                rate (vehicles per minute per spawn point)
+        """
+        rng = self.random
+        roads = []
+        spawn_points = []
+        despawn_points = []
+
+        def road(road_id, a, b, spawn=False, despawn=False):
+            (x1, y1), (x2, y2) = a, b
+            roads.append({
+                "id": road_id, "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                "capacity": capacity, "color": "gray", "one_way": True,
+                "is_spawn_point": spawn, "is_despawn_point": despawn,
+            })
+
+        # Gateways first: a vehicle validating its spawn point finds its entry road's start first
+        for node, x, y in self.gateways:
+            road(f"entry_{node}", (x, y), self.nodes[node], spawn=True)
+            road(f"exit_{node}", self.nodes[node], (x, y), despawn=True)
+            spawn_points.append({"id": f"spawn_{node}", "road_id": f"entry_{node}", "x": x, "y": y})
+            despawn_points.append({"id": f"despawn_{node}", "road_id": f"exit_{node}", "x": x, "y": y})
+        for a, b in self.streets:
+            road(f"{a}_{b}", self.nodes[a], self.nodes[b])
+            road(f"{b}_{a}", self.nodes[b], self.nodes[a])
+
+        # Connections: every road ending at an intersection leads to every road leaving it but its own reverse
+        leaving, arriving = {}, {}
+        for r in roads:
+            leaving.setdefault((r["x1"], r["y1"]), []).append(r)
+            arriving.setdefault((r["x2"], r["y2"]), []).append(r)
+        for r in roads:
+            options = leaving.get((r["x2"], r["y2"]), [])
+            forward = [o["id"] for o in options if (o["x2"], o["y2"]) != (r["x1"], r["y1"])]
+            r["connections"] = forward or [o["id"] for o in options]
+
+        degree = {}
+        for a, b in self.streets:
+            degree[a] = degree.get(a, 0) + 1
+            degree[b] = degree.get(b, 0) + 1
+        traffic_lights = []
+        for name, (x, y) in self.nodes.items():
+            if degree.get(name, 0) >= 3 and rng.random() < light_ratio:
+                traffic_lights.append({"id": f"traffic_light_{len(traffic_lights) + 1}", "x": x, "y": y})
+
+        crossings, parking_areas = [], []
+        for a, b in self.streets:
+            (x1, y1), (x2, y2) = self.nodes[a], self.nodes[b]
+            length = math.hypot(x2 - x1, y2 - y1)
+            mx, my = (x1 + x2) / 2, (y1 + y2) / 2
+            # Keep mid-block crossings out of the lights' detection range
+            if length > 2 * (LIGHT_RANGE + CROSSING_RANGE) and rng.random() < crossing_ratio:
+                crossings.append({"id": f"crossing_{len(crossings) + 1}", "x": round(mx, 2), "y": round(my, 2)})
+            if rng.random() < parking_ratio:
+                side = rng.choice((-1, 1)) * PARKING_OFFSET / length
+                # Quarter of the way along the block, clear of a mid-block crossing
+                px = x1 + (x2 - x1) / 4 - (y2 - y1) * side
+                py = y1 + (y2 - y1) / 4 + (x2 - x1) * side
+                kind = rng.choice(PARKING_TYPES)
+                building = kind == "building"
+                parking_areas.append({
+                    "id": f"parking_{len(parking_areas) + 1}", "x": round(px, 2), "y": round(py, 2),
+                    "capacity": 5 if building else 2, "parking_time": 3 if building else 2,
+                    "exit_time": 2 if building else 1, "type": kind,
+                })
+
+        if vehicles and not spawn_points:
+            raise ValueError("A map with vehicles needs at least one gateway to spawn them at")
+        fleet = []
+        for n in range(vehicles):
+            sp = spawn_points[n % len(spawn_points)]
+            fleet.append({"id": f"vehicle_{n + 1}", "x": sp["x"], "y": sp["y"], "spawn": True})
+
+        config = {
+            "vehicles": fleet,
+            "traffic_lights": traffic_lights,
+            "crossings": crossings,
+            "parking_areas": parking_areas,
+            "roads": roads,
+            "spawn_points": spawn_points,
+            "despawn_points": despawn_points,
+        }
+        if demand_rate is not None:
+            config["demand"] = {"rate": demand_rate, "seed": rng.randrange(2**31)}
+        return config
+
+
+def _spread(items, count):
+    """Pick `count` evenly spaced items (all of them when count is None)"""
+    if count is None or count >= len(items):
+        return list(items)
+    if count <= 0:
+        return []
+    return [items[int(k * len(items) / count)] for k in range(count)]
+
+
+def grid_city(rows, cols, block_size=BLOCK_SIZE, gateways=None, seed=None, **options):
+    """Generate a Manhattan grid of `rows` x `cols` blocks
+
+    Args:
+        rows, cols (int): Number of blocks down and across
+        block_size (float): Street length between intersections
+        gateways (int, optional): Number of edge intersections with an entry
+            and exit road, evenly spaced around the city (default: all)
+        seed (int, optional): Random seed
+        **options: Passed to `CityBuilder.build`
+
+    Returns:
+        dict: Map config
+    """
+    builder = CityBuilder(seed)
+    margin = block_size / 2
+    name = lambda i, j: f"r{i}c{j}"
+    for i in range(rows + 1):
+        for j in range(cols + 1):
+            builder.add_node(name(i, j), margin + j * block_size, margin + i * block_size)
+            if j < cols:
+                builder.add_street(name(i, j), name(i, j + 1))
+            if i < rows:
+                builder.add_street(name(i, j), name(i + 1, j))
+
+    # Walk the edge clockwise; each gateway road leads straight out of the grid
+    edge = [(0, j, 0, -1) for j in range(cols + 1)]
+    edge += [(i, cols, 1, 0) for i in range(1, rows + 1)]
+    edge += [(rows, j, 0, 1) for j in range(cols - 1, -1, -1)]
+    edge += [(i, 0, -1, 0) for i in range(rows - 1, 0, -1)]
+    for i, j, dx, dy in _spread(edge, gateways):
+        x, y = builder.nodes[name(i, j)]
+        builder.add_gateway(name(i, j), x + dx * margin, y + dy * margin)
+    return builder.build(**options)
+
+
+def radial_city(rings, spokes, ring_spacing=BLOCK_SIZE, gateways=None, seed=None, **options):
+    """Generate a radial city of `rings` ring roads crossed by `spokes` avenues
+
+    The avenues meet at a central hub. The inner ring is made wide enough
+    that its blocks are at least half as long as `ring_spacing`.
+
+    Args:
+        rings, spokes (int): Number of ring roads and radial avenues
+        ring_spacing (float): Distance between neighbouring rings
+        gateways (int, optional): Number of outer-ring intersections with an
+            entry and exit road, evenly spaced (default: all)
+        seed (int, optional): Random seed
+        **options: Passed to `CityBuilder.build`
+
+    Returns:
+        dict: Map config
+    """
+    builder = CityBuilder(seed)
+    inner = max(ring_spacing, spokes * ring_spacing / (4 * math.pi))
+    outer = inner + (rings - 1) * ring_spacing
+    margin = ring_spacing / 2
+    center = outer + margin
+    name = lambda r, k: f"ring{r}s{k}"
+    builder.add_node("hub", center, center)
+    for r in range(rings):
+        radius = inner + r * ring_spacing
+        for k in range(spokes):
+            angle = 2 * math.pi * k / spokes
+            builder.add_node(name(r, k), center + radius * math.cos(angle), center + radius * math.sin(angle))
+    for k in range(spokes):
+        builder.add_street("hub", name(0, k))
+        for r in range(rings):
+            if r + 1 < rings:
+                builder.add_street(name(r, k), name(r + 1, k))
+            builder.add_street(name(r, k), name(r, (k + 1) % spokes))
+
+    for k in _spread(range(spokes), gateways):
+        angle = 2 * math.pi * k / spokes
+        builder.add_gateway(name(rings - 1, k),
+                            center + (outer + margin) * math.cos(angle), center + (outer + margin) * math.sin(angle))
+    return builder.build(**options)
+
+
+def size_for_roads(layout, roads):
+    """Return the (rows, cols) or (rings, spokes) giving roughly `roads` road segments
+
+    A square grid of n x n blocks has 4n(n + 1) street segments plus 8n
+    gateway roads; a radial city with s spokes and s / 2 rings has about 2s^2.
+    """
+    if layout == "grid":
+        n = max(1, round((-12 + math.sqrt(144 + 16 * roads)) / 8))
+        return n, n
+    spokes = max(4, round(math.sqrt(roads / 2)))
+    return max(1, spokes // 2), spokes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a large city map config for scale and benchmark runs")
+    parser.add_argument("layout", choices=["grid", "radial"])
+    parser.add_argument("--rows", type=int, default=10, help="Grid: blocks down")
+    parser.add_argument("--cols", type=int, default=10, help="Grid: blocks across")
+    parser.add_argument("--rings", type=int, default=5, help="Radial: number of ring roads")
+    parser.add_argument("--spokes", type=int, default=12, help="Radial: number of avenues")
+    parser.add_argument("--roads", type=int, default=None,
+                        help="Size the city for about this many road segments (overrides rows/cols/rings/spokes)")
+    parser.add_argument("--block-size", type=float, default=BLOCK_SIZE)
+    parser.add_argument("--gateways", type=int, default=None, help="Number of spawn/despawn gateways (default: every edge intersection)")
+    parser.add_argument("--vehicles", type=int, default=30)
+    parser.add_argument("--light-ratio", type=float, default=1.0)
+    parser.add_argument("--crossing-ratio", type=float, default=0.25)
+    parser.add_argument("--parking-ratio", type=float, default=0.1)
+    parser.add_argument("--capacity", type=int, default=2, help="Vehicle capacity of every road")
+    parser.add_argument("--demand-rate", type=float, default=None, help="Add a demand section with this rate (vehicles/minute per spawn point)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.gateways is not None and args.gateways < 1 and args.vehicles > 0:
+        parser.error("--gateways must be at least 1 when the map has vehicles")
+
+    options = dict(
+        gateways=args.gateways, seed=args.seed, vehicles=args.vehicles, light_ratio=args.light_ratio,
+        crossing_ratio=args.crossing_ratio, parking_ratio=args.parking_ratio, capacity=args.capacity,
+        demand_rate=args.demand_rate,
+    )
+    if args.layout == "grid":
+        rows, cols = size_for_roads("grid", args.roads) if args.roads else (args.rows, args.cols)
+        config = grid_city(rows, cols, block_size=args.block_size, **options)
+    else:
+        rings, spokes = size_for_roads("radial", args.roads) if args.roads else (args.rings, args.spokes)
+        config = radial_city(rings, spokes, ring_spacing=args.block_size, **options)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(config, f, separators=(",", ":"))
+        print(f"{args.output}: {len(config['roads'])} roads, {len(config['traffic_lights'])} lights, "
+              f"{len(config['crossings'])} crossings, {len(config['parking_areas'])} parking areas, "
+              f"{len(config['spawn_points'])} gateways, {len(config['vehicles'])} vehicles")
+    else:
+        print(json.dumps(config, separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import math
+from types import MappingProxyType
+from shapely.geometry import LineString
+from sim.log import get_logger
+
+logger = get_logger("network")
+
+# Furthest a vehicle's start point may be from a road end for the vehicle to be moved onto that road
+SNAP_DISTANCE = 100
+
+
+def get_exact_intersection_point(road1, road2):
+    line1 = LineString([(road1[0], road1[1]), (road1[2], road1[3])])
+    line2 = LineString([(road2[0], road2[1]), (road2[2], road2[3])])
+    inter = line1.intersection(line2)
+    return tuple(inter.coords[0]) if inter.geom_type == 'Point' else None
+
+
+def road_direction(road):
+    """Cardinal direction (N/S/E/W) a road segment points in"""
+    x1, y1, x2, y2 = road[:4]
+    dx = x2 - x1
+    dy = y2 - y1
+    if abs(dx) > abs(dy):
+        return "E" if dx > 0 else "W"
+    else:
+        return "S" if dy > 0 else "N"
+
+
+def is_opposite_direction(d1, d2):
+    """True if one is N and the other S, or E vs W."""
+    opp = {"N": "S", "S": "N", "E": "W", "W": "E"}
+    return opp.get(d1) == d2
+
+
+class RoadNetwork:
+    """Compiled, read-only road graph shared by every vehicle
+
+    Built once from the tuples produced by `prepare_road_tuples` so that
+    vehicles no longer process road properties, guess default connections and
+    run shapely intersections in their own constructors. All containers are
+    immutable (tuples, frozensets and mapping proxies) so a single instance
+    can safely be shared by reference.
+
+    Adjacency and turn movements are stored CSR-style: the successors of road
+    ``i`` are ``conn_targets[conn_offsets[i]:conn_offsets[i + 1]]`` and its turn
+    movements are ``turn_*[turn_offsets[i]:turn_offsets[i + 1]]``.
+
+    Attributes:
+        roads (tuple): Road tuples (x1, y1, x2, y2, capacity, id, one_way, spawn, despawn, connections)
+        road_index (Mapping): Road ID -> road index
+        one_way_roads (frozenset): Indices of one-way roads
+        spawn_points (Mapping): Index -> True for spawn roads
+        despawn_points (Mapping): Index -> True for despawn roads
+        road_connections (Mapping): Index -> tuple of successor indices
+        turn_options (Mapping): Index -> tuple of (next_idx, intersection, from_dir, to_dir)
+        directions (tuple): Cardinal direction of each road
+        lengths (tuple): Euclidean length of each road
+
+    Road ends are also bucketed on a grid of SNAP_DISTANCE cells, so
+    `nearest_road_end()` only looks at the roads around a point.
+    """
+
+    def __init__(self, roads):
+        self.roads = tuple(roads)
+        n = len(self.roads)
+
+        self.road_index = MappingProxyType(
+            {road[5]: i for i, road in enumerate(self.roads) if len(road) >= 6}
+        )
+        self.one_way_roads = frozenset(i for i, r in enumerate(self.roads) if len(r) >= 7 and r[6])
+        self.spawn_points = MappingProxyType({i: True for i, r in enumerate(self.roads) if len(r) >= 8 and r[7]})
+        self.despawn_points = MappingProxyType({i: True for i, r in enumerate(self.roads) if len(r) >= 9 and r[8]})
+        self.directions = tuple(road_direction(r) for r in self.roads)
+        self.lengths = tuple(math.hypot(r[2] - r[0], r[3] - r[1]) for r in self.roads)
+
+        # Explicit connections, or a geometric guess when the map has none
+        explicit = {i: list(r[9]) for i, r in enumerate(self.roads)
+                    if len(r) >= 10 and isinstance(r[9], list)}
+        if not explicit:
+            explicit = self._calculate_default_connections()
+
+        # CSR adjacency
+        conn_offsets = [0]
+        conn_targets = []
+        for i in range(n):
+            conn_targets.extend(explicit.get(i, ()))
+            conn_offsets.append(len(conn_targets))
+        self.conn_offsets = tuple(conn_offsets)
+        self.conn_targets = tuple(conn_targets)
+        self.road_connections = MappingProxyType(
+            {i: self.connections(i) for i in explicit}
+        )
+
+        # Intersection points for every connected pair, computed exactly once
+        intersections = {}
+        for i in range(n):
+            for j in self.connections(i):
+                if i != j and (i, j) not in intersections:
+                    intersections[(i, j)] = get_exact_intersection_point(self.roads[i], self.roads[j])
+        self.intersections = MappingProxyType(intersections)
+
+        # CSR turn movements
+        turn_offsets = [0]
+        turn_targets, turn_points = [], []
+        for i in range(n):
+            for j in self.connections(i):
+                if i == j:
+                    continue
+                inter = intersections[(i, j)]
+                if not inter or not self._enters_one_way_correctly(j, inter):
+                    continue
+                # skip direct U-turn based on cardinal direction
+                if is_opposite_direction(self.directions[i], self.directions[j]):
+                    continue
+                turn_targets.append(j)
+                turn_points.append(inter)
+            turn_offsets.append(len(turn_targets))
+        self.turn_offsets = tuple(turn_offsets)
+        self.turn_targets = tuple(turn_targets)
+        self.turn_points = tuple(turn_points)
+        self.turn_options = MappingProxyType({
+            i: tuple(
+                (self.turn_targets[k], self.turn_points[k], self.directions[i], self.directions[self.turn_targets[k]])
+                for k in range(self.turn_offsets[i], self.turn_offsets[i + 1])
+            )
+            for i in range(n) if self.turn_offsets[i + 1] > self.turn_offsets[i]
+        })
+
+        # Grid of road ends: (cell x, cell y) -> indices of the roads with an end in the cell
+        end_cells = {}
+        for i, r in enumerate(self.roads):
+            if len(r) < 4:
+                continue
+            for key in {self._cell(r[0], r[1]), self._cell(r[2], r[3])}:
+                end_cells.setdefault(key, []).append(i)
+        self._end_cells = MappingProxyType({key: tuple(roads) for key, roads in end_cells.items()})
+
+        logger.info("=== Road Network ===")
+        logger.info("Roads: %s", n)
+        logger.info("One-ways: %s", len(self.one_way_roads))
+        logger.info("Spawns: %s", len(self.spawn_points))
+        logger.info("Despawns: %s => %s", len(self.despawn_points), dict(self.despawn_points))
+        logger.info("Connections: %s, turn movements: %s", len(self.conn_targets), len(self.turn_targets))
+
+    def __len__(self):
+        return len(self.roads)
+
+    def connections(self, road_idx):
+        """Return the successor road indices of `road_idx`"""
+        return self.conn_targets[self.conn_offsets[road_idx]:self.conn_offsets[road_idx + 1]]
+
+    @staticmethod
+    def _cell(x, y):
+        return math.floor(x / SNAP_DISTANCE), math.floor(y / SNAP_DISTANCE)
+
+    def nearest_road_end(self, x, y):
+        """Return the road whose start or end is nearest to (x, y), if closer than SNAP_DISTANCE
+
+        Ties go to the lowest road index, and to a road's end over its start.
+
+        Returns:
+            tuple: (road index, progress, distance), progress being 0.0 at the
+            road's start and 1.0 at its end; None if no road end is close enough
+        """
+        cx, cy = self._cell(x, y)
+        best, best_sq = None, SNAP_DISTANCE * SNAP_DISTANCE
+        for i in range(cx - 1, cx + 2):
+            for j in range(cy - 1, cy + 2):
+                for idx in self._end_cells.get((i, j), ()):
+                    r = self.roads[idx]
+                    d_start = (r[0] - x) ** 2 + (r[1] - y) ** 2
+                    d_end = (r[2] - x) ** 2 + (r[3] - y) ** 2
+                    d_sq = min(d_start, d_end)
+                    if d_sq < best_sq or (d_sq == best_sq and best is not None and idx < best[0]):
+                        best_sq = d_sq
+                        best = (idx, 0.0 if d_start < d_end else 1.0)
+        if best is None:
+            return None
+        return best[0], best[1], math.sqrt(best_sq)
+
+    def intersection(self, from_idx, to_idx):
+        """Return the cached intersection point of two roads, or None"""
+        key = (from_idx, to_idx)
+        if key in self.intersections:
+            return self.intersections[key]
+        return get_exact_intersection_point(self.roads[from_idx], self.roads[to_idx])
+
+    def _enters_one_way_correctly(self, road_idx, inter):
+        """If road `road_idx` is one-way, the intersection must be nearer its start than its end"""
+        if road_idx not in self.one_way_roads:
+            return True
+        x1, y1, x2, y2 = self.roads[road_idx][:4]
+        dist_to_start = math.sqrt((inter[0] - x1)**2 + (inter[1] - y1)**2)
+        dist_to_end = math.sqrt((inter[0] - x2)**2 + (inter[1] - y2)**2)
+        # Allow a small tolerance (e.g., 10 units) for near-exact matches
+        if dist_to_start > dist_to_end + 10:
+            logger.debug("Road network: Skipping turn onto one-way road %s - wrong direction entry at %s.", road_idx, inter)
+            return False
+        return True
+
+    def _calculate_default_connections(self):
+        """If roads have no explicit connections, guess by geometry (end of one is near start of another)."""
+        logger.info("Road network: Calculating default connections by geometry.")
+        connections = {}
+        for i, road1 in enumerate(self.roads):
+            conns = []
+            end_x, end_y = road1[2], road1[3]
+            for j, road2 in enumerate(self.roads):
+                if i == j:
+                    continue
+                if math.sqrt((end_x - road2[0])**2 + (end_y - road2[1])**2) < 60:
+                    conns.append(j)
+            if conns:
+                connections[i] = conns
+        return connections
@@ -0,0 +1,66 @@
+from array import array
+
+
+class RoadOccupancy:
+    """Central, array-backed count of driving vehicles per road
+
+    One instance is shared by every vehicle, the visualizer and the final
+    statistics. Vehicles update it incrementally when they enter or leave a
+    road, so capacity checks are O(1) array reads and nobody has to rescan
+    the fleet to know how busy a road is.
+
+    Attributes:
+        network (RoadNetwork): Road network the index is keyed on
+        counts (array): Vehicles currently on each road, by road index
+        capacities (array): Capacity of each road, by road index
+        peaks (array): Highest count seen on each road, by road index
+    """
+
+    def __init__(self, network):
+        self.network = network
+        n = len(network.roads)
+        self.counts = array('i', bytes(4 * n))
+        self.peaks = array('i', bytes(4 * n))
+        # Roads without a capacity entry are treated as unlimited
+        self.capacities = array('i', (
+            int(road[4]) if len(road) >= 6 else 2**31 - 1
+            for road in network.roads
+        ))
+
+    def enter(self, road_idx):
+        """Record a vehicle entering road `road_idx` and return the new count"""
+        count = self.counts[road_idx] + 1
+        self.counts[road_idx] = count
+        if count > self.peaks[road_idx]:
+            self.peaks[road_idx] = count
+        return count
+
+    def leave(self, road_idx):
+        """Record a vehicle leaving road `road_idx` and return the new count"""
+        count = self.counts[road_idx]
+        if count > 0:
+            count -= 1
+            self.counts[road_idx] = count
+        return count
+
+    def count(self, road_idx):
+        """Number of vehicles currently on road `road_idx`"""
+        return self.counts[road_idx]
+
+    def has_capacity(self, road_idx):
+        """True if another vehicle may enter road `road_idx`"""
+        if road_idx < 0 or road_idx >= len(self.counts):
+            return False
+        return self.counts[road_idx] < self.capacities[road_idx]
+
+    def count_by_id(self, road_id):
+        """Number of vehicles on the road with ID `road_id` (0 if unknown)"""
+        road_idx = self.network.road_index.get(road_id)
+        return self.counts[road_idx] if road_idx is not None else 0
+
+    def snapshot(self):
+        """Return {road_id: (count, capacity, peak)} for reporting"""
+        return {
+            road[5]: (self.counts[i], self.capacities[i], self.peaks[i])
+            for i, road in enumerate(self.network.roads) if len(road) >= 6
+        }
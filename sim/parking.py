@@ -0,0 +1,90 @@
+import math
+
+# Search radius the vehicles used when looking for a parking area
+PARKING_RANGE = 150
+
+
+class ParkingIndex:
+    """Grid index of parking areas plus a shared table of free spaces
+
+    Parking areas are bucketed into square cells of `cell_size`, so a search
+    only looks at the cells overlapping the search radius instead of every
+    lot on the map. Parking agents publish their occupancy into the table
+    whenever it changes, which lets a vehicle pick the nearest lot that still
+    has room and send it a single park request instead of asking each lot in
+    range until one accepts.
+
+    The table is seeded with the configured capacities, so every lot starts
+    out empty.
+
+    Attributes:
+        cell_size (float): Edge length of a grid cell (map units)
+        positions (dict): Parking ID -> (x, y)
+        capacity (dict): Parking ID -> number of spaces
+        occupancy (dict): Parking ID -> spaces in use, as last published
+        version (int): Number of occupancy changes published
+    """
+
+    def __init__(self, parking_areas=None, cell_size=PARKING_RANGE):
+        self.cell_size = cell_size
+        self.positions = {}
+        self.capacity = {}
+        self.occupancy = {}
+        self.version = 0
+        self._cells = {}  # (cell x, cell y) -> [parking IDs]
+        for p in parking_areas or []:
+            self.add(p["id"], p["x"], p["y"], p.get("capacity", 0))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def add(self, parking_id, x, y, capacity):
+        """Index a parking area at (x, y) with `capacity` free spaces"""
+        if parking_id in self.positions:
+            self._cells[self._cell(*self.positions[parking_id])].remove(parking_id)
+        self.positions[parking_id] = (x, y)
+        self.capacity[parking_id] = capacity
+        self.occupancy.setdefault(parking_id, 0)
+        self._cells.setdefault(self._cell(x, y), []).append(parking_id)
+
+    def publish(self, parking_id, occupancy, capacity=None):
+        """Record the current occupancy of a parking area; returns True if it changed"""
+        if capacity is not None:
+            self.capacity[parking_id] = capacity
+        if self.occupancy.get(parking_id) == occupancy:
+            return False
+        self.occupancy[parking_id] = occupancy
+        self.version += 1
+        return True
+
+    def available(self, parking_id):
+        """Return the number of free spaces last published for `parking_id`"""
+        return self.capacity.get(parking_id, 0) - self.occupancy.get(parking_id, 0)
+
+    def nearest_available(self, x, y, radius=PARKING_RANGE, exclude=()):
+        """Return the nearest parking area with a free space within `radius`
+
+        Args:
+            x, y (float): Search position
+            radius (float): Only lots strictly closer than this are considered
+            exclude (iterable): Parking IDs to skip (e.g. recently visited)
+
+        Returns:
+            str: The parking ID, or None if no lot in range has room
+        """
+        reach = math.ceil(radius / self.cell_size)
+        cell_x, cell_y = self._cell(x, y)
+        best, best_distance = None, radius
+        for i in range(cell_x - reach, cell_x + reach + 1):
+            for j in range(cell_y - reach, cell_y + reach + 1):
+                for parking_id in self._cells.get((i, j), ()):
+                    if self.occupancy[parking_id] >= self.capacity[parking_id] or parking_id in exclude:
+                        continue
+                    px, py = self.positions[parking_id]
+                    distance = math.hypot(x - px, y - py)
+                    if distance < best_distance:
+                        best, best_distance = parking_id, distance
+        return best
@@ -0,0 +1,167 @@
+import contextvars
+import json
+import time
+
+from sim.stats import RunningStats
+
+
+class HandlerStats:
+    """Latency and nested-send fan-out of one (agent class, command) pair
+
+    Attributes:
+        latency (RunningStats): Handler wall time (seconds), including the replies it awaited
+        sends (int): send_message calls made while the handler ran
+        max_sends (int): Most send_message calls made by a single call
+    """
+
+    __slots__ = ("latency", "sends", "max_sends")
+
+    def __init__(self):
+        self.latency = RunningStats()
+        self.sends = 0
+        self.max_sends = 0
+
+    def summary(self):
+        summary = self.latency.summary()
+        summary["sends"] = self.sends
+        summary["sends_per_call"] = self.sends / summary["count"] if summary["count"] else 0.0
+        summary["max_sends"] = self.max_sends
+        return summary
+
+
+# Stats and send count of the handler running in the current task
+_current_call = contextvars.ContextVar("current_handler_call", default=None)
+
+
+class _ProfiledHandler:
+    """Stands in for a message handler in an agent's dispatch table and times it"""
+
+    __slots__ = ("handler", "profiler", "agent_type", "router")
+
+    def __init__(self, handler, profiler, agent_type):
+        self.handler = handler
+        self.profiler = profiler
+        self.agent_type = agent_type
+        self.router = handler.router
+
+    async def __call__(self, agent, message, ctx):
+        stats = self.profiler.stats_for(self.agent_type, command_of(message))
+        call = [stats, 0]
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        try:
+            return await self.handler(agent, message, ctx)
+        finally:
+            stats.latency.add(time.perf_counter() - start)
+            _current_call.reset(token)
+            stats.sends += call[1]
+            if call[1] > stats.max_sends:
+                stats.max_sends = call[1]
+
+
+def command_of(message):
+    """Name a message for profiling: the command word of a MyMessageType, else its type name"""
+    content = getattr(message, "content", None)
+    if isinstance(content, str):
+        words = content.split(maxsplit=1)
+        return words[0].lower() if words else "(empty)"
+    return type(message).__name__
+
+
+class HandlerProfiler:
+    """Opt-in per-handler profiler for the simulation agents
+
+    Once installed with `set_profiler`, every agent created afterwards gets
+    its message handlers (`handle_my_message_type`, its overrides and the
+    typed handlers) wrapped. Each call is recorded per agent class and
+    command. `attach(runtime)` also counts the `send_message` calls made
+    while a handler runs, i.e. its nested fan-out. Agents created while no
+    profiler is installed are not wrapped and pay nothing.
+
+    `report()` can be called at any time, including while the simulation
+    is running.
+
+    Attributes:
+        stats (dict): (agent class, command) -> HandlerStats
+        unattributed_sends (int): send_message calls made outside any handler (clock events, main loop)
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.unattributed_sends = 0
+
+    def stats_for(self, agent_type, command):
+        key = (agent_type, command)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = HandlerStats()
+        return stats
+
+    def instrument(self, agent):
+        """Wrap the message handlers of a freshly created RoutedAgent"""
+        agent_type = type(agent).__name__
+        for handlers in agent._handlers.values():
+            handlers[:] = [h if isinstance(h, _ProfiledHandler) else _ProfiledHandler(h, self, agent_type)
+                           for h in handlers]
+
+    def attach(self, runtime):
+        """Count the send_message calls each handler makes on `runtime`"""
+        send_message = runtime.send_message
+
+        async def counted_send_message(*args, **kwargs):
+            call = _current_call.get()
+            if call is None:
+                self.unattributed_sends += 1
+            else:
+                call[1] += 1
+            return await send_message(*args, **kwargs)
+
+        runtime.send_message = counted_send_message
+
+    def report(self):
+        """Return per-handler and per-agent-class summaries, hottest (most total time) first"""
+        handlers = [
+            dict(agent_type=agent_type, command=command, **stats.summary())
+            for (agent_type, command), stats in self.stats.items()
+        ]
+        handlers.sort(key=lambda entry: entry["total"], reverse=True)
+
+        agent_types = {}
+        for (agent_type, _), stats in self.stats.items():
+            merged = agent_types.setdefault(agent_type, HandlerStats())
+            merged.latency.merge(stats.latency)
+            merged.sends += stats.sends
+            merged.max_sends = max(merged.max_sends, stats.max_sends)
+        by_agent_type = {agent_type: stats.summary() for agent_type, stats in agent_types.items()}
+
+        return {"handlers": handlers, "agent_types": by_agent_type, "unattributed_sends": self.unattributed_sends}
+
+    def format_report(self, limit=20):
+        """Return the hottest handlers as a text table"""
+        lines = [f"{'agent':<32}{'command':<20}{'calls':>9}{'total s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'sends':>9}"]
+        for entry in self.report()["handlers"][:limit]:
+            lines.append(
+                f"{entry['agent_type']:<32}{entry['command']:<20}{entry['count']:>9}{entry['total']:>10.3f}"
+                f"{entry['p50'] * 1e3:>9.3f}{entry['p95'] * 1e3:>9.3f}{entry['p99'] * 1e3:>9.3f}{entry['sends']:>9}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Write report() to `path` as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+_profiler = None
+
+
+def get_profiler():
+    """Return the installed handler profiler, or None when profiling is off"""
+    return _profiler
+
+
+def set_profiler(profiler):
+    """Install `profiler` (None turns profiling off for agents created afterwards) and return it"""
+    global _profiler
+    _profiler = profiler
+    return _profiler
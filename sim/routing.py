@@ -0,0 +1,153 @@
+import heapq
+from sim.log import get_logger
+
+logger = get_logger("network")
+
+
+class RoutePlanner:
+    """Shortest-path trip planner on the compiled road connection graph
+
+    Vehicles drive origin-destination trips instead of wandering: a trip ends
+    on one of the network's despawn roads, and at every junction the vehicle
+    takes the next road of the cheapest route from where it is to its
+    destination. Routes are found with Dijkstra on the CSR connection graph,
+    where entering road ``j`` costs ``costs[j]`` (its length by default).
+
+    Routes are memoized per (origin, destination) pair, so a vehicle that
+    deviates from its route (a full road, a missing turn) simply looks up the
+    route from its new road. Changing a road cost only drops the routes it
+    can affect: when a road gets more expensive, the cached routes through
+    it; when it gets cheaper, every route (any of them might now use it).
+
+    Attributes:
+        network (RoadNetwork): Road graph the routes are planned on
+        costs (list): Cost of driving each road
+        version (int): Number of cost changes so far
+        hits, misses (int): Route lookups answered from / missing in the cache
+    """
+
+    def __init__(self, network, costs=None):
+        self.network = network
+        self.costs = list(costs) if costs is not None else list(network.lengths)
+        self.version = 0
+        self._routes = {}  # (origin, destination) -> tuple of road indices, or None if unreachable
+        self._routes_by_road = {}  # road index -> keys of the cached routes that use it
+        self._destinations = {}  # origin -> reachable despawn roads
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._routes)
+
+    def route(self, origin, destination):
+        """Return the cheapest road sequence from `origin` to `destination`
+
+        Returns:
+            tuple: Road indices starting with `origin` and ending with
+                `destination`, or None if the destination cannot be reached
+        """
+        key = (origin, destination)
+        if key in self._routes:
+            self.hits += 1
+            return self._routes[key]
+        self.misses += 1
+        route = self._shortest_path(origin, destination)
+        self._routes[key] = route
+        for road_idx in route or ():
+            self._routes_by_road.setdefault(road_idx, set()).add(key)
+        return route
+
+    def next_road(self, origin, destination):
+        """Return the road to take after `origin` on the way to `destination`, or None"""
+        route = self.route(origin, destination)
+        if route is None or len(route) < 2:
+            return None
+        return route[1]
+
+    def destinations(self, origin):
+        """Return the despawn roads a trip starting on `origin` can end on
+
+        The origin itself is only offered when no other despawn road is reachable.
+        """
+        if origin not in self._destinations:
+            seen = self._reachable(origin)
+            reachable = [d for d in self.network.despawn_points if d != origin and d in seen]
+            if not reachable and origin in self.network.despawn_points:
+                reachable = [origin]
+            self._destinations[origin] = tuple(reachable)
+        return self._destinations[origin]
+
+    def set_cost(self, road_idx, cost):
+        """Change the cost of driving road `road_idx` and drop the routes it affects
+
+        Returns:
+            int: Number of cached routes dropped
+        """
+        old_cost = self.costs[road_idx]
+        if old_cost == cost:
+            return 0
+        self.costs[road_idx] = cost
+        self.version += 1
+        if cost < old_cost:
+            return self.invalidate()
+        keys = self._routes_by_road.pop(road_idx, ())
+        for key in keys:
+            route = self._routes.pop(key, None)
+            for other in route or ():
+                if other != road_idx:
+                    self._routes_by_road[other].discard(key)
+        return len(keys)
+
+    def invalidate(self):
+        """Forget every memoized route; returns how many were dropped
+
+        Reachability does not depend on the costs, so the destinations stay cached.
+        """
+        dropped = len(self._routes)
+        self._routes.clear()
+        self._routes_by_road.clear()
+        return dropped
+
+    def _reachable(self, origin):
+        """Return the set of roads reachable from `origin` (one graph search, no costs)"""
+        offsets, targets = self.network.conn_offsets, self.network.conn_targets
+        seen = {origin}
+        stack = [origin]
+        while stack:
+            road = stack.pop()
+            for nxt in targets[offsets[road]:offsets[road + 1]]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return seen
+
+    def _shortest_path(self, origin, destination):
+        """Dijkstra from `origin`, stopping as soon as `destination` is settled"""
+        if origin == destination:
+            return (origin,)
+        network, costs = self.network, self.costs
+        offsets, targets = network.conn_offsets, network.conn_targets
+        best = {origin: 0.0}
+        previous = {}
+        heap = [(0.0, origin)]
+        while heap:
+            cost, road = heapq.heappop(heap)
+            if road == destination:
+                break
+            if cost > best[road]:
+                continue  # stale entry
+            for k in range(offsets[road], offsets[road + 1]):
+                nxt = targets[k]
+                new_cost = cost + costs[nxt]
+                if new_cost < best.get(nxt, float("inf")):
+                    best[nxt] = new_cost
+                    previous[nxt] = road
+                    heapq.heappush(heap, (new_cost, nxt))
+        else:
+            logger.debug("Route planner: road %s cannot reach road %s", origin, destination)
+            return None
+
+        route = [destination]
+        while route[-1] != origin:
+            route.append(previous[route[-1]])
+        return tuple(reversed(route))
@@ -0,0 +1,149 @@
+import math
+import random
+from bisect import bisect_right
+from collections import deque
+
+
+class DemandModel:
+    """Poisson vehicle arrivals at the spawn points, shaped by a time-of-day profile
+
+    Each spawn point has a base arrival rate in vehicles per simulated
+    minute. The rate is multiplied by the factor of the time-of-day profile
+    in force at the current simulated hour, and every step draws the number
+    of arrivals at each spawn point from a Poisson distribution. Draws come
+    from the model's own seeded random generator, so the demand does not
+    depend on how many random numbers the agents use.
+
+    Built from the optional ``demand`` section of a map config::
+
+        "demand": {
+            "rate": 2.0,                        # vehicles/minute at every spawn point
+            "spawn_rates": {"spawn_left": 4.0}, # per spawn point overrides
+            "start_hour": 7.0,                  # simulated clock time at step 0
+            "profile": [[0, 0.2], [7, 1.5], [10, 1.0], [16, 1.5], [19, 0.5]],
+            "seed": 42
+        }
+
+    ``profile`` holds ``[hour, factor]`` pairs. A factor applies from its hour
+    until the next pair and wraps around midnight. Without a profile the
+    factor is always 1.
+
+    Attributes:
+        spawn_points (list): Spawn point configs (id, x, y, road_id)
+        rates (list): Base arrival rate of each spawn point (vehicles per simulated minute)
+        start_hour (float): Time of day at simulated time 0
+        profile (list): Sorted (hour, factor) pairs
+        arrivals_drawn (int): Total arrivals generated so far
+    """
+
+    def __init__(self, spawn_points, rate=0.0, spawn_rates=None, profile=None, start_hour=0.0, seed=None):
+        self.spawn_points = list(spawn_points)
+        spawn_rates = spawn_rates or {}
+        self.rates = [float(spawn_rates.get(sp.get("id"), rate)) for sp in self.spawn_points]
+        self.start_hour = start_hour
+        self.profile = sorted((float(hour) % 24, float(factor)) for hour, factor in (profile or []))
+        self._hours = [hour for hour, _ in self.profile]
+        self.random = random.Random(seed)
+        self.arrivals_drawn = 0
+
+    @classmethod
+    def from_config(cls, config, spawn_points, seed=None):
+        """Build the model from a map config's ``demand`` section, or return None if it has none
+
+        Args:
+            config (dict): Parsed map config
+            spawn_points (list): Spawn points vehicles can be generated at
+            seed (int, optional): Overrides the config's seed
+        """
+        demand = config.get("demand")
+        if not demand:
+            return None
+        return cls(
+            spawn_points,
+            rate=demand.get("rate", 0.0),
+            spawn_rates=demand.get("spawn_rates"),
+            profile=demand.get("profile"),
+            start_hour=demand.get("start_hour", 0.0),
+            seed=demand.get("seed") if seed is None else seed,
+        )
+
+    def hour(self, now):
+        """Return the time of day (0-24) at simulated time `now` (seconds)"""
+        return (self.start_hour + now / 3600.0) % 24
+
+    def factor(self, now):
+        """Return the time-of-day multiplier in force at simulated time `now`"""
+        if not self.profile:
+            return 1.0
+        # Before the first listed hour, the last factor of the previous day still applies
+        return self.profile[bisect_right(self._hours, self.hour(now)) - 1][1]
+
+    def arrivals(self, now, seconds):
+        """Draw the vehicles that arrive during the next `seconds` of simulated time
+
+        Returns:
+            list: One spawn point config per arriving vehicle
+        """
+        factor = self.factor(now) * seconds / 60.0
+        arriving = []
+        for spawn_point, rate in zip(self.spawn_points, self.rates):
+            expected = rate * factor
+            if expected > 0:
+                arriving.extend([spawn_point] * self._poisson(expected))
+        self.arrivals_drawn += len(arriving)
+        return arriving
+
+    def _poisson(self, expected):
+        """Draw from a Poisson distribution with mean `expected` (Knuth's method, small means)"""
+        limit = math.exp(-expected)
+        count, product = 0, self.random.random()
+        while product > limit:
+            count += 1
+            product *= self.random.random()
+        return count
+
+
+class VehiclePool:
+    """Recycles the agents of vehicles that left the simulation
+
+    A vehicle that exits hands its agent back with `release()`. New
+    vehicles take an idle agent with `acquire()` and only register a new one
+    when none is free. The number of agents, and their state slots (e.g. in
+    FleetKinematics), is therefore bounded by the peak number of vehicles in
+    the simulation at once, not by the number of trips.
+
+    Attributes:
+        idle (deque): Agents waiting to be reused, oldest first
+        size (int): Number of agents created for the pool
+        spawned (int): Vehicles spawned from the pool
+        reused (int): Spawns that recycled an idle agent
+        released (int): Agents returned after their vehicle left
+    """
+
+    def __init__(self):
+        self.idle = deque()
+        self.size = 0
+        self.spawned = 0
+        self.reused = 0
+        self.released = 0
+
+    def __len__(self):
+        return len(self.idle)
+
+    def acquire(self):
+        """Return an idle agent to reuse, or None if a new one has to be created"""
+        self.spawned += 1
+        if self.idle:
+            self.reused += 1
+            return self.idle.popleft()
+        return None
+
+    def add(self, agent):
+        """Count a newly created agent as part of the pool"""
+        self.size += 1
+        return agent
+
+    def release(self, agent):
+        """Return the agent of a vehicle that left the simulation"""
+        self.released += 1
+        self.idle.append(agent)
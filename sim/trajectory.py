@@ -0,0 +1,292 @@
+"""
+Binary trajectory recording: where every vehicle was at every step.
+
+A trajectory file is a small header followed by fixed-size records, one per
+vehicle and step, in step order:
+
+    step (u4), vehicle index (u4), road index (i4), progress (f4), x (f4), y (f4), parking state (u1)
+
+The vehicle and road IDs behind the indices, and the parking state names,
+are stored next to it in `<file>.json`. Because records have a fixed size and
+are sorted by step, a reader memory-maps the file and finds any time window
+with a binary search, without loading the rest.
+
+With delta compression, a vehicle's record is only written when its state
+changed since the vehicle's last record. Parked or queued vehicles then cost
+nothing. A vehicle that leaves gets one last record with the "exited" state.
+The first step recorded in every block of `keyframe_interval` steps is a
+keyframe that writes all vehicles again, so a window can be rebuilt starting
+from the beginning of its block.
+
+Usage:
+    python -m sim.trajectory FILE [--start S] [--stop S] [--csv OUT]
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+MAGIC = b"TRAJREC1"
+HEADER = np.dtype([("magic", "S8"), ("record_size", "<u4"), ("delta", "<u4"), ("keyframe_interval", "<u4"), ("reserved", "<u4")])
+RECORD = np.dtype([
+    ("step", "<u4"), ("vehicle", "<u4"), ("road", "<i4"),
+    ("progress", "<f4"), ("x", "<f4"), ("y", "<f4"), ("parking", "u1"),
+])
+PARKING_STATES = ("driving", "parking", "parked", "exiting", "exited")
+EXITED = PARKING_STATES.index("exited")
+
+CHUNK_SIZE = 65536  # records buffered before a write, ~1.6 MB
+KEYFRAME_INTERVAL = 100
+
+
+def metadata_path(path):
+    return path + ".json"
+
+
+class TrajectoryRecorder:
+    """Append per-step vehicle states to a trajectory file
+
+    Records are buffered in a preallocated array of `chunk_size` records and
+    written one chunk at a time through a memory map of the file's new tail.
+    Call close() (or use the recorder as a context manager) to write the
+    last chunk and the ID tables.
+
+    Attributes:
+        path (str): File being written
+        delta (bool): Only write the states that changed (see the module docstring)
+        keyframe_interval (int): Steps between full snapshots in delta mode
+        vehicle_ids (list): Vehicle ID of each vehicle index, in order of first appearance
+        records (int): Records written or buffered so far
+    """
+
+    def __init__(self, path, road_ids=(), delta=False, keyframe_interval=KEYFRAME_INTERVAL, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.road_ids = list(road_ids)
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self.vehicle_ids = []
+        self.records = 0
+        self._vehicle_index = {}
+        self._last = {}  # vehicle index -> last written (road, progress, x, y, parking)
+        self._block = None  # keyframe block of the last recorded step
+        self._buffer = np.zeros(chunk_size, dtype=RECORD)
+        self._buffered = 0
+        self._written = 0
+
+        header = np.zeros(1, dtype=HEADER)
+        header[0] = (MAGIC, RECORD.itemsize, int(delta), keyframe_interval, 0)
+        with open(path, "wb") as f:
+            f.write(header.tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _index(self, vehicle_id):
+        index = self._vehicle_index.get(vehicle_id)
+        if index is None:
+            index = self._vehicle_index[vehicle_id] = len(self.vehicle_ids)
+            self.vehicle_ids.append(vehicle_id)
+        return index
+
+    def record_step(self, step, vehicles):
+        """Record the state of `vehicles` at `step`
+
+        Args:
+            step (int): Simulation step; must not decrease between calls
+            vehicles (iterable): (vehicle_id, agent) pairs of the vehicles in the environment
+        """
+        block = step // self.keyframe_interval
+        full = not self.delta or block != self._block
+        self._block = block
+        last, current = self._last, {}
+        rows = []
+        for vehicle_id, agent in vehicles:
+            index = self._index(vehicle_id)
+            state = (agent.current_position, agent.movement_progress, agent.x, agent.y,
+                     PARKING_STATES.index(agent.parking_state))
+            current[index] = state
+            if full or last.get(index) != state:
+                rows.append((step, index) + state)
+        if self.delta:
+            # Vehicles that left since the last step
+            rows.extend((step, index, -1, 0.0, 0.0, 0.0, EXITED) for index in last if index not in current)
+        self._last = current
+        if rows:
+            self._append(np.array(rows, dtype=RECORD))
+
+    def _append(self, rows):
+        start = 0
+        while start < len(rows):
+            n = min(len(rows) - start, len(self._buffer) - self._buffered)
+            self._buffer[self._buffered:self._buffered + n] = rows[start:start + n]
+            self._buffered += n
+            self.records += n
+            start += n
+            if self._buffered == len(self._buffer):
+                self.flush()
+
+    def flush(self):
+        """Write the buffered records to the file"""
+        if not self._buffered:
+            return
+        # Mapping the region past the end of the file extends it
+        tail = np.memmap(self.path, dtype=RECORD, mode="r+",
+                         offset=HEADER.itemsize + self._written * RECORD.itemsize, shape=(self._buffered,))
+        tail[:] = self._buffer[:self._buffered]
+        tail.flush()
+        del tail
+        self._written += self._buffered
+        self._buffered = 0
+
+    def close(self):
+        """Write the last chunk and the ID tables"""
+        self.flush()
+        with open(metadata_path(self.path), "w") as f:
+            json.dump({"vehicle_ids": self.vehicle_ids, "road_ids": self.road_ids,
+                       "parking_states": list(PARKING_STATES)}, f)
+
+    @property
+    def size(self):
+        """Bytes written to the trajectory file so far"""
+        return HEADER.itemsize + self._written * RECORD.itemsize
+
+
+class TrajectoryReader:
+    """Read time windows of a trajectory file without loading all of it
+
+    The records are memory-mapped read-only; only the pages of the windows
+    that are read (and of the binary search finding them) are loaded.
+
+    Attributes:
+        records (ndarray): All records, memory-mapped (RECORD dtype)
+        delta (bool): Whether the file was written with delta compression
+        keyframe_interval (int): Steps between full snapshots in delta files
+        vehicle_ids, road_ids (list): IDs behind the vehicle and road indices
+    """
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) != 1 or header[0]["magic"] != MAGIC or header[0]["record_size"] != RECORD.itemsize:
+            raise ValueError(f"{path} is not a trajectory file")
+        self.delta = bool(header[0]["delta"])
+        self.keyframe_interval = int(header[0]["keyframe_interval"])
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            count = (f.tell() - HEADER.itemsize) // RECORD.itemsize
+        self.records = (np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.itemsize, shape=(count,))
+                        if count else np.zeros(0, dtype=RECORD))
+        try:
+            with open(metadata_path(path)) as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            metadata = {}  # still being written
+        self.vehicle_ids = metadata.get("vehicle_ids", [])
+        self.road_ids = metadata.get("road_ids", [])
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def first_step(self):
+        return int(self.records[0]["step"]) if len(self.records) else None
+
+    @property
+    def last_step(self):
+        return int(self.records[-1]["step"]) if len(self.records) else None
+
+    def _span(self, start, stop):
+        """Indices of the records with start <= step < stop"""
+        steps = self.records["step"]
+        return np.searchsorted(steps, start, "left"), np.searchsorted(steps, stop, "left")
+
+    def frames(self, start=None, stop=None):
+        """Yield (step, records) for each step in [start, stop), with every vehicle present at that step
+
+        In delta files the unchanged vehicles are filled in from their last
+        record, starting at the keyframe of the block `start` is in.
+        """
+        if not len(self.records):
+            return
+        first = self.first_step
+        start = first if start is None else max(start, first)
+        stop = self.last_step + 1 if stop is None else min(stop, self.last_step + 1)
+        if start >= stop:
+            return
+        if not self.delta:
+            lo, hi = self._span(start, stop)
+            window = np.array(self.records[lo:hi])
+            bounds = np.searchsorted(window["step"], np.arange(start, stop + 1), "left")
+            for step in range(start, stop):
+                yield step, window[bounds[step - start]:bounds[step - start + 1]]
+            return
+
+        keyframe = max(first, start - start % self.keyframe_interval)
+        lo, hi = self._span(keyframe, stop)
+        window = np.array(self.records[lo:hi])
+        bounds = np.searchsorted(window["step"], np.arange(keyframe, stop + 1), "left")
+        latest = {}  # vehicle index -> row in window
+        for step in range(keyframe, stop):
+            for row in range(bounds[step - keyframe], bounds[step - keyframe + 1]):
+                vehicle = int(window[row]["vehicle"])
+                if window[row]["parking"] == EXITED:
+                    latest.pop(vehicle, None)
+                else:
+                    latest[vehicle] = row
+            if step >= start:
+                frame = window[sorted(latest.values())]
+                frame["step"] = step
+                yield step, frame
+
+    def window(self, start=None, stop=None):
+        """Return the records of every vehicle at every step in [start, stop) as one array"""
+        frames = [records for _, records in self.frames(start, stop)]
+        return np.concatenate(frames) if frames else np.zeros(0, dtype=RECORD)
+
+    def vehicle(self, vehicle_id, start=None, stop=None):
+        """Return the records of one vehicle in [start, stop)"""
+        records = self.window(start, stop)
+        return records[records["vehicle"] == self.vehicle_ids.index(vehicle_id)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a trajectory file or export a window of it")
+    parser.add_argument("path", help="Trajectory file written with --trajectory-output")
+    parser.add_argument("--start", type=int, default=None, help="First step of the window")
+    parser.add_argument("--stop", type=int, default=None, help="Step after the last one of the window")
+    parser.add_argument("--csv", default=None, help="Write the window as CSV to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    reader = TrajectoryReader(args.path)
+    records = reader.window(args.start, args.stop)
+    if args.csv is None:
+        print(f"{args.path}: {len(reader)} records, steps {reader.first_step}-{reader.last_step}, "
+              f"{len(reader.vehicle_ids)} vehicles, {'delta' if reader.delta else 'full'} records")
+        print(f"Window: {len(records)} vehicle states, {len(np.unique(records['vehicle']))} vehicles")
+        return 0
+
+    out = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["step", "vehicle", "road", "progress", "x", "y", "parking"])
+        for r in records:
+            vehicle, road = int(r["vehicle"]), int(r["road"])
+            writer.writerow([
+                int(r["step"]),
+                reader.vehicle_ids[vehicle] if vehicle < len(reader.vehicle_ids) else vehicle,
+                reader.road_ids[road] if 0 <= road < len(reader.road_ids) else road,
+                f"{r['progress']:.4f}", f"{r['x']:.2f}", f"{r['y']:.2f}", PARKING_STATES[r["parking"]],
+            ])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import asyncio
+import contextlib
+import json
+import os
+
+import pytest
+
+import main
+from sim.clock import get_clock
+from sim.profiling import get_profiler
+from sim.stats import get_stats
+
+
+def run(argv):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(main.main(argv, headless=True))
+
+
+def test_main_twice_in_one_process(tmp_path):
+    """A second run must not inherit the first run's clock events, light groups or stats"""
+    for i in range(2):
+        output = tmp_path / f"stats_{i}.json"
+        stats = run(["complete", "--headless", "--sim-time", "200", "--real-time-factor", "0",
+                     "--log-level", "OFF", "--stats-output", str(output)])
+        lights = json.loads(output.read_text())["light"]["all"]
+        assert "green_time" in lights and "red_time" in lights, f"run {i}: lights never switched"
+        assert stats["vehicles_entered"] > 0
+
+
+def test_main_cleans_up_after_an_error(tmp_path):
+    """A run that fails midway must not leave its stats sink, profiler or clock events behind"""
+    with pytest.raises(FileNotFoundError):
+        run(["complete", "--headless", "--sim-time", "20", "--real-time-factor", "0", "--log-level", "OFF",
+             "--profile-handlers", "--trajectory-output", str(tmp_path / "missing" / "trajectory.bin")])
+    assert get_stats() is None
+    assert get_profiler() is None
+    assert not get_clock().pending
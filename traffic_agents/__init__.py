@@ -1,5 +1,5 @@
-from .vehicle import VehicleAssistant
-from .traffic_light import TrafficLightAssistant, TrafficLightRLAssistant
+from .vehicle import VehicleAssistant, FleetVehicleAssistant
+from .traffic_light import TrafficLightAssistant, TrafficLightRLAssistant, LightGroupCoordinator
 from .pedestrian import PedestrianCrossingAssistant, PedestrianCrossingRLAssistant
 from .base import MyAssistant
 from .parking import ParkingAssistant, ParkingRLAssistant
@@ -1,5 +1,11 @@
 from autogen_core import RoutedAgent, AgentId, MessageContext, message_handler
 from messages.types import MyMessageType
+from sim.log import get_logger
+from sim.clock import get_clock
+from sim.profiling import get_profiler
+from sim.stats import get_stats
+
+logger = get_logger("main")
 
 
 class MyAssistant(RoutedAgent):
@@ -8,6 +14,8 @@ class MyAssistant(RoutedAgent):
     This class serves as the foundation for all specialized traffic agents 
     in the simulation (vehicles, traffic lights, pedestrian crossings, etc.)
     """
+
+    stats_kind = None  # entity kind this agent records statistics under (see sim/stats.py)
     
     def __init__(self, name):
         """Initialize the base agent with a name
@@ -17,6 +25,33 @@ class MyAssistant(RoutedAgent):
         """
         super().__init__(name)
         self.name = name
+        self.state_table = None  # shared ControlStateTable, set by agents that publish state
+        self._stats_state = None  # last published state and the clock time it started
+        self._state_since = 0.0
+        profiler = get_profiler()
+        if profiler is not None:
+            profiler.instrument(self)  # time every message handler (opt-in, see --profile-handlers)
+
+    def publish_state(self, state, record=None):
+        """Push this agent's state to the shared state table (no-op if unchanged or no table)
+
+        Args:
+            state (str): The new state value, also used to name the state-time statistics
+            record: Typed state stored in the table instead of `state` (e.g. a LightState)
+        """
+        if self.state_table is not None:
+            self.state_table.publish(self.name, state if record is None else record)
+        if state != self._stats_state:
+            now = get_clock().now
+            if self._stats_state is not None:
+                self.record_stat(f"{self._stats_state.lower()}_time", now - self._state_since)
+            self._stats_state, self._state_since = state, now
+
+    def record_stat(self, metric, value):
+        """Add a sample of `metric` for this agent to the installed SimulationStats, if any"""
+        stats = get_stats()
+        if stats is not None and self.stats_kind is not None:
+            stats.record(self.stats_kind, self.name, metric, value)
 
     def _process_road_properties(self):
         """Placeholder for processing road properties"""
@@ -32,4 +67,4 @@ class MyAssistant(RoutedAgent):
             message (MyMessageType): The incoming message
             ctx (MessageContext): Context info for the message
         """
-        print(f"{self.id.type} received message: {message.content}")
+        logger.debug("%s received message: %s", self.id.type, message.content)
@@ -1,108 +1,98 @@
 from autogen_core import AgentId, MessageContext, message_handler
 from traffic_agents.base import MyAssistant
-from messages.types import MyMessageType
+from messages.types import (
+    MyMessageType, StateQuery, ParkingState, ParkRequest, ParkReply,
+    ExitRequest, ExitReply, ExitNotification
+)
+from sim.clock import get_clock
+from sim.log import get_logger
 import random
-import asyncio
 from rl.parking import ParkingRL
 
+logger = get_logger("parking")
+
+# A parked vehicle is told to leave after MIN_DWELL_TIME seconds with this
+# chance per second, and always after MAX_DWELL_TIME seconds. This is the
+# distribution of the once-per-second scan it replaces: that scan saw a
+# vehicle with duration 0 in the tick it finished parking, so it could leave
+# after 6..15 seconds and was forced out at 16.
+MIN_DWELL_TIME = 6
+MAX_DWELL_TIME = 16
+DWELL_EXIT_CHANCE = 0.15
+
+
+def _start_timer(timers, vehicle_id, delay, callback):
+    """Schedule `callback(vehicle_id)` in `delay` seconds and store the handle in `timers`
+
+    A timer already running for the vehicle in the same table is cancelled.
+    """
+    previous = timers.get(vehicle_id)
+    if previous is not None:
+        previous.cancel()
+    timers[vehicle_id] = get_clock().schedule(delay, callback, vehicle_id)
+
 
 class ParkingAssistant(MyAssistant):
     """Parking area agent that manages vehicle parking and exiting"""
     
-    def __init__(self, name, x, y, capacity, parking_time=2, exit_time=1):
+    def __init__(self, name, x, y, capacity, parking_time=2, exit_time=1, parking_index=None):
         super().__init__(name)
         # Location and capacity properties
         self.x = x
         self.y = y
         self.capacity = capacity
+        # Shared ParkingIndex that vehicles search; updated on every occupancy change
+        self.parking_index = parking_index
         
         # Timing parameters
         self.parking_time = parking_time  # Default time to park (seconds)
         self.exit_time = exit_time        # Default time to exit (seconds)
         
-        # Vehicle tracking collections
-        self.parked_vehicles = {}         # Vehicles in parking process {vehicle_id: time_remaining}
-        self.exiting_vehicles = {}        # Vehicles in exit process {vehicle_id: time_remaining}
-        self.parked_durations = {}        # Vehicles currently parked {vehicle_id: duration}
-        
-        # Start background task for parking management
-        self.parking_task = asyncio.create_task(self.run_parking_area())
+        # Vehicle tracking collections. Each vehicle holds one timer on the
+        # simulation clock, so the lot only does work when a timer expires.
+        self.parked_vehicles = {}         # Vehicles in parking process {vehicle_id: parking timer}
+        self.exiting_vehicles = {}        # Vehicles in exit process {vehicle_id: exit timer}
+        self.parked_durations = {}        # Vehicles currently parked {vehicle_id: dwell timer}
     
-    async def run_parking_area(self):
-        """Background task to update parking timers and manage vehicles"""
-        while True:
-            await asyncio.sleep(1)  # Update every second
-            
-            # Process vehicles that are parking
-            await self._update_parking_vehicles()
-            
-            # Process parked vehicles and send exit notifications
-            await self._check_parked_vehicles()
-            
-            # Process vehicles that are exiting
-            await self._update_exiting_vehicles()
+    @staticmethod
+    def _draw_dwell_time():
+        """Draw how many seconds a parked vehicle stays before it is told to leave"""
+        for seconds in range(MIN_DWELL_TIME, MAX_DWELL_TIME):
+            if random.random() < DWELL_EXIT_CHANCE:
+                return seconds
+        return MAX_DWELL_TIME
     
-    async def _update_parking_vehicles(self):
-        """Update timers for vehicles in the parking process"""
-        to_remove = []
-        
-        for vehicle_id, time_remaining in self.parked_vehicles.items():
-            if time_remaining > 0:
-                self.parked_vehicles[vehicle_id] = time_remaining - 1
-                print(f"{self.name}: Vehicle {vehicle_id} parking... {time_remaining}s remaining")
-            else:
-                # Parking complete
-                to_remove.append(vehicle_id)
-                self.parked_durations[vehicle_id] = 0
-                print(f"{self.name}: Vehicle {vehicle_id} has completed parking")
-        
-        # Remove vehicles that finished parking
-        for vehicle_id in to_remove:
-            self.parked_vehicles.pop(vehicle_id)
+    def _finish_parking(self, vehicle_id):
+        """Timer expiry: `vehicle_id` has completed parking and starts its dwell time"""
+        self.parked_vehicles.pop(vehicle_id, None)
+        _start_timer(self.parked_durations, vehicle_id, self._draw_dwell_time(), self._notify_exit)
+        logger.info("%s: Vehicle %s has completed parking", self.name, vehicle_id)
     
-    async def _check_parked_vehicles(self):
-        """Check parked vehicles and notify them to exit when needed"""
-        exit_notifications = []
-        
-        for vehicle_id, duration in list(self.parked_durations.items()):
-            # Increment time parked
-            self.parked_durations[vehicle_id] = duration + 1
-            
-            # Determine if vehicle should exit:
-            # - Either after long duration (15 seconds)
-            # - Or randomly after a minimum duration (5 seconds)
-            if duration > 15 or (duration > 5 and random.random() < 0.15):
-                exit_notifications.append(vehicle_id)
-                del self.parked_durations[vehicle_id]
-        
-        # Send exit notifications
-        for vehicle_id in exit_notifications:
-            try:
-                vehicle_agent_id = AgentId(vehicle_id, "default")
-                await self.runtime.send_message(
-                    MyMessageType(content=f"exit_notification", source=self.name),
-                    vehicle_agent_id
-                )
-                print(f"{self.name}: Notified vehicle {vehicle_id} to exit parking")
-            except Exception as e:
-                print(f"{self.name}: Error sending exit notification to {vehicle_id}: {e}")
+    async def _notify_exit(self, vehicle_id):
+        """Timer expiry: tell a parked vehicle that its dwell time is over"""
+        self.parked_durations.pop(vehicle_id, None)
+        self._publish_occupancy()
+        try:
+            vehicle_agent_id = AgentId(vehicle_id, "default")
+            await self.send_message(
+                ExitNotification(vehicle_id=vehicle_id, source=self.name),
+                vehicle_agent_id
+            )
+            logger.info("%s: Notified vehicle %s to exit parking", self.name, vehicle_id)
+        except Exception as e:
+            logger.warning("%s: Error sending exit notification to %s: %s", self.name, vehicle_id, e)
     
-    async def _update_exiting_vehicles(self):
-        """Update timers for vehicles in the exit process"""
-        to_remove = []
-        
-        for vehicle_id, time_remaining in self.exiting_vehicles.items():
-            if time_remaining > 0:
-                self.exiting_vehicles[vehicle_id] = time_remaining - 1
-                print(f"{self.name}: Vehicle {vehicle_id} exiting... {time_remaining}s remaining")
-            else:
-                # Exit complete
-                to_remove.append(vehicle_id)
-                print(f"{self.name}: Vehicle {vehicle_id} has completed exiting")
-        
-        # Remove vehicles that finished exiting
-        for vehicle_id in to_remove:
-            self.exiting_vehicles.pop(vehicle_id)
+    def _stop_dwell(self, vehicle_id):
+        """Cancel the dwell timer of a vehicle that leaves on its own"""
+        timer = self.parked_durations.pop(vehicle_id, None)
+        if timer is not None:
+            timer.cancel()
+    
+    def _finish_exit(self, vehicle_id):
+        """Timer expiry: `vehicle_id` has completed exiting and frees its space"""
+        self.exiting_vehicles.pop(vehicle_id, None)
+        self._publish_occupancy()
+        logger.info("%s: Vehicle %s has completed exiting", self.name, vehicle_id)
     
     @property
     def current_occupancy(self):
@@ -114,10 +104,54 @@ class ParkingAssistant(MyAssistant):
         """Check if parking area is at capacity"""
         return self.current_occupancy >= self.capacity
     
+    def _publish_occupancy(self):
+        """Push the current occupancy to the shared parking index, if any"""
+        if self.parking_index is not None:
+            self.parking_index.publish(self.name, self.current_occupancy, self.capacity)
+    
+    def _request_space(self, vehicle_id):
+        """Try to assign a space to `vehicle_id` and return a ParkReply"""
+        if self.is_full:
+            return ParkReply(accepted=False, occupancy=self.current_occupancy, capacity=self.capacity)
+        # Add slight variation to parking time
+        actual_parking_time = max(1, int(self.parking_time + random.uniform(-0.5, 1.0)))
+        _start_timer(self.parked_vehicles, vehicle_id, actual_parking_time, self._finish_parking)
+        self._publish_occupancy()
+        return ParkReply(accepted=True, parking_time=actual_parking_time,
+                         occupancy=self.current_occupancy, capacity=self.capacity)
+
+    def _request_leave(self, vehicle_id):
+        """Start the exit of `vehicle_id` and return an ExitReply"""
+        if vehicle_id in self.parked_vehicles:
+            # Vehicle is still parking, can't exit yet
+            return ExitReply(accepted=False)
+        # Remove from parked tracking if present
+        self._stop_dwell(vehicle_id)
+        # Add slight variation to exit time
+        actual_exit_time = max(1, int(self.exit_time + random.uniform(-0.2, 0.5)))
+        _start_timer(self.exiting_vehicles, vehicle_id, actual_exit_time, self._finish_exit)
+        self._publish_occupancy()
+        return ExitReply(accepted=True, exit_time=actual_exit_time)
+
+    @message_handler
+    async def handle_park_request(self, message: ParkRequest, ctx: MessageContext) -> ParkReply:
+        """Handle a typed parking request from a vehicle"""
+        return self._request_space(message.vehicle_id)
+
+    @message_handler
+    async def handle_exit_request(self, message: ExitRequest, ctx: MessageContext) -> ExitReply:
+        """Handle a typed exit request from a vehicle"""
+        return self._request_leave(message.vehicle_id)
+
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> ParkingState:
+        """Answer a typed state query"""
+        return ParkingState(parking_id=self.name, occupancy=self.current_occupancy, capacity=self.capacity)
+
     @message_handler
     async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
         """Handle incoming messages to the parking area"""
-        print(f"{self.name} (Parking Area) received message: {message.content}")
+        logger.debug("%s (Parking Area) received message: %s", self.name, message.content)
         
         response_message = "Invalid command received."
         vehicle_id = message.source
@@ -126,104 +160,96 @@ class ParkingAssistant(MyAssistant):
             response_message = f"available" if not self.is_full else "full"
         
         elif "park" in message.content.lower():
-            if self.is_full:
-                response_message = f"rejected: parking is full ({self.current_occupancy}/{self.capacity})"
+            reply = self._request_space(vehicle_id)
+            if reply.accepted:
+                response_message = f"accepted: parking_time={reply.parking_time}"
             else:
-                # Add slight variation to parking time
-                actual_parking_time = max(1, int(self.parking_time + random.uniform(-0.5, 1.0)))
-                self.parked_vehicles[vehicle_id] = actual_parking_time
-                response_message = f"accepted: parking_time={actual_parking_time}"
+                response_message = f"rejected: parking is full ({reply.occupancy}/{reply.capacity})"
         
         elif "exit" in message.content.lower():
-            if vehicle_id in self.parked_vehicles:
-                # Vehicle is still parking, can't exit yet
-                response_message = f"rejected: vehicle is still parking"
+            reply = self._request_leave(vehicle_id)
+            if reply.accepted:
+                response_message = f"accepted: exit_time={reply.exit_time}"
             else:
-                # Remove from parked tracking if present
-                if vehicle_id in self.parked_durations:
-                    del self.parked_durations[vehicle_id]
-                
-                # Add slight variation to exit time
-                actual_exit_time = max(1, int(self.exit_time + random.uniform(-0.2, 0.5)))
-                self.exiting_vehicles[vehicle_id] = actual_exit_time
-                response_message = f"accepted: exit_time={actual_exit_time}"
+                response_message = f"rejected: vehicle is still parking"
         
-        print(f"{self.name} (Parking Area) responds with: {response_message}")
+        logger.debug("%s (Parking Area) responds with: %s", self.name, response_message)
         return MyMessageType(content=response_message, source=self.name)
 
 
 class ParkingRLAssistant(MyAssistant):
     """Parking area agent that uses reinforcement learning to manage parking and exits"""
-    def __init__(self, name, x, y, capacity, parking_time=2, exit_time=1, epsilon=0.1, learning_rate=None):
+    def __init__(self, name, x, y, capacity, parking_time=2, exit_time=1, epsilon=0.1, learning_rate=None, parking_index=None):
         super().__init__(name)
         self.x = x
         self.y = y
         self.capacity = capacity
+        self.parking_index = parking_index
         self.parking_time = parking_time
         self.exit_time = exit_time
         self.epsilon = epsilon
         self.learning_rate = learning_rate
         self.rl_model = ParkingRL(alfa=self.learning_rate)
-        self.parked_vehicles = {}
-        self.exiting_vehicles = {}
-        self.parked_durations = {}
-        self.rl_task = asyncio.create_task(self.run_parking_rl())
+        self.parked_vehicles = {}   # {vehicle_id: parking timer}
+        self.exiting_vehicles = {}  # {vehicle_id: exit timer}
+        self.parked_durations = {}  # {vehicle_id: seconds parked}
+        # RL decisions run every second, but only while vehicles are parked
+        self.rl_event = None
 
     async def run_parking_rl(self):
-        while True:
-            await asyncio.sleep(1)
-            for vehicle_id in list(self.parked_durations.keys()):
-                occupancy = self.current_occupancy
-                duration = self.parked_durations[vehicle_id]
-                reward, action = self.rl_model.step(occupancy, self.capacity)
-                # RL
-                if action == 1:
-                    self.parked_durations.pop(vehicle_id)
-                    self.exiting_vehicles[vehicle_id] = self.exit_time
-                    print(f"{self.name} RL: Vehicle {vehicle_id} decided to exit (RL or forced)")
-                    try:
-                        vehicle_agent_id = AgentId(vehicle_id, "default")
-                        await self.runtime.send_message(
-                            MyMessageType(content=f"exit_notification", source=self.name),
-                            vehicle_agent_id
-                        )
-                        print(f"{self.name}: Notified vehicle {vehicle_id} to exit parking (RL)")
-                    except Exception as e:
-                        print(f"{self.name}: Error sending exit notification to {vehicle_id}: {e}")
-                else:
-                    self.parked_durations[vehicle_id] += 1
-            await self._update_parking_vehicles()
-            await self._update_exiting_vehicles()
-
-    async def _update_parking_vehicles(self):
-        to_remove = []
-        for vehicle_id, time_remaining in self.parked_vehicles.items():
-            if time_remaining > 0:
-                self.parked_vehicles[vehicle_id] = time_remaining - 1
-                print(f"{self.name}: Vehicle {vehicle_id} parking... {time_remaining}s remaining (RL)")
+        """Scheduled event: let the RL model decide which parked vehicles leave"""
+        for vehicle_id in list(self.parked_durations.keys()):
+            occupancy = self.current_occupancy
+            duration = self.parked_durations[vehicle_id]
+            reward, action = self.rl_model.step(occupancy, self.capacity)
+            # RL
+            if action == 1:
+                self.parked_durations.pop(vehicle_id)
+                _start_timer(self.exiting_vehicles, vehicle_id, self.exit_time, self._finish_exit)
+                logger.info("%s RL: Vehicle %s decided to exit (RL or forced)", self.name, vehicle_id)
+                try:
+                    vehicle_agent_id = AgentId(vehicle_id, "default")
+                    await self.send_message(
+                        ExitNotification(vehicle_id=vehicle_id, source=self.name),
+                        vehicle_agent_id
+                    )
+                    logger.info("%s: Notified vehicle %s to exit parking (RL)", self.name, vehicle_id)
+                except Exception as e:
+                    logger.warning("%s: Error sending exit notification to %s: %s", self.name, vehicle_id, e)
             else:
-                to_remove.append(vehicle_id)
-                self.parked_durations[vehicle_id] = 0
-                print(f"{self.name}: Vehicle {vehicle_id} has completed parking (RL)")
-        for vehicle_id in to_remove:
-            self.parked_vehicles.pop(vehicle_id)
+                self.parked_durations[vehicle_id] += 1
+        self._update_rl_event()
 
-    async def _update_exiting_vehicles(self):
-        to_remove = []
-        for vehicle_id, time_remaining in self.exiting_vehicles.items():
-            if time_remaining > 0:
-                self.exiting_vehicles[vehicle_id] = time_remaining - 1
-                print(f"{self.name}: Vehicle {vehicle_id} exiting... {time_remaining}s remaining (RL)")
-            else:
-                to_remove.append(vehicle_id)
-                print(f"{self.name}: Vehicle {vehicle_id} has completed exiting (RL)")
-        for vehicle_id in to_remove:
-            self.exiting_vehicles.pop(vehicle_id)
+    def _update_rl_event(self):
+        """Start the RL decision event when the first vehicle parks and stop it when the lot empties"""
+        if self.parked_durations and self.rl_event is None:
+            self.rl_event = get_clock().schedule_every(1, self.run_parking_rl)
+        elif not self.parked_durations and self.rl_event is not None:
+            self.rl_event.cancel()
+            self.rl_event = None
+
+    def _finish_parking(self, vehicle_id):
+        """Timer expiry: `vehicle_id` has completed parking"""
+        self.parked_vehicles.pop(vehicle_id, None)
+        self.parked_durations[vehicle_id] = 0
+        self._update_rl_event()
+        logger.info("%s: Vehicle %s has completed parking (RL)", self.name, vehicle_id)
+
+    def _stop_dwell(self, vehicle_id):
+        """Stop tracking a parked vehicle that leaves on its own"""
+        if self.parked_durations.pop(vehicle_id, None) is not None:
+            self._update_rl_event()
+
+    def _finish_exit(self, vehicle_id):
+        """Timer expiry: `vehicle_id` has completed exiting and frees its space"""
+        self.exiting_vehicles.pop(vehicle_id, None)
+        self._publish_occupancy()
+        logger.info("%s: Vehicle %s has completed exiting (RL)", self.name, vehicle_id)
 
     def update_epsilon(self, new_epsilon):
         if 0 <= new_epsilon <= 1:
             self.epsilon = new_epsilon
-            print(f"{self.name} RL epsilon updated to {self.epsilon}")
+            logger.info("%s RL epsilon updated to %s", self.name, self.epsilon)
             return True
         return False
 
@@ -231,7 +257,7 @@ class ParkingRLAssistant(MyAssistant):
         if 0 < new_rate <= 1:
             self.learning_rate = new_rate
             self.rl_model.alfa = new_rate
-            print(f"{self.name} RL learning rate updated to {self.learning_rate}")
+            logger.info("%s RL learning rate updated to %s", self.name, self.learning_rate)
             return True
         return False
 
@@ -243,29 +269,69 @@ class ParkingRLAssistant(MyAssistant):
     def is_full(self):
         return self.current_occupancy >= self.capacity
 
+    def _publish_occupancy(self):
+        """Push the current occupancy to the shared parking index, if any"""
+        if self.parking_index is not None:
+            self.parking_index.publish(self.name, self.current_occupancy, self.capacity)
+
+    def _request_space(self, vehicle_id):
+        """Try to assign a space to `vehicle_id` and return a ParkReply"""
+        if self.is_full:
+            return ParkReply(accepted=False, occupancy=self.current_occupancy, capacity=self.capacity)
+        # Add slight variation to parking time
+        actual_parking_time = max(1, int(self.parking_time + random.uniform(-0.5, 1.0)))
+        _start_timer(self.parked_vehicles, vehicle_id, actual_parking_time, self._finish_parking)
+        self._publish_occupancy()
+        return ParkReply(accepted=True, parking_time=actual_parking_time,
+                         occupancy=self.current_occupancy, capacity=self.capacity)
+
+    def _request_leave(self, vehicle_id):
+        """Start the exit of `vehicle_id` and return an ExitReply"""
+        if vehicle_id in self.parked_vehicles:
+            # Vehicle is still parking, can't exit yet
+            return ExitReply(accepted=False)
+        # Remove from parked tracking if present
+        self._stop_dwell(vehicle_id)
+        # Add slight variation to exit time
+        actual_exit_time = max(1, int(self.exit_time + random.uniform(-0.2, 0.5)))
+        _start_timer(self.exiting_vehicles, vehicle_id, actual_exit_time, self._finish_exit)
+        self._publish_occupancy()
+        return ExitReply(accepted=True, exit_time=actual_exit_time)
+
+    @message_handler
+    async def handle_park_request(self, message: ParkRequest, ctx: MessageContext) -> ParkReply:
+        """Handle a typed parking request from a vehicle"""
+        return self._request_space(message.vehicle_id)
+
+    @message_handler
+    async def handle_exit_request(self, message: ExitRequest, ctx: MessageContext) -> ExitReply:
+        """Handle a typed exit request from a vehicle"""
+        return self._request_leave(message.vehicle_id)
+
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> ParkingState:
+        """Answer a typed state query"""
+        return ParkingState(parking_id=self.name, occupancy=self.current_occupancy, capacity=self.capacity)
+
     @message_handler
     async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
-        print(f"{self.name} (RL Parking Area) received message: {message.content}")
+        logger.debug("%s (RL Parking Area) received message: %s", self.name, message.content)
         response_message = "Invalid command received."
         vehicle_id = message.source
         if "request_state" in message.content.lower():
             response_message = f"available" if not self.is_full else "full"
         elif "park" in message.content.lower():
-            if self.is_full:
-                response_message = f"rejected: parking is full ({self.current_occupancy}/{self.capacity})"
+            reply = self._request_space(vehicle_id)
+            if reply.accepted:
+                response_message = f"accepted: parking_time={reply.parking_time}"
             else:
-                actual_parking_time = max(1, int(self.parking_time + random.uniform(-0.5, 1.0)))
-                self.parked_vehicles[vehicle_id] = actual_parking_time
-                response_message = f"accepted: parking_time={actual_parking_time}"
+                response_message = f"rejected: parking is full ({reply.occupancy}/{reply.capacity})"
         elif "exit" in message.content.lower():
-            if vehicle_id in self.parked_vehicles:
-                response_message = f"rejected: vehicle is still parking"
+            reply = self._request_leave(vehicle_id)
+            if reply.accepted:
+                response_message = f"accepted: exit_time={reply.exit_time}"
             else:
-                if vehicle_id in self.parked_durations:
-                    del self.parked_durations[vehicle_id]
-                actual_exit_time = max(1, int(self.exit_time + random.uniform(-0.2, 0.5)))
-                self.exiting_vehicles[vehicle_id] = actual_exit_time
-                response_message = f"accepted: exit_time={actual_exit_time}"
+                response_message = f"rejected: vehicle is still parking"
         elif "update_epsilon" in message.content.lower():
             try:
                 new_epsilon = float(message.content.split("=")[1])
@@ -284,5 +350,5 @@ class ParkingRLAssistant(MyAssistant):
             response_message = (f"Steps: {self.rl_model.steps}, "
                                f"Q-values: {self.rl_model.q.tolist()}, "
                                f"Epsilon: {self.epsilon}")
-        print(f"{self.name} (RL Parking Area) responds with: {response_message}")
+        logger.debug("%s (RL Parking Area) responds with: %s", self.name, response_message)
         return MyMessageType(content=response_message, source=self.name)
@@ -1,17 +1,23 @@
-import asyncio
 import random
 from autogen_core import AgentId, MessageContext, message_handler
 from traffic_agents.base import MyAssistant
-from messages.types import MyMessageType
+from messages.types import MyMessageType, StateQuery, CrossingState
+from sim.clock import get_clock
+from sim.log import get_logger
 from collections import deque
 from rl.pedestrian import PedestrianCrossingRL
 
+logger = get_logger("crossing")
+
 
 class PedestrianCrossingAssistant(MyAssistant):
     """Pedestrian crossing agent that simulates pedestrians using a crosswalk"""
+
+    stats_kind = "crossing"
     
-    def __init__(self, name, wait_time=None):
+    def __init__(self, name, wait_time=None, state_table=None):
         super().__init__(name)
+        self.state_table = state_table
         # Crossing state
         self.is_occupied = False
         self.occupancy_time = 0
@@ -22,19 +28,27 @@ class PedestrianCrossingAssistant(MyAssistant):
         self.pedestrian_queue = deque()  # Queue of pedestrians waiting to cross
         self.max_queue_length = 0        # Track maximum queue length for statistics
         
-        # Start the background task that manages pedestrian activity
-        self.crossing_task = asyncio.create_task(self.run_pedestrian_crossing())
+        # Simulate pedestrian activity every 1-2 simulated seconds
+        self.crossing_event = get_clock().schedule_every(lambda: random.randint(1, 2), self.run_pedestrian_crossing)
+
+    @property
+    def is_occupied(self):
+        """True while pedestrians are on the crossing"""
+        return self._is_occupied
+
+    @is_occupied.setter
+    def is_occupied(self, value):
+        # Published to the shared table so vehicles never have to poll
+        self._is_occupied = value
+        self.publish_state("occupied" if value else "free", CrossingState(crossing_id=self.name, occupied=value))
 
     async def run_pedestrian_crossing(self):
-        """Background task to simulate pedestrian activity at the crossing"""
-        while True:
-            await asyncio.sleep(random.randint(1, 2))
-            
-            # Simulate new pedestrians arriving at the crossing
-            await self._add_new_pedestrians()
-            
-            # Process pedestrian crossing state
-            await self._update_crossing_state()
+        """Scheduled event: simulate pedestrian activity at the crossing"""
+        # Simulate new pedestrians arriving at the crossing
+        await self._add_new_pedestrians()
+        
+        # Process pedestrian crossing state
+        await self._update_crossing_state()
     
     async def _add_new_pedestrians(self):
         """Simulate new pedestrians arriving at the crossing"""
@@ -48,7 +62,8 @@ class PedestrianCrossingAssistant(MyAssistant):
             
             # Update statistics
             self.max_queue_length = max(self.max_queue_length, len(self.pedestrian_queue))
-            print(f"{self.name}: {num_pedestrians} pedestrians arrived. Queue now: {len(self.pedestrian_queue)}")
+            self.record_stat("queue", len(self.pedestrian_queue))
+            logger.debug("%s: %s pedestrians arrived. Queue now: %s", self.name, num_pedestrians, len(self.pedestrian_queue))
     
     async def _update_crossing_state(self):
         """Update the state of the pedestrian crossing"""
@@ -62,8 +77,8 @@ class PedestrianCrossingAssistant(MyAssistant):
                 self.occupancy_time = self.wait_time
                 
             self.occupancy_counter = 0
-            print(f"{self.name} Pedestrian Crossing is now occupied for {self.occupancy_time} seconds. "
-                  f"Queue: {len(self.pedestrian_queue)}")
+            logger.info("%s Pedestrian Crossing is now occupied for %s seconds. Queue: %s",
+                        self.name, self.occupancy_time, len(self.pedestrian_queue))
                   
         elif self.is_occupied:
             # Update ongoing crossing
@@ -71,14 +86,14 @@ class PedestrianCrossingAssistant(MyAssistant):
             if self.occupancy_counter >= self.occupancy_time:
                 # Crossing completed
                 self.is_occupied = False
-                print(f"{self.name} Pedestrian Crossing is now free. "
-                      f"Queue remaining: {len(self.pedestrian_queue)}")
+                logger.info("%s Pedestrian Crossing is now free. Queue remaining: %s",
+                            self.name, len(self.pedestrian_queue))
 
     def update_wait_time(self, new_time):
         """Update the pedestrian crossing wait time"""
         if new_time and new_time > 0:
             self.wait_time = new_time
-            print(f"{self.name} wait time updated to {self.wait_time} seconds")
+            logger.info("%s wait time updated to %s seconds", self.name, self.wait_time)
             return True
         return False
 
@@ -87,10 +102,15 @@ class PedestrianCrossingAssistant(MyAssistant):
         """Return the current queue length"""
         return len(self.pedestrian_queue)
 
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> CrossingState:
+        """Answer a typed state query from a vehicle"""
+        return CrossingState(crossing_id=self.name, occupied=self.is_occupied, queue_length=self.queue_length)
+
     @message_handler
     async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
         """Handle incoming messages to the pedestrian crossing"""
-        print(f"{self.name} (Pedestrian Crossing) received message: {message.content}")
+        logger.debug("%s (Pedestrian Crossing) received message: %s", self.name, message.content)
         
         if "request_state" in message.content.lower():
             # Include queue length in the response
@@ -109,15 +129,18 @@ class PedestrianCrossingAssistant(MyAssistant):
         else:
             response_message = "Invalid command received."
 
-        print(f"{self.name} (Pedestrian Crossing) responds with: {response_message}")
+        logger.debug("%s (Pedestrian Crossing) responds with: %s", self.name, response_message)
         return MyMessageType(content=response_message, source=self.name)
 
 
 class PedestrianCrossingRLAssistant(MyAssistant):
     """Pedestrian crossing agent that uses reinforcement learning to control pedestrian flow"""
+
+    stats_kind = "crossing"
     
-    def __init__(self, name, road_type="2_carriles", epsilon=0.1, learning_rate=None):
+    def __init__(self, name, road_type="2_carriles", epsilon=0.1, learning_rate=None, state_table=None):
         super().__init__(name)
+        self.state_table = state_table
         
         # Crossing state
         self.is_occupied = False
@@ -134,20 +157,45 @@ class PedestrianCrossingRLAssistant(MyAssistant):
         self.pedestrian_queue = deque()  # Queue of pedestrians waiting to cross
         self.max_queue_length = 0        # Track maximum queue length for statistics
         
-        # Start the background task that manages pedestrian activity with RL
-        self.crossing_task = asyncio.create_task(self.run_pedestrian_crossing_rl())
+        # First RL decision runs as soon as the simulation starts
+        self.crossing_event = get_clock().schedule(0, self.run_pedestrian_crossing_rl)
+
+    @property
+    def is_occupied(self):
+        """True while pedestrians are on the crossing"""
+        return self._is_occupied
+
+    @is_occupied.setter
+    def is_occupied(self, value):
+        # Published to the shared table so vehicles never have to poll
+        self._is_occupied = value
+        self.publish_state("occupied" if value else "free", CrossingState(crossing_id=self.name, occupied=value))
     
     async def run_pedestrian_crossing_rl(self):
-        """Background task to run the RL-based pedestrian crossing"""
-        while True:
-            # Simulate new pedestrians arriving
-            await self._add_new_pedestrians()
-            
-            # Use RL to decide when to allow crossing
-            await self._make_rl_decision()
-            
+        """Scheduled event: run one decision of the RL-based pedestrian crossing
+
+        Reschedules itself; while pedestrians are crossing, the next decision
+        waits until the crossing has been freed.
+        """
+        # Simulate new pedestrians arriving
+        await self._add_new_pedestrians()
+        
+        # Use RL to decide when to allow crossing
+        crossing_time = await self._make_rl_decision()
+        
+        if crossing_time:
+            self.crossing_event = get_clock().schedule(crossing_time, self._end_rl_crossing)
+        else:
             # Wait before next decision
-            await asyncio.sleep(random.uniform(1.0, 2.0))
+            self.crossing_event = get_clock().schedule(random.uniform(1.0, 2.0), self.run_pedestrian_crossing_rl)
+
+    def _end_rl_crossing(self):
+        """Scheduled event: free the crossing once the pedestrians are across"""
+        self.is_occupied = False
+        logger.info("%s RL Pedestrian Crossing is now free. Queue remaining: %s",
+                    self.name, len(self.pedestrian_queue))
+        # Wait before next decision
+        self.crossing_event = get_clock().schedule(random.uniform(1.0, 2.0), self.run_pedestrian_crossing_rl)
     
     async def _add_new_pedestrians(self):
         """Simulate new pedestrians arriving at the crossing"""
@@ -161,12 +209,18 @@ class PedestrianCrossingRLAssistant(MyAssistant):
             
             # Update statistics
             self.max_queue_length = max(self.max_queue_length, len(self.pedestrian_queue))
-            print(f"{self.name}: {num_pedestrians} pedestrians arrived. Queue now: {len(self.pedestrian_queue)}")
+            self.record_stat("queue", len(self.pedestrian_queue))
+            logger.debug("%s: %s pedestrians arrived. Queue now: %s", self.name, num_pedestrians, len(self.pedestrian_queue))
     
     async def _make_rl_decision(self):
-        """Use the RL model to decide when to allow pedestrians to cross"""
+        """Use the RL model to decide when to allow pedestrians to cross
+
+        Returns:
+            int: Seconds the pedestrians need to cross if a crossing started, else 0
+        """
         # Get the current queue length
         queue_length = len(self.pedestrian_queue)
+        pedestrian_time = 0
         
         # Make an RL decision
         reward, action = self.rl_model.step(queue_length, self.road_type)
@@ -183,30 +237,26 @@ class PedestrianCrossingRLAssistant(MyAssistant):
             while len(self.pedestrian_queue) > 0 and random.random() < 0.7:
                 self.pedestrian_queue.popleft()  # Additional pedestrians cross together
                 
-            print(f"{self.name} RL Pedestrian Crossing is now occupied (stopping traffic). "
-                  f"Queue: {len(self.pedestrian_queue)}")
-                  
-            # Automatically free the crossing after a short time
-            await asyncio.sleep(pedestrian_time)
-            self.is_occupied = False
-            print(f"{self.name} RL Pedestrian Crossing is now free. "
-                  f"Queue remaining: {len(self.pedestrian_queue)}")
-                  
+            logger.info("%s RL Pedestrian Crossing is now occupied (stopping traffic). Queue: %s",
+                        self.name, len(self.pedestrian_queue))
+            # The crossing is freed automatically by _end_rl_crossing
+            
         elif action == 1 and self.is_occupied:
             # Stop pedestrian crossing
             self.is_occupied = False
-            print(f"{self.name} RL Pedestrian Crossing is now free (allowing traffic).")
+            logger.info("%s RL Pedestrian Crossing is now free (allowing traffic).", self.name)
             
         # Log the decision
         new_state = "occupied" if self.is_occupied else "free"
-        print(f"{self.name} RL decision: action={action}, reward={reward}, old_state={old_state}, "
-              f"new_state={new_state}, queue={queue_length}")
+        logger.debug("%s RL decision: action=%s, reward=%s, old_state=%s, new_state=%s, queue=%s",
+                     self.name, action, reward, old_state, new_state, queue_length)
+        return pedestrian_time
 
     def update_epsilon(self, new_epsilon):
         """Update the exploration rate for the RL algorithm"""
         if 0 <= new_epsilon <= 1:
             self.epsilon = new_epsilon
-            print(f"{self.name} exploration rate updated to {self.epsilon}")
+            logger.info("%s exploration rate updated to %s", self.name, self.epsilon)
             return True
         return False
     
@@ -215,7 +265,7 @@ class PedestrianCrossingRLAssistant(MyAssistant):
         if 0 < new_rate <= 1:
             self.learning_rate = new_rate
             self.rl_model.alfa = new_rate
-            print(f"{self.name} learning rate updated to {self.learning_rate}")
+            logger.info("%s learning rate updated to %s", self.name, self.learning_rate)
             return True
         return False
     
@@ -223,7 +273,7 @@ class PedestrianCrossingRLAssistant(MyAssistant):
         """Set the road type for this crossing"""
         if road_type in ["1_carril", "2_carriles"]:
             self.road_type = road_type
-            print(f"{self.name} road type set to {self.road_type}")
+            logger.info("%s road type set to %s", self.name, self.road_type)
             return True
         return False
 
@@ -232,10 +282,15 @@ class PedestrianCrossingRLAssistant(MyAssistant):
         """Return the current queue length"""
         return len(self.pedestrian_queue)
 
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> CrossingState:
+        """Answer a typed state query from a vehicle"""
+        return CrossingState(crossing_id=self.name, occupied=self.is_occupied, queue_length=self.queue_length)
+
     @message_handler
     async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
         """Handle incoming messages to the pedestrian crossing"""
-        print(f"{self.name} (RL Pedestrian Crossing) received message: {message.content}")
+        logger.debug("%s (RL Pedestrian Crossing) received message: %s", self.name, message.content)
         
         if "request_state" in message.content.lower():
             # Include queue length in the response
@@ -273,5 +328,5 @@ class PedestrianCrossingRLAssistant(MyAssistant):
         else:
             response_message = "Invalid command received."
 
-        print(f"{self.name} (RL Pedestrian Crossing) responds with: {response_message}")
+        logger.debug("%s (RL Pedestrian Crossing) responds with: %s", self.name, response_message)
         return MyMessageType(content=response_message, source=self.name)
@@ -1,29 +1,98 @@
-import asyncio
 import random
-from autogen_core import AgentId, MessageContext, message_handler
+from autogen_core import MessageContext, message_handler
 from traffic_agents.base import MyAssistant
-from messages.types import MyMessageType
+from messages.types import MyMessageType, StateQuery, LightState
+from sim.clock import get_clock
+from sim.log import get_logger
 from rl.traffic_lihgt import TrafficlightRL  # Import the RL model
 
+logger = get_logger("light")
+
+
+class LightGroupCoordinator:
+    """Alternating phases of the standard traffic light groups of one simulation run
+
+    The first light that joins schedules the group switch on the simulation
+    clock, every `change_time` of that light. Each run needs its own
+    coordinator: the switch event lives on the run's clock and is cancelled
+    with it.
+
+    Attributes:
+        clock (SimulationClock): Clock the switch event is scheduled on
+        light_groups (dict): Group -> names of the lights in it
+        group_states (dict): Group -> state its lights get at the next switch
+        event (ScheduledEvent): The switch event, None until a light joins
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else get_clock()
+        self.light_groups = {
+            "north_south": [],  # Vertical roads
+            "east_west": []     # Horizontal roads
+        }
+        self.group_states = {
+            "north_south": "RED",
+            "east_west": "GREEN"
+        }
+        self.event = None
+        self._lights = {}  # light name -> agent
+
+    @property
+    def stopped(self):
+        """True once the switch event was cancelled (e.g. by the clock's cancel_all())"""
+        return self.event is not None and self.event.cancelled
+
+    def add(self, light):
+        """Add `light` to its group and return the state it starts in"""
+        self.light_groups[light.group].append(light.name)
+        self._lights[light.name] = light
+        if self.event is None:
+            self.event = self.clock.schedule_every(lambda: light.change_time, self.coordinate_traffic_lights)
+        return self.group_states[light.group]
+
+    def coordinate_traffic_lights(self):
+        """Scheduled event: set every light to its group's state, then swap the groups' states"""
+        for group, state in self.group_states.items():
+            for light_name in self.light_groups[group]:
+                self._lights[light_name].state = state
+                logger.info("%s changed to %s", light_name, state)
+
+        self.group_states["north_south"] = "GREEN" if self.group_states["north_south"] == "RED" else "RED"
+        self.group_states["east_west"] = "GREEN" if self.group_states["east_west"] == "RED" else "RED"
+
+    def stop(self):
+        """Cancel the switch event"""
+        if self.event is not None:
+            self.event.cancel()
+
+
+_coordinator = None
+
+
+def get_coordinator():
+    """Return the coordinator of the lights created without one, for the installed clock
+
+    A new coordinator replaces the previous one when a new clock was
+    installed or the previous run's events were cancelled.
+    """
+    global _coordinator
+    if _coordinator is None or _coordinator.clock is not get_clock() or _coordinator.stopped:
+        _coordinator = LightGroupCoordinator()
+    return _coordinator
+
 
 class TrafficLightAssistant(MyAssistant):
-    """Traffic light agent that coordinates with other traffic lights in groups"""
-    
-    # Class variables for group coordination
-    light_groups = {
-        "north_south": [],  # Vertical roads
-        "east_west": []     # Horizontal roads
-    }
-    
-    group_states = {
-        "north_south": "RED",
-        "east_west": "GREEN"
-    }
-    
-    coordination_initialized = False
+    """Traffic light agent that coordinates with other traffic lights in groups
+
+    The lights of a run share a LightGroupCoordinator, which switches whole
+    groups at once.
+    """
+
+    stats_kind = "light"
 
-    def __init__(self, name, change_time=None, group=None):
+    def __init__(self, name, change_time=None, group=None, state_table=None, coordinator=None):
         super().__init__(name)
+        self.state_table = state_table
         
         # Auto-determine light group based on name
         if group is None:
@@ -44,58 +113,42 @@ class TrafficLightAssistant(MyAssistant):
         else:
             self.group = group
             
-        # Register this light to its group
-        TrafficLightAssistant.light_groups[self.group].append(name)
-        
-        # Set initial state based on group
-        self.state = TrafficLightAssistant.group_states[self.group]
-        
         # Set change time with slight variation
         base_time = change_time if change_time is not None else random.randint(2, 4)
         self.change_time = base_time + random.uniform(-0.5, 0.5)
-        
-        # Initialize group coordination if this is the first light
-        if not TrafficLightAssistant.coordination_initialized:
-            self.traffic_light_task = asyncio.create_task(self.coordinate_traffic_lights())
 
-            
-            TrafficLightAssistant.coordination_initialized = True
-        else:
-            self.traffic_light_task = None
+        # Register this light to its group; the group's state is its initial state
+        self.coordinator = coordinator if coordinator is not None else get_coordinator()
+        self.state = self.coordinator.add(self)
 
-    async def coordinate_traffic_lights(self):
-        """Centralized coordination of all traffic lights by group"""
-        while True:
-            # Wait for the change time
-            await asyncio.sleep(self.change_time)
-            
-            # Update all lights in each group
-            for group, state in TrafficLightAssistant.group_states.items():
-                for light_name in TrafficLightAssistant.light_groups[group]:
-                    try:
-                        light = await self.runtime._get_agent(AgentId(light_name, "default"))
-                        if light:
-                            light.state = state
-                            print(f"{light_name} changed to {state}")
-                    except Exception as e:
-                        print(f"Error updating light {light_name}: {e}")
-            
-            # Swap states for opposing groups
-            TrafficLightAssistant.group_states["north_south"] = "GREEN" if TrafficLightAssistant.group_states["north_south"] == "RED" else "RED"
-            TrafficLightAssistant.group_states["east_west"] = "GREEN" if TrafficLightAssistant.group_states["east_west"] == "RED" else "RED"
+    @property
+    def state(self):
+        """Current light state ("RED" or "GREEN")"""
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        # Published to the shared table so vehicles never have to poll
+        self._state = value
+        self.publish_state(value, LightState(light_id=self.name, state=value))
 
     def update_change_time(self, new_time):
         """Update the traffic light timing"""
         if new_time and new_time > 0:
             self.change_time = new_time
-            print(f"{self.name} change time updated to {self.change_time} seconds")
+            logger.info("%s change time updated to %s seconds", self.name, self.change_time)
             return True
         return False
 
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> LightState:
+        """Answer a typed state query from a vehicle"""
+        return LightState(light_id=self.name, state=self.state)
+
     @message_handler
     async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
         """Handle incoming messages to the traffic light"""
-        print(f"{self.name} (Traffic Light) received message: {message.content}")
+        logger.debug("%s (Traffic Light) received message: %s", self.name, message.content)
         
         if "request_state" in message.content.lower():
             response_message = self.state
@@ -112,21 +165,18 @@ class TrafficLightAssistant(MyAssistant):
         else:
             response_message = "Invalid command received"
 
-        print(f"{self.name} responds with: {response_message}")
+        logger.debug("%s responds with: %s", self.name, response_message)
         return MyMessageType(content=response_message, source="user")
 
 
 class TrafficLightRLAssistant(MyAssistant):
     """Traffic light agent that uses reinforcement learning to control traffic flow"""
-    
-    # Class variables for statistics and coordination
-    light_groups = {
-        "north_south": [],  # Vertical roads
-        "east_west": []     # Horizontal roads
-    }
-    
-    def __init__(self, name, group=None, epsilon=0.1, learning_rate=None):
+
+    stats_kind = "light"
+
+    def __init__(self, name, group=None, epsilon=0.1, learning_rate=None, state_table=None):
         super().__init__(name)
+        self.state_table = state_table
         
         # Auto-determine light group based on name, same as original
         if group is None:
@@ -147,9 +197,6 @@ class TrafficLightRLAssistant(MyAssistant):
         else:
             self.group = group
             
-        # Register this light to its group
-        TrafficLightRLAssistant.light_groups[self.group].append(name)
-        
         # Initialize state and RL parameters
         self.state = "RED"  # Initial state
         self.epsilon = epsilon  # Exploration rate
@@ -161,23 +208,31 @@ class TrafficLightRLAssistant(MyAssistant):
         # Traffic flow monitoring
         self.queue_length = 0  # Number of vehicles waiting at this light
         
-        # Start the RL decision task
-        self.traffic_light_task = asyncio.create_task(self.run_traffic_light_rl())
+        # First RL decision runs as soon as the simulation starts, then every 1.5-2.5 simulated seconds
+        self.traffic_light_event = get_clock().schedule_every(
+            lambda: random.uniform(1.5, 2.5), self.run_traffic_light_rl, first_delay=0)
+
+    @property
+    def state(self):
+        """Current light state ("RED" or "GREEN")"""
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        # Published to the shared table so vehicles never have to poll
+        self._state = value
+        self.publish_state(value, LightState(light_id=self.name, state=value))
     
-    async def run_traffic_light_rl(self):
-        """Background task to run the RL decision process"""
-        while True:
-            # Simulate traffic conditions (in a real system, this would come from sensors)
-            self.queue_length = self.simulate_queue_length()
-            
-            # Use RL to make a decision
-            reward, action = self.rl_model.step(self, self.queue_length)
-            
-            # Log the decision and reward
-            print(f"{self.name} RL decision: action={action}, reward={reward}, state={self.state}, queue={self.queue_length}")
-            
-            # Wait before next decision
-            await asyncio.sleep(random.uniform(1.5, 2.5))
+    def run_traffic_light_rl(self):
+        """Scheduled event: run one step of the RL decision process"""
+        # Simulate traffic conditions (in a real system, this would come from sensors)
+        self.queue_length = self.simulate_queue_length()
+        
+        # Use RL to make a decision
+        reward, action = self.rl_model.step(self, self.queue_length)
+        
+        # Log the decision and reward
+        logger.debug("%s RL decision: action=%s, reward=%s, state=%s, queue=%s", self.name, action, reward, self.state, self.queue_length)
     
     def simulate_queue_length(self):
         """Simulate traffic queue length based on current state and time of day"""
@@ -192,7 +247,7 @@ class TrafficLightRLAssistant(MyAssistant):
         """Update the exploration rate for the RL algorithm"""
         if 0 <= new_epsilon <= 1:
             self.epsilon = new_epsilon
-            print(f"{self.name} exploration rate updated to {self.epsilon}")
+            logger.info("%s exploration rate updated to %s", self.name, self.epsilon)
             return True
         return False
     
@@ -201,14 +256,19 @@ class TrafficLightRLAssistant(MyAssistant):
         if 0 < new_rate <= 1:
             self.learning_rate = new_rate
             self.rl_model.alfa = new_rate
-            print(f"{self.name} learning rate updated to {self.learning_rate}")
+            logger.info("%s learning rate updated to %s", self.name, self.learning_rate)
             return True
         return False
 
+    @message_handler
+    async def handle_state_query(self, message: StateQuery, ctx: MessageContext) -> LightState:
+        """Answer a typed state query from a vehicle"""
+        return LightState(light_id=self.name, state=self.state, queue_length=self.queue_length)
+
     @message_handler
     async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> MyMessageType:
         """Handle incoming messages to the traffic light"""
-        print(f"{self.name} (RL Traffic Light) received message: {message.content}")
+        logger.debug("%s (RL Traffic Light) received message: %s", self.name, message.content)
         
         if "request_state" in message.content.lower():
             response_message = f"{self.state} queue={self.queue_length}"
@@ -238,7 +298,7 @@ class TrafficLightRLAssistant(MyAssistant):
         else:
             response_message = "Invalid command received"
 
-        print(f"{self.name} responds with: {response_message}")
+        logger.debug("%s responds with: %s", self.name, response_message)
         return MyMessageType(content=response_message, source="user")
 
 
@@ -2,11 +2,24 @@ import math
 import random
 from autogen_core import AgentId, MessageContext, message_handler
 from traffic_agents.base import MyAssistant
-from messages.types import MyMessageType
-from shapely.geometry import LineString
+from messages.types import (
+    Move, StateQuery, ParkRequest, ExitRequest, ExitNotification
+)
+from sim.network import RoadNetwork, road_direction, is_opposite_direction
+from sim.occupancy import RoadOccupancy
+from sim.controls import ControlIndex
+from sim.parking import PARKING_RANGE
+from sim.clock import get_clock
+from sim.stats import RunningStats, get_stats
+from sim.kinematics import ROAD_END, TURN_SPEED
+from sim.log import get_logger
 from typing import Tuple
 from collections import defaultdict
 
+logger = get_logger("vehicle")
+
+# Share of a road a vehicle drives per step
+MOVEMENT_STEP = 0.05
 
 
 Point = Tuple[float, float]
@@ -17,15 +30,11 @@ def is_nearby(pos1: Point, pos2: Point, threshold: float = 30) -> bool:
     dy = pos2[1] - pos1[1]
     return (dx * dx + dy * dy) < threshold * threshold
 
-def get_exact_intersection_point(road1, road2):
-    line1 = LineString([(road1[0], road1[1]), (road1[2], road1[3])])
-    line2 = LineString([(road2[0], road2[1]), (road2[2], road2[3])])
-    inter = line1.intersection(line2)
-    return tuple(inter.coords[0]) if inter.geom_type == 'Point' else None
-
 class VehicleAssistant(MyAssistant):
     """Vehicle that handles movement, turning, parking, etc."""
 
+    stats_kind = "vehicle"
+
     def __init__(
             self,
             name,
@@ -35,14 +44,45 @@ class VehicleAssistant(MyAssistant):
             roads=None,
             crossings=None,
             traffic_lights=None,
-            parking_areas=None):
+            parking_areas=None,
+            network=None,
+            occupancy=None,
+            controls=None,
+            control_states=None,
+            state_queries=None,
+            scheduler=None,
+            parking_index=None,
+            route_planner=None,
+            travel_times=None,
+            pool=None):
         super().__init__(name)
 
-        self.roads = roads or []
+        # Shared compiled road graph; only built here when none was passed in
+        self.network = network if network is not None else RoadNetwork(roads or [])
+        self.roads = self.network.roads
+        # Shared per-road vehicle counts; a private index is only for standalone use
+        self.occupancy = occupancy if occupancy is not None else RoadOccupancy(self.network)
+        self.occupied_road = None  # road index this vehicle is counted on, if any
         self.crossings = crossings or []
         self.traffic_lights = traffic_lights or []
         self.parking_areas = parking_areas or []
+        # Shared ParkingIndex; without one every lot in range is asked in turn
+        self.parking_index = parking_index
+        # Shared RoutePlanner; without one the vehicle wanders until a despawn fallback triggers
+        self.route_planner = route_planner
+        # Shared TravelTimeEstimator fed with the time spent on each road
+        self.travel_times = travel_times
+        # Shared VehiclePool this agent returns to when it leaves the simulation
+        self.pool = pool
         self.current_position = current_position
+        # Per-road ordered lights/crossings, shared like the network
+        self.controls = controls if controls is not None else ControlIndex(self.network, self.traffic_lights, self.crossings)
+        # Pushed light/crossing states; controls missing from it are polled with request_state
+        self.control_states = control_states
+        # Shared StateQueryCache; polls of the same control in the same step share one request
+        self.state_queries = state_queries
+        # Shared ActiveSet; when set, the vehicle sleeps through its parked steps
+        self.scheduler = scheduler
 
         # Determine initial position
         initial_x = start_x
@@ -55,29 +95,51 @@ class VehicleAssistant(MyAssistant):
                 if len(road) >= 2: # Ensure road has coordinates
                     initial_x = road[0]
                     initial_y = road[1]
-                    print(f"{self.name}: Start position not provided, defaulting to start of road {self.current_position} at ({initial_x}, {initial_y})")
+                    logger.debug("%s: Start position not provided, defaulting to start of road %s at (%s, %s)", self.name, self.current_position, initial_x, initial_y)
                 else:
                     initial_x = 0 # Fallback if road data is incomplete
                     initial_y = 0
-                    print(f"{self.name}: Warning - Start position not provided and road {self.current_position} has no coordinates. Defaulting to (0, 0).")
+                    logger.warning("%s: Start position not provided and road %s has no coordinates. Defaulting to (0, 0).", self.name, self.current_position)
             else:
                 initial_x = 0 # Fallback if current_position is invalid
                 initial_y = 0
-                print(f"{self.name}: Warning - Start position not provided and current_position {self.current_position} is invalid. Defaulting to (0, 0).")
+                logger.warning("%s: Start position not provided and current_position %s is invalid. Defaulting to (0, 0).", self.name, self.current_position)
         # Else (start_x and start_y WERE provided), use them directly.
 
         self.x = initial_x
         self.y = initial_y
 
         # Continue with other initializations
+        self.movement_step = MOVEMENT_STEP
+        self.parking_desire = 0.3
+        self.trips = 0  # trips started by this agent (it is reused from the pool)
+        self.exits = 0  # trips that ended with the vehicle leaving the simulation
+
+        logger.debug("%s: Initialized at final position (%s, %s) on road index %s", self.name, self.x, self.y, current_position)
+        if current_position < len(self.roads) and len(self.roads[current_position])>=6:
+            logger.debug("%s: Starting on road %s", self.name, self.roads[current_position][5])
+
+        # Road system (connections, turns etc. are bound from self.network)
+        self.vehicle_registry = {}
+
+        # Wait times (kept across trips) in the installed SimulationStats, or a private accumulator
+        stats = get_stats()
+        self.wait_stats = stats.get("vehicle", name, "wait") if stats is not None else RunningStats()
+
+        # Setup
+        self._reset_trip_state()
+        self._process_road_properties()
+        self._validate_spawn_point()
+
+    def _reset_trip_state(self):
+        """Reset everything that belongs to a single trip (called on creation and on respawn)."""
         self.movement_progress = 0.0 # Start at the beginning of its position on the road segment logic
-        self.movement_step = 0.05
         self.route = [self.current_position]
         self.steps_since_start = 0
-
-        print(f"{self.name}: Initialized at final position ({self.x}, {self.y}) on road index {current_position}")
-        if current_position < len(self.roads) and len(self.roads[current_position])>=6:
-            print(f"{self.name}: Starting on road {self.roads[current_position][5]}")
+        self.entered = False
+        self.exiting = False
+        self.removed = False
+        self.asleep_since = None  # step at which the vehicle went to sleep
 
         # Turn logic
         self.is_turning = False
@@ -88,31 +150,36 @@ class VehicleAssistant(MyAssistant):
         self.turning_cooldown = 0
         self.last_road = None
 
-        # Road system
-        self.road_connections = {}
-        self.one_way_roads = set()
-        self.spawn_points = {}
-        self.despawn_points = {}
-        self.vehicle_registry = {}
-        self.road_occupancy = {}
-
         # Wait times
-        self.wait_times = []
         self.current_wait = 0
+        self.waiting_for = None  # (kind, ID) of the light or crossing that last stopped the vehicle
 
         # Parking
         self.parked = False
         self.parking_state = "driving"
         self.target_parking = None
         self.parking_timer = 0
-        self.parking_desire = 0.3
         self.parking_cooldown = 0
         self.recent_parkings = []
 
-        # Setup
-        self._process_road_properties()
+        # Trip
+        self.destination = None          # despawn road the current trip ends on
+        self.trip = None                 # road sequence planned when the trip started
+        self.road_entered_at = None      # clock time the vehicle started driving its current road
+        self.road_entry_progress = 0.0   # movement_progress at that time
+
+    def respawn(self, current_position, start_x, start_y):
+        """Reuse this agent, after it left the simulation, for a new vehicle.
+
+        The vehicle is placed at (start_x, start_y) on road `current_position`
+        and has to enter the environment again. Statistics such as
+        `wait_stats` carry over.
+        """
+        self.current_position = current_position
+        self.x, self.y = start_x, start_y
+        self.start_x, self.start_y = start_x, start_y
+        self._reset_trip_state()
         self._validate_spawn_point()
-        self._calculate_possible_turns()
 
     def set_vehicle_registry(self, registry):
         """Unused collision registry."""
@@ -120,9 +187,12 @@ class VehicleAssistant(MyAssistant):
 
     def _validate_spawn_point(self) -> None:
         """
-        Pick the road segment closest to (self.x, self.y) when the agent is first
-        spawned. Updates `self.current_position`, `self.movement_progress`,
-        `self.route`, and `self.road_occupancy` exactly like the original method.
+        Move the vehicle onto the road whose start or end is nearest to
+        (self.x, self.y), if that is another road within SNAP_DISTANCE, when
+        the agent is spawned. Updates `self.current_position`,
+        `self.movement_progress` and `self.route`. The network's grid of road
+        ends keeps this independent of the map size. Occupancy is only counted
+        once the vehicle enters the environment (see `enter_environment`).
         """
         if not (0 <= self.current_position < len(self.roads)):
             return                 # outside road list → nothing to do
@@ -130,177 +200,128 @@ class VehicleAssistant(MyAssistant):
         if self.movement_progress != 0.0:      # only at spawn time
             return
 
-        road = self.roads[self.current_position]
-        if len(road) >= 4:
-            print(f"{self.name}: Spawn validation check: "
-                f"Position ({self.x:.1f},{self.y:.1f}) "
-                f"on road index {self.current_position}")
-
-        x0, y0 = self.x, self.y                 # cache – attribute access is slow
-        best_idx = self.current_position
-        best_sq  = float("inf")                 # squared distance (no sqrt yet)
-        best_progress = 0.0                     # 0 = start‑point, 1 = end‑point
-
-        def sq_dist(px: float, py: float) -> float:
-            dx = px - x0
-            dy = py - y0
-            return dx * dx + dy * dy
-
-        # NOTE: if this loop is still hot, pre‑filter `self.roads` once in __init__
-        for i, r in enumerate(self.roads):
-            if len(r) < 4:
-                continue                        # skip malformed entries
-
-            d_start = sq_dist(r[0], r[1])
-            d_end   = sq_dist(r[2], r[3])
-            d_sq    = d_start if d_start < d_end else d_end
-
-            if d_sq < best_sq:                  # strictly closer?
-                best_sq = d_sq
-                best_idx = i
-                best_progress = 0.0 if d_start < d_end else 1.0
-
-                if best_sq == 0.0:              # perfect match – cannot beat that
-                    break
-
-        # ---------- 3) update state if we found something better ----------
-        # original threshold was 100 (px) → compare against 100²
-        if best_idx != self.current_position and best_sq < 10_000:
-            best_dist = math.sqrt(best_sq)      # only one sqrt in the whole method
-            print(f"{self.name}: Adjusted spawn road from "
-                f"{self.current_position} to {best_idx} "
-                f"(distance: {best_dist:.1f})")
+        logger.debug("%s: Spawn validation check: Position (%.1f,%.1f) on road index %s",
+                     self.name, self.x, self.y, self.current_position)
+
+        nearest = self.network.nearest_road_end(self.x, self.y)
+        if nearest is not None and nearest[0] != self.current_position:
+            best_idx, best_progress, best_dist = nearest
+            logger.debug("%s: Adjusted spawn road from %s to %s (distance: %.1f)",
+                         self.name, self.current_position, best_idx, best_dist)
 
             self.current_position  = best_idx
             self.movement_progress = best_progress
             self.route             = [best_idx]
 
-            # update occupancy
-            road = self.roads[best_idx]
-            if len(road) >= 6:
-                road_id = road[5]
-                self.road_occupancy.setdefault(road_id, 0)
-                self.road_occupancy[road_id] += 1
+    def can_enter(self):
+        """True if the vehicle's starting road has room for it."""
+        return self.occupancy.has_capacity(self.current_position)
+
+    def enter_environment(self):
+        """Mark the vehicle as entered and count it on its starting road."""
+        self.entered = True
+        self.trips += 1
+        self._occupy_road(self.current_position)
+        self._start_road_timer()
+        self._plan_trip()
+
+    def _start_road_timer(self):
+        """Note when and where this vehicle started driving its current road."""
+        self.road_entered_at = get_clock().now
+        self.road_entry_progress = self.movement_progress
+
+    def _record_road_time(self):
+        """Report the time spent driving the current road to the travel-time estimator and the statistics."""
+        if self.road_entered_at is None:
+            return
+        elapsed = get_clock().now - self.road_entered_at
+        if self.travel_times is not None:
+            self.travel_times.observe(
+                self.current_position,
+                elapsed,
+                min(self.movement_progress, 1.0) - self.road_entry_progress,
+            )
+        stats = get_stats()
+        if stats is not None:
+            stats.record("road", self._road_id(self.current_position), "travel_time", elapsed)
+        self.road_entered_at = None
+
+    def _road_id(self, road_idx):
+        road = self.roads[road_idx]
+        return road[5] if len(road) >= 6 else f"road_{road_idx}"
+
+    def _end_wait(self):
+        """Record the wait that just ended for this vehicle, its road and the control that stopped it."""
+        self.wait_stats.add(self.current_wait)
+        stats = get_stats()
+        if stats is not None:
+            stats.record("road", self._road_id(self.current_position), "wait", self.current_wait)
+            if self.waiting_for is not None:
+                stats.record(*self.waiting_for, "wait", self.current_wait)
+        self.waiting_for = None
+        self.current_wait = 0
 
-    def _process_road_properties(self):
-        """Reads the user’s JSON road data into internal structures."""
-        self.road_connections = {}
-        self.one_way_roads = set()
-        self.spawn_points = {}
-        self.despawn_points = {}
-
-        for i,road in enumerate(self.roads):
-            # one_way
-            if len(road) >= 7:
-                if road[6]:
-                    self.one_way_roads.add(i)
-            # spawn
-            if len(road) >= 8:
-                if road[7]:
-                    self.spawn_points[i] = True
-            # despawn
-            if len(road) >= 9:
-                if road[8]:
-                    self.despawn_points[i] = True
-        # If the user has explicit connections
-        for i,road in enumerate(self.roads):
-            if len(road) >= 10 and isinstance(road[9], list):
-                self.road_connections[i] = road[9]
-
-        # Debug
-        road_id="unknown"
-        if self.current_position<len(self.roads) and len(self.roads[self.current_position])>=6:
-            road_id=self.roads[self.current_position][5]
-        print(f"=== {self.name} Road Props ===")
-        print(f"Current road: {road_id} index={self.current_position}")
-        print(f"One-ways: {len(self.one_way_roads)}")
-        print(f"Spawns: {len(self.spawn_points)}")
-        print(f"Despawns: {len(self.despawn_points)} => {self.despawn_points}")
-        print(f"Connections: {len(self.road_connections)}")
-
-        # If no connections exist, compute fallback
-        if not self.road_connections:
-            self._calculate_default_connections()
-
-    def _calculate_default_connections(self):
-        """If roads have no explicit connections, guess by geometry (end of one is near start of another)."""
-        print(f"{self.name}: Calculating default connections by geometry.")
-        for i,road1 in enumerate(self.roads):
-            conns=[]
-            x1,y1,x2,y2=road1[:4]
-            end=(x2,y2)
-            for j,road2 in enumerate(self.roads):
-                if i==j: continue
-                sx,sy=road2[0],road2[1]
-                dist=math.sqrt((end[0]-sx)**2+(end[1]-sy)**2)
-                if dist<60:
-                    conns.append(j)
-            if conns:
-                self.road_connections[i]=conns
-                print(f"{self.name}: Road {i} => {conns}")
-
-
-    def _calculate_possible_turns(self):
-        """Compute possible turns from self.road_connections plus intersection geometry if needed."""
-        self.turn_options = {}
-        # If you want to do “strict intersection detection,” you can add that logic here
-        # or call something like self._calculate_turns_by_strict_intersection()
-        # For now, we rely on self.road_connections only:
-        for i,road1 in enumerate(self.roads):
-            if i not in self.road_connections: 
-                continue
-            possible = []
-            x1_curr, y1_curr, x2_curr, y2_curr = road1[:4] # End point of current road
+    def _plan_trip(self):
+        """Pick a despawn road to drive to and plan the shortest route there."""
+        if self.route_planner is None:
+            return
+        choices = self.route_planner.destinations(self.current_position)
+        if choices:
+            self.destination = random.choice(choices)
+            self.trip = self.route_planner.route(self.current_position, self.destination)
+            logger.debug("%s: Trip from road %s to road %s via %s", self.name, self.current_position, self.destination, self.trip)
 
-            for j in self.road_connections[i]:
-                if i==j:
-                    continue
-                
-                road2 = self.roads[j]
-                x1_next, y1_next, x2_next, y2_next = road2[:4] # Start and end of potential next road
-
-                # compute intersection or angle checks if you want
-                # For now we just store a dummy intersection = the end of road1
-                # or the start of road2. Usually you want the actual intersection point:
-                inter = get_exact_intersection_point(road1, road2)
-                if inter:
-                    # Check one-way constraint: If road 'j' is one-way, the intersection
-                    # point must be closer to its start (x1_next, y1_next) than its end.
-                    is_one_way_next = j in self.one_way_roads
-                    if is_one_way_next:
-                        dist_to_start = math.sqrt((inter[0] - x1_next)**2 + (inter[1] - y1_next)**2)
-                        dist_to_end = math.sqrt((inter[0] - x2_next)**2 + (inter[1] - y2_next)**2)
-                        # Allow a small tolerance (e.g., 10 units) for near-exact matches
-                        if dist_to_start > dist_to_end + 10: 
-                            print(f"{self.name}: Skipping turn from road {i} to one-way road {j} - wrong direction entry at {inter}.")
-                            continue # Skip this turn option as it violates one-way direction
-
-                    # get directions
-                    rd1_dir = self._get_road_direction(road1)
-                    rd2_dir = self._get_road_direction(road2)
-                    # skip direct U-turn based on cardinal direction (already present)
-                    if not self._is_opposite_direction(rd1_dir, rd2_dir):
-                        possible.append( (j, inter, rd1_dir, rd2_dir) )
-            if possible:
-                self.turn_options[i] = possible
-                # Reduced verbosity here
-                # print(f"{self.name}: Road {i} has {len(possible)} turn options from connections.")
+    def _planned_next_road(self):
+        """Next road on the shortest route to the trip destination, or None.
+
+        A vehicle that can no longer reach its destination drops the trip
+        and falls back to wandering.
+        """
+        if self.destination is None or self.current_position == self.destination:
+            return None
+        next_road = self.route_planner.next_road(self.current_position, self.destination)
+        if next_road is None:
+            logger.debug("%s: Destination %s unreachable from road %s, dropping trip", self.name, self.destination, self.current_position)
+            self.destination = None
+        return next_road
+
+    def _occupy_road(self, road_idx):
+        """Move this vehicle's slot in the shared occupancy index to `road_idx`."""
+        if self.occupied_road == road_idx:
+            return
+        self._release_road()
+        if 0 <= road_idx < len(self.roads):
+            count = self.occupancy.enter(road_idx)
+            self.occupied_road = road_idx
+            logger.debug("%s: Entering road %s, occupancy now %s", self.name, road_idx, count)
+
+    def _release_road(self):
+        """Remove this vehicle from the shared occupancy index (parking, despawn, road change)."""
+        if self.occupied_road is not None:
+            count = self.occupancy.leave(self.occupied_road)
+            logger.debug("%s: Leaving road %s, occupancy now %s", self.name, self.occupied_road, count)
+            self.occupied_road = None
+
+    def _process_road_properties(self):
+        """Reference the shared road network structures (no per-vehicle copies)."""
+        net = self.network
+        self.road_connections = net.road_connections
+        self.one_way_roads = net.one_way_roads
+        self.spawn_points = net.spawn_points
+        self.despawn_points = net.despawn_points
+        self.turn_options = net.turn_options
 
     def _get_road_direction(self, road):
-        x1,y1,x2,y2=road[:4]
-        dx = x2 - x1
-        dy = y2 - y1
-        if abs(dx)>abs(dy):
-            return "E" if dx>0 else "W"
-        else:
-            return "S" if dy>0 else "N"
+        return road_direction(road)
 
     def _is_opposite_direction(self, d1, d2):
         """True if one is N and the other S, or E vs W."""
-        opp={"N":"S","S":"N","E":"W","W":"E"}
-        return opp.get(d1)==d2
+        return is_opposite_direction(d1, d2)
 
     def _check_if_near_despawn_point(self):
+        if self.destination is not None:
+            # On a planned trip: leave once the end of the destination road is near
+            return self.current_position == self.destination and self.movement_progress>0.8
         # A more thorough check if near the end
         if self.current_position in self.despawn_points and self.movement_progress>0.8:
             return True
@@ -316,64 +337,87 @@ class VehicleAssistant(MyAssistant):
         return False
 
     @message_handler
-    async def handle_my_message_type(self, message: MyMessageType, ctx: MessageContext) -> None:
-        print(f"{self.name} received: {message.content}")
+    async def handle_move(self, message: Move, ctx: MessageContext) -> None:
+        """Advance the vehicle by one simulation step"""
         if hasattr(self,'exiting') and self.exiting:
             return
         if hasattr(self,'removed') and self.removed:
             return
+        response=await self._step()
+        if response:
+            logger.debug("%s => %s", self.name, response)
+
+    @message_handler
+    async def handle_exit_notification(self, message: ExitNotification, ctx: MessageContext) -> None:
+        """Leave the parking area when it asks us to"""
+        logger.debug("%s received exit notification from %s", self.name, message.source)
+        if self.parking_state=="parked" and self.target_parking==message.source:
+            await self._exit_parking()
+
+    async def _step(self):
+        """Run one movement step and return a short description of what happened."""
         response = ""
-        if "move" in message.content.lower():
-            self.steps_since_start+=1
-            if self.parking_state=="parked":
-                # small chance to exit
-                if random.random()<0.05:
-                    await self._exit_parking()
-                    response=f"Vehicle leaving parking {self.target_parking}"
-                else:
-                    response=f"Vehicle is parked at {self.target_parking}"
-            elif self.parking_state in ["parking","exiting"]:
-                self.parking_timer-=1
-                if self.parking_timer<=0:
-                    if self.parking_state=="parking":
-                        self.parking_state="parked"
-                        response=f"{self.name} completed parking at {self.target_parking}"
-                    else:
-                        self.parking_state="driving"
-                        self.parked=False
-                        if self.target_parking not in self.recent_parkings:
-                            self.recent_parkings.append(self.target_parking)
-                            if len(self.recent_parkings)>3:
-                                self.recent_parkings.pop(0)
-                        self.parking_cooldown = random.randint(10,20)
-                        old=self.target_parking
-                        self.target_parking=None
-                        response=f"Exited parking {old}. cooldown={self.parking_cooldown}"
-                else:
-                    response=f"Still {self.parking_state}: {self.parking_timer}s"
-            elif self.parked:
-                response="Vehicle is parked"
+        self.steps_since_start+=1
+        if self.asleep_since is not None:
+            # Count the steps slept through as if we had been messaged every step
+            self.steps_since_start += self.scheduler.step - self.asleep_since - 1
+            self.asleep_since = None
+        if self.parking_state=="parked":
+            # small chance to exit; with a scheduler the draw was made when we went to sleep
+            if self.scheduler is not None or random.random()<0.05:
+                await self._exit_parking()
+                if self.parking_state=="parked":
+                    self._sleep_while_parked()
+                response=f"Vehicle leaving parking {self.target_parking}"
             else:
-                # normal movement
-                if self.parking_cooldown > 0:
-                    self.parking_cooldown -= 1
-                
-                collision=await self._check_for_collisions()
-                if collision:
-                    self.current_wait+=1
-                    response=f"Blocked by collision? wait={self.current_wait}"
+                response=f"Vehicle is parked at {self.target_parking}"
+        elif self.parking_state in ["parking","exiting"]:
+            self.parking_timer-=1
+            if self.parking_timer<=0:
+                if self.parking_state=="parking":
+                    self.parking_state="parked"
+                    self._sleep_while_parked()
+                    response=f"{self.name} completed parking at {self.target_parking}"
+                elif not await self._check_road_capacity(self.current_position):
+                    self.parking_timer=0
+                    response=f"Waiting to leave parking {self.target_parking} - road {self.current_position} at capacity"
                 else:
-                    # maybe parking
-                    found=False
-                    if self.parking_cooldown<=0 and self.steps_since_start>10:
-                        found=await self._check_for_parking()
-                        if found:
-                            response=f"Vehicle is parking at {self.target_parking}"
-                    if not found:
-                        response=await self._move_forward()
+                    self.parking_state="driving"
+                    self.parked=False
+                    self._occupy_road(self.current_position)
+                    self._start_road_timer()
+                    if self.target_parking not in self.recent_parkings:
+                        self.recent_parkings.append(self.target_parking)
+                        if len(self.recent_parkings)>3:
+                            self.recent_parkings.pop(0)
+                    self.parking_cooldown = random.randint(10,20)
+                    old=self.target_parking
+                    self.target_parking=None
+                    response=f"Exited parking {old}. cooldown={self.parking_cooldown}"
+            else:
+                response=f"Still {self.parking_state}: {self.parking_timer}s"
+        elif self.parked:
+            response="Vehicle is parked"
+        else:
+            # normal movement
+            if self.parking_cooldown > 0:
+                self.parking_cooldown -= 1
+            
+            collision=await self._check_for_collisions()
+            if collision:
+                self.current_wait+=1
+                response=f"Blocked by collision? wait={self.current_wait}"
+            else:
+                # maybe parking
+                found=False
+                if self.parking_cooldown<=0 and self.steps_since_start>10:
+                    found=await self._check_for_parking()
+                    if found:
+                        response=f"Vehicle is parking at {self.target_parking}"
+                if not found:
+                    response=await self._move_forward()
 
-        if response:
-            print(f"{self.name} => {response}")
+        return response
 
     async def _check_for_collisions(self):
         return False
@@ -383,17 +427,20 @@ class VehicleAssistant(MyAssistant):
         if self.is_turning:
             return await self._continue_turn()
 
+        # Held at the end of the road until the next one has room
+        if self.movement_progress >= ROAD_END:
+            return await self._reach_road_end()
+
         # check obstacles
-        blocked = await self._check_for_obstacles((self.x, self.y))
+        blocked = await self._check_for_obstacles()
         if blocked and self.current_wait < 4:  # Limit wait time to prevent vehicles from getting stuck
             self.current_wait += 1
             if self.current_wait > 3:
-                print(f"{self.name} forcing movement next time.")
+                logger.debug("%s forcing movement next time.", self.name)
             return f"Waiting for obstacle. wait={self.current_wait}"
 
         if self.current_wait > 0:
-            self.wait_times.append(self.current_wait)
-            self.current_wait = 0
+            self._end_wait()
 
         # Check despawn
         if self.movement_progress > 0.85 and self._check_if_near_despawn_point():
@@ -411,64 +458,71 @@ class VehicleAssistant(MyAssistant):
             self.turning_cooldown -= 1
 
         # Advance
+        return await self._advance()
+
+    async def _advance(self):
+        """Move one step along the current road, switching roads at its end."""
         self.movement_progress += self.movement_step
         
         # Handle road transitions when reaching the end
-        if self.movement_progress >= 0.999:
-            # Check if this is the last road in our route or if we're set to despawn
-            if self._check_if_near_despawn_point():
-                await self._exit_simulation()
-                return f"{self.name} leaving sim"
-
-            print(f"{self.name} has reached the end of road {self.current_position}")
-            
-            # Get current road and its end coordinates
-            old_road = self.roads[self.current_position]
-            end_x, end_y = old_road[2], old_road[3]  # x2, y2 of current road
-            
-            # Reduce occupancy for the road we're leaving
-            if len(old_road) >= 6:
-                road_id = old_road[5]
-                if road_id in self.road_occupancy and self.road_occupancy[road_id] > 0:
-                    self.road_occupancy[road_id] -= 1
-                    print(f"{self.name}: Leaving road {road_id}, occupancy now {self.road_occupancy[road_id]}")
-            
-            # Store the road we're leaving
-            self.last_road = self.current_position
-            
-            # Get the next road to transition to
-            next_road_idx = self._get_next_road()
-            print(f"{self.name} moving from road {self.current_position} to road {next_road_idx}")
-            
-            # Get the new road and compute the parameter t at the intersection point
-            new_road = self.roads[next_road_idx]
-            
-            # Compute parameter on new road based on the endpoint of old road
-            param = self._compute_parameter_on_road(new_road, end_x, end_y)
-            print(f"{self.name}: Starting new road at parameter {param:.3f} instead of 0.0")
-            
-            # Update to the new road with the correct parameter
-            self.current_position = next_road_idx
-            self.movement_progress = param  # Use intersection parameter instead of resetting to 0.0
-            self.route.append(self.current_position)
-            
-            # Update occupancy for the new road
-            if len(new_road) >= 6:
-                road_id = new_road[5]
-                if road_id not in self.road_occupancy:
-                    self.road_occupancy[road_id] = 0
-                self.road_occupancy[road_id] += 1
-                print(f"{self.name}: Entering road {road_id}, occupancy now {self.road_occupancy[road_id]}")
-            
-            # Update coordinates based on the parameter on the new road
-            self.update_coordinates()
-            
-            return f"Vehicle moved to road segment {self.current_position} at parameter {param:.3f}"
+        if self.movement_progress >= ROAD_END:
+            return await self._reach_road_end()
         else:
             # Just continue moving along current road
             self.update_coordinates()
             return f"Vehicle moving along road segment {self.current_position} ({self.movement_progress:.2f})"
 
+    async def _reach_road_end(self):
+        """Leave the simulation or switch to the next road once the end of the current one is reached."""
+        # Check if this is the last road in our route or if we're set to despawn
+        if self._check_if_near_despawn_point():
+            await self._exit_simulation()
+            return f"{self.name} leaving sim"
+
+        logger.info("%s has reached the end of road %s", self.name, self.current_position)
+        
+        # Get current road and its end coordinates
+        old_road = self.roads[self.current_position]
+        end_x, end_y = old_road[2], old_road[3]  # x2, y2 of current road
+        
+        # Get the next road to transition to
+        next_road_idx = self._get_next_road()
+
+        # Wait at the end of the road while the next one is full
+        if next_road_idx != self.current_position and not await self._check_road_capacity(next_road_idx):
+            self.movement_progress = ROAD_END
+            self.update_coordinates()
+            self.current_wait += 1
+            return f"Waiting at end of road {self.current_position} - road {next_road_idx} at capacity. Wait time: {self.current_wait}"
+        if self.current_wait > 0:
+            self._end_wait()
+
+        # Store the road we're leaving
+        self.last_road = self.current_position
+        logger.info("%s moving from road %s to road %s", self.name, self.current_position, next_road_idx)
+        
+        # Get the new road and compute the parameter t at the intersection point
+        new_road = self.roads[next_road_idx]
+        
+        # Compute parameter on new road based on the endpoint of old road
+        param = self._compute_parameter_on_road(new_road, end_x, end_y)
+        logger.debug("%s: Starting new road at parameter %.3f instead of 0.0", self.name, param)
+        
+        # Update to the new road with the correct parameter
+        self._record_road_time()
+        self.current_position = next_road_idx
+        self.movement_progress = param  # Use intersection parameter instead of resetting to 0.0
+        self.route.append(self.current_position)
+        self._start_road_timer()
+        
+        # Move our slot in the shared occupancy index to the new road
+        self._occupy_road(self.current_position)
+        
+        # Update coordinates based on the parameter on the new road
+        self.update_coordinates()
+        
+        return f"Vehicle moved to road segment {self.current_position} at parameter {param:.3f}"
+
     async def _continue_turn(self):
         """Continue turning until the turn arc is finished, then place the vehicle onto the new road at the intersection."""
         if not self.is_turning:
@@ -481,49 +535,58 @@ class VehicleAssistant(MyAssistant):
 
         # Reset wait counter if we were waiting
         if self.current_wait > 0:
-            self.wait_times.append(self.current_wait)
-            self.current_wait = 0
+            self._end_wait()
+
+        # Take the slot on the target road now if the turn ends this step; with
+        # FleetKinematics the turn only completes after every vehicle has moved
+        if self.turn_progress + TURN_SPEED >= 1.0:
+            self._occupy_road(self.next_road_idx)
 
         # Progress the turn animation
-        self.turn_progress += 0.15  # Adjust turn speed as needed
+        return await self._advance_turn()
+
+    async def _advance_turn(self):
+        """Move one step along the turn arc, finishing the turn at its end."""
+        self.turn_progress += TURN_SPEED  # Adjust turn speed as needed
         
         # Turn completed
         if self.turn_progress >= 1.0:
-            # Update road transition tracking
-            self.last_road = self.current_position
-            self.current_position = self.next_road_idx
-            self.route.append(self.current_position)
-            self.is_turning = False
-            self.turning_cooldown = 5  # Cooldown before next turn
-            
-            # Get the final intersection coordinates
-            ix, iy = self._turn_arc_position(1.0)
-            
-            # Get the new road and compute the correct parameter
-            new_road = self.roads[self.current_position]
-            param = self._compute_parameter_on_road(new_road, ix, iy)
-            
-            # Update movement progress to the parameter on the new road
-            self.movement_progress = param  # NOT resetting to 0.0
-            
-            # Set position exactly at the intersection point
-            self.x, self.y = ix, iy
-            
-            # Update road occupancy
-            if len(new_road) >= 6:
-                road_id = new_road[5]
-                if road_id not in self.road_occupancy:
-                    self.road_occupancy[road_id] = 0
-                self.road_occupancy[road_id] += 1
-                print(f"{self.name}: Entering road {road_id} after turn, occupancy now {self.road_occupancy[road_id]}")
-            
-            return f"Vehicle completed turn onto road {self.current_position} at parameter {param:.3f}, position: ({ix:.1f}, {iy:.1f})"
+            return self._complete_turn()
         else:
             # Compute position along the turn arc for partial turns
             px, py = self._turn_arc_position(self.turn_progress)
             self.x, self.y = px, py
             return f"Vehicle turning to road {self.next_road_idx}, turn progress: {self.turn_progress:.2f}"
 
+    def _complete_turn(self):
+        """Place the vehicle onto the new road at the intersection."""
+        # Update road transition tracking
+        self._record_road_time()
+        self.last_road = self.current_position
+        self.current_position = self.next_road_idx
+        self.route.append(self.current_position)
+        self.is_turning = False
+        self.turning_cooldown = 5  # Cooldown before next turn
+        
+        # Get the final intersection coordinates
+        ix, iy = self._turn_arc_position(1.0)
+        
+        # Get the new road and compute the correct parameter
+        new_road = self.roads[self.current_position]
+        param = self._compute_parameter_on_road(new_road, ix, iy)
+        
+        # Update movement progress to the parameter on the new road
+        self.movement_progress = param  # NOT resetting to 0.0
+        self._start_road_timer()
+        
+        # Set position exactly at the intersection point
+        self.x, self.y = ix, iy
+        
+        # Leave the old road and count us on the new one
+        self._occupy_road(self.current_position)
+        
+        return f"Vehicle completed turn onto road {self.current_position} at parameter {param:.3f}, position: ({ix:.1f}, {iy:.1f})"
+
     def _turn_arc_position(self, progress):
         """Calculate position along a turn arc at the given progress (0.0 to 1.0)"""
         if not hasattr(self, 'turn_origin') or not hasattr(self, 'turn_target'):
@@ -565,7 +628,7 @@ class VehicleAssistant(MyAssistant):
         # Clamp to [0,1] to ensure we stay on the road segment
         parameter = max(0.0, min(1.0, projection))
         
-        print(f"{self.name}: Computed parameter {parameter:.3f} for point ({x:.1f},{y:.1f}) on road segment")
+        logger.debug("%s: Computed parameter %.3f for point (%.1f,%.1f) on road segment", self.name, parameter, x, y)
         return parameter
 
 
@@ -580,120 +643,136 @@ class VehicleAssistant(MyAssistant):
         self.y=y1+(y2-y1)*t
 
     async def _check_road_capacity(self, road_idx):
-        if road_idx<0 or road_idx>=len(self.roads):
-            return False
-        road=self.roads[road_idx]
-        if len(road)<6:
-            return True
-        cap=road[4]
-        rdid=road[5]
-        if rdid not in self.road_occupancy:
-            self.road_occupancy[rdid]=0
-        return (self.road_occupancy[rdid]<cap)
-
-    async def _check_for_obstacles(self, position):
-        """Check lights/ped crossings. Return True if blocked."""
-        x,y=position
-        # Traffic lights
-        for light in self.traffic_lights:
-            if is_nearby((light["x"],light["y"]),(x,y),threshold=50):
-                light_id=AgentId(light["id"],"default")
-                try:
-                    res=await self.runtime.send_message(
-                        MyMessageType(content="request_state",source=self.name),
-                        light_id
-                    )
-                    if "red" in res.content.lower():
-                        print(f"{self.name} blocked at red light {light['id']}")
-                        return True
-                except:
-                    if self.current_wait>2:
-                        return False
-                    return True
-        # Crossings
-        for crossing in self.crossings:
-            if is_nearby((crossing["x"],crossing["y"]),(x,y),threshold=40):
-                crossing_id=AgentId(crossing["id"],"default")
-                try:
-                    res=await self.runtime.send_message(
-                        MyMessageType(content="request_state",source=self.name),
-                        crossing_id
-                    )
-                    if "occupied" in res.content.lower():
-                        if self.current_wait>=3:
+        """O(1) capacity check against the shared occupancy index."""
+        return self.occupancy.has_capacity(road_idx)
+
+    async def _check_for_obstacles(self):
+        """Check the lights/ped crossings just ahead on the current road. Return True if blocked."""
+        for kind, control_id in self.controls.ahead(self.current_position, self.movement_progress):
+            # Pushed LightState/CrossingState, or a query reply when the control hasn't pushed one
+            state = self.control_states.get(control_id) if self.control_states is not None else None
+            if kind == "light":
+                if state is None:
+                    try:
+                        state=await self._query_state(AgentId(control_id,"default"))
+                    except:
+                        if self.current_wait>2:
                             return False
-                        return True
-                except:
-                    if self.current_wait>1:
+                        return self._blocked_by(kind, control_id)
+                if state.is_red:
+                    logger.debug("%s blocked at red light %s", self.name, control_id)
+                    return self._blocked_by(kind, control_id)
+            else:
+                if state is None:
+                    try:
+                        state=await self._query_state(AgentId(control_id,"default"))
+                    except:
+                        if self.current_wait>1:
+                            return False
+                        return self._blocked_by(kind, control_id)
+                if state.occupied:
+                    if self.current_wait>=3:
                         return False
-                    return True
+                    return self._blocked_by(kind, control_id)
 
         if self.current_wait>4:
             self.current_wait=0
             return False
         return False
 
+    def _blocked_by(self, kind, control_id):
+        """Remember which control is holding the vehicle, for the wait statistics; returns True"""
+        self.waiting_for = (kind, control_id)
+        return True
+
+    async def _query_state(self, control_id):
+        """Ask a light or crossing for its state, through the per-step query cache if there is one"""
+        if self.state_queries is not None:
+            return await self.state_queries.query(self, control_id, StateQuery(source=self.name))
+        return await self.send_message(StateQuery(source=self.name), control_id)
+
     async def _check_for_parking(self):
         if self.parking_cooldown>0:
             return False
         if random.random()>self.parking_desire:
             return False
+        if self.parking_index is not None:
+            # A single request to the nearest lot that still has room
+            pid=self.parking_index.nearest_available(self.x,self.y,exclude=self.recent_parkings)
+            return pid is not None and await self._try_parking(pid)
         for p in self.parking_areas:
             if p["id"] in self.recent_parkings:
                 continue
             dist=math.sqrt((self.x-p["x"])**2+(self.y-p["y"])**2)
-            if dist<150:
-                self.target_parking=p["id"]
-                resp=await self._request_parking(self.target_parking)
-                if "accepted" in resp:
-                    try:
-                        sec=int(resp.split("=")[1])
-                    except:
-                        sec=3
-                    self.parking_state="parking"
-                    self.parking_timer=sec
-                    self.parked=True
-                    return True
-                else:
-                    self.target_parking=None
+            if dist<PARKING_RANGE and await self._try_parking(p["id"]):
+                return True
+        return False
+
+    async def _try_parking(self, pid):
+        """Ask parking area `pid` for a space and start parking if it accepts"""
+        self.target_parking=pid
+        resp=await self._request_parking(pid)
+        if resp is not None and resp.accepted:
+            sec=resp.parking_time or 3
+            self.parking_state="parking"
+            self.parking_timer=sec
+            self.parked=True
+            self._release_road()
+            self.road_entered_at=None  # time spent parked is not travel time
+            return True
+        self.target_parking=None
         return False
 
     async def _exit_parking(self):
         if not self.target_parking or self.parking_state!="parked":
             return
         resp=await self._request_exit(self.target_parking)
-        if "accepted" in resp:
-            try:
-                sec=int(resp.split("=")[1])
-            except:
-                sec=2
+        if resp is not None and resp.accepted:
+            sec=resp.exit_time or 2
             self.parking_state="exiting"
             self.parking_timer=sec
+            if self.scheduler is not None:
+                self.scheduler.wake(self.name)
+
+    def _sleep_while_parked(self):
+        """Hand the parked steps to the scheduler instead of being messaged every step.
+
+        Draws how many steps the per-step 5% exit chance would take to
+        succeed (a geometric draw) and sleeps until then.
+        """
+        if self.scheduler is None:
+            return
+        steps = 1 + int(math.log(1.0 - random.random()) / math.log(0.95))
+        self.scheduler.sleep(self.name, steps)
+        self.asleep_since = self.scheduler.step
 
     async def _request_parking(self, pid):
         try:
             aid=AgentId(pid,"default")
-            r=await self.runtime.send_message(
-                MyMessageType(content="park",source=self.name),
+            r=await self.send_message(
+                ParkRequest(vehicle_id=self.name),
                 aid
             )
-            return r.content
+            return r
         except:
-            return "error"
+            return None
 
     async def _request_exit(self, pid):
         try:
             aid=AgentId(pid,"default")
-            r=await self.runtime.send_message(
-                MyMessageType(content="exit",source=self.name),
+            r=await self.send_message(
+                ExitRequest(vehicle_id=self.name),
                 aid
             )
-            return r.content
+            return r
         except:
-            return "error"
+            return None
 
     def _get_next_road(self):
-        """Pick next road from explicit connections or fallback to i+1."""
+        """Pick next road: the trip's planned road, else explicit connections or fallback to i+1."""
+        planned=self._planned_next_road()
+        if planned is not None:
+            return planned
         if self.current_position in self.road_connections:
             options=self.road_connections[self.current_position]
             if options:
@@ -719,22 +798,19 @@ class VehicleAssistant(MyAssistant):
         return idx
 
     async def _exit_simulation(self):
+        self._release_road()
         self.exiting=True
         self.removed=True
         self.x=-9999
         self.y=-9999
         self.parked=False
         self.parking_state="exited"
-        # try manager
-        try:
-            sim_mgr=AgentId("simulation_manager","default")
-            await self.runtime.send_message(
-                MyMessageType(content=f"exit_notification|{self.name}",source=self.name),
-                sim_mgr
-            )
-        except:
-            pass
-        print(f"{self.name} EXITING SIMULATION ⚠️")
+        self.exits += 1
+        if self.scheduler is not None:
+            self.scheduler.remove(self.name)
+        if self.pool is not None:
+            self.pool.release(self)
+        logger.info("%s EXITING SIMULATION ⚠️", self.name)
         return True
 
     async def _check_for_turn(self):
@@ -747,6 +823,11 @@ class VehicleAssistant(MyAssistant):
         if self.turning_cooldown > 0:
             return False
             
+        # Stay on the destination road; elsewhere only turn onto the planned road
+        if self.destination is not None and self.current_position == self.destination:
+            return False
+        planned = self._planned_next_road()
+            
         current_road = self.roads[self.current_position]
         road_id = current_road[5] if len(current_road) >= 6 else f"road_{self.current_position}"
         
@@ -767,6 +848,8 @@ class VehicleAssistant(MyAssistant):
                 # Skip turning to the road we just came from
                 if next_road_idx == self.last_road:
                     continue
+                if planned is not None and next_road_idx != planned:
+                    continue
                     
                 # Check if the next road has capacity
                 if not await self._check_road_capacity(next_road_idx):
@@ -818,7 +901,7 @@ class VehicleAssistant(MyAssistant):
                 self.turn_target = intersection_point
                 self.turn_progress = 0.0
                 
-                print(f"{self.name} beginning turn from {road_id} to {next_road_id} at intersection {intersection_point}")
+                logger.info("%s beginning turn from %s to %s at intersection %s", self.name, road_id, next_road_id, intersection_point)
                 
                 return True
         
@@ -831,6 +914,8 @@ class VehicleAssistant(MyAssistant):
                 # Skip the road we just came from
                 if next_idx == self.last_road:
                     continue
+                if planned is not None and next_idx != planned:
+                    continue
                     
                 # Check if the road has capacity
                 if not await self._check_road_capacity(next_idx):
@@ -847,8 +932,8 @@ class VehicleAssistant(MyAssistant):
                 # Use road endpoints for turn calculation
                 self.turn_origin = (current_x, current_y)
                 
-                # Try to find intersection point
-                intersection = get_exact_intersection_point(current_road, next_road)
+                # Try to find intersection point (precomputed by the road network)
+                intersection = self.network.intersection(self.current_position, self.next_road_idx)
                 if intersection:
                     self.turn_target = intersection
                 else:
@@ -857,9 +942,97 @@ class VehicleAssistant(MyAssistant):
                     
                 self.turn_progress = 0.0
                 
-                print(f"{self.name} beginning turn from {road_id} to {next_road_id} at calculated intersection {self.turn_target}")
+                logger.info("%s beginning turn from %s to %s at calculated intersection %s", self.name, road_id, next_road_id, self.turn_target)
                 
                 return True
                 
         # No valid turns found
         return False
+
+
+class _FleetField:
+    """Vehicle attribute stored at the vehicle's slot of a FleetKinematics array"""
+
+    def __init__(self, array, cast, none=None):
+        self.array = array
+        self.cast = cast
+        self.none = none  # array value standing in for None, if any
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj.kinematics, self.array)[obj.slot]
+        if self.none is not None and value == self.none:
+            return None
+        return self.cast(value)
+
+    def __set__(self, obj, value):
+        getattr(obj.kinematics, self.array)[obj.slot] = self.none if value is None else value
+
+
+class _FleetPoint:
+    """(x, y) vehicle attribute stored in two FleetKinematics arrays; NaN means None"""
+
+    def __init__(self, x_array, y_array):
+        self.x_array = x_array
+        self.y_array = y_array
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        x = getattr(obj.kinematics, self.x_array)[obj.slot]
+        if math.isnan(x):
+            return None
+        return (float(x), float(getattr(obj.kinematics, self.y_array)[obj.slot]))
+
+    def __set__(self, obj, value):
+        x, y = (math.nan, math.nan) if value is None else value
+        getattr(obj.kinematics, self.x_array)[obj.slot] = x
+        getattr(obj.kinematics, self.y_array)[obj.slot] = y
+
+
+class FleetVehicleAssistant(VehicleAssistant):
+    """Vehicle whose motion state lives in a shared FleetKinematics engine
+
+    Decisions (obstacles, parking, turn selection, despawning) are the same
+    as VehicleAssistant's. The difference is that the kinematic attributes
+    are views into the engine's arrays, and a step along the road or the turn
+    arc is queued instead of applied. The engine then moves the whole fleet
+    at once after every vehicle has handled its Move message.
+    """
+
+    x = _FleetField("x", float)
+    y = _FleetField("y", float)
+    current_position = _FleetField("road", int)
+    movement_progress = _FleetField("progress", float)
+    movement_step = _FleetField("step_size", float)
+    is_turning = _FleetField("turning", bool)
+    turn_progress = _FleetField("turn_progress", float)
+    next_road_idx = _FleetField("next_road", int, none=-1)
+    turn_origin = _FleetPoint("origin_x", "origin_y")
+    turn_target = _FleetPoint("target_x", "target_y")
+    current_wait = _FleetField("wait", int)
+
+    def __init__(self, name, *args, kinematics, **kwargs):
+        # The slot must exist before VehicleAssistant.__init__ assigns the fields above
+        self.kinematics = kinematics
+        self.slot = kinematics.add(self)
+        super().__init__(name, *args, **kwargs)
+
+    async def _advance(self):
+        self.kinematics.queue_advance(self.slot)
+        return f"Vehicle moving along road segment {self.current_position}"
+
+    async def _advance_turn(self):
+        self.kinematics.queue_turn(self.slot)
+        return f"Vehicle turning to road {self.next_road_idx}"
+
+    async def on_road_end(self):
+        """Called by the engine when this vehicle's queued step reached the end of its road"""
+        response = await self._reach_road_end()
+        logger.debug("%s => %s", self.name, response)
+
+    def on_turn_complete(self):
+        """Called by the engine when this vehicle's queued step finished its turn"""
+        response = self._complete_turn()
+        logger.debug("%s => %s", self.name, response)
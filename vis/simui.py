@@ -3,6 +3,8 @@ from tkinter import ttk
 import asyncio
 from tkinter import scrolledtext
 import math
+from sim.log import get_logger
+from sim.stats import RunningStats
 
 # Define some basic styling constants
 BG_COLOR = "#f0f0f0"
@@ -14,6 +16,8 @@ LABEL_FONT = ("Arial", 11, "bold")
 INFO_FONT = ("Arial", 9)
 STATUS_FONT = ("Arial", 10)
 
+logger = get_logger("vis")
+
 class MapObject:
     def __init__(self, id, x, y):
         self.id = id
@@ -163,8 +167,8 @@ class VehicleObject(MapObject):
                     color = "#2980b9"
                 elif hasattr(self.agent, 'parked') and self.agent.parked:
                     color = "#8e44ad"
-                elif hasattr(self.agent, 'wait_times') and sum(self.agent.wait_times) > 0:
-                    wait_level = min(sum(self.agent.wait_times), 5)
+                elif hasattr(self.agent, 'wait_stats') and self.agent.wait_stats.total > 0:
+                    wait_level = min(self.agent.wait_stats.total, 5)
                     if wait_level > 2:
                         color = "#f39c12"
                     else:
@@ -293,15 +297,16 @@ class PedestrianCrossingObject(MapObject):
             canvas.create_text(sx, sy - text_offset, text=f"{self.id} (no agent)", font=("Arial", font_size), fill=TEXT_COLOR)
 
 class TrafficSimulationVisualizer:
-    def __init__(self, width=1300, height=750, info_panel_width=250):
-        print("Vis __init__: Start")
+    def __init__(self, width=1300, height=750, info_panel_width=250, occupancy=None):
+        logger.debug("Vis __init__: Start")
         self.running = True
         self.objects = []
-        print("Vis __init__: Creating root window")
+        self.occupancy = occupancy  # shared RoadOccupancy index, if the simulation provides one
+        logger.debug("Vis __init__: Creating root window")
         self.root = tk.Tk()
         self.root.title("Traffic Simulation")
         self.root.configure(bg=BG_COLOR)
-        print("Vis __init__: Configuring styles")
+        logger.debug("Vis __init__: Configuring styles")
         style = ttk.Style(self.root)
         style.theme_use('clam')
 
@@ -321,7 +326,7 @@ class TrafficSimulationVisualizer:
         y_cordinate = int((screen_height/2) - (height)/2)
         self.root.geometry(f"{width}x{height}+{x_cordinate}+{y_cordinate}")
 
-        print("Vis __init__: Setting up grid layout")
+        logger.debug("Vis __init__: Setting up grid layout")
         self.root.grid_rowconfigure(1, weight=1)
         self.root.grid_columnconfigure(1, weight=1)
 
@@ -351,7 +356,7 @@ class TrafficSimulationVisualizer:
         self.canvas_frame.grid_rowconfigure(0, weight=1)
         self.canvas_frame.grid_columnconfigure(0, weight=1)
 
-        print("Vis __init__: Creating canvas")
+        logger.debug("Vis __init__: Creating canvas")
         self.canvas = tk.Canvas(self.canvas_frame, bg=CANVAS_BG, highlightthickness=0)
         self.canvas.grid(row=0, column=0, sticky="nsew", padx=1, pady=1)
         self.canvas_width = 1
@@ -377,7 +382,7 @@ class TrafficSimulationVisualizer:
         self.status_label = ttk.Label(self.bottom_frame, text="Simulation Status: Initializing...", style="Status.TLabel")
         self.status_label.grid(row=0, column=0, sticky="w", padx=5)
 
-        print("Vis __init__: Initializing attributes (zoom, pan, etc.)")
+        logger.debug("Vis __init__: Initializing attributes (zoom, pan, etc.)")
         self.road_objects = {}
         self.offset_x = 0
         self.offset_y = 0
@@ -394,7 +399,7 @@ class TrafficSimulationVisualizer:
         self.canvas.bind("<B1-Motion>", self._pan_move_left)
         self.canvas.bind("<ButtonRelease-1>", self._pan_end_left)
 
-        print("Vis __init__: Binding events")
+        logger.debug("Vis __init__: Binding events")
         self.root.bind("<Configure>", self._on_resize)
         self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
         self.canvas.bind("<Button-4>", self._on_mouse_wheel)
@@ -407,7 +412,7 @@ class TrafficSimulationVisualizer:
         self.canvas.bind("<ButtonPress-2>", self._pan_start)
         self.canvas.bind("<B2-Motion>", self._pan_move)
         self.canvas.bind("<ButtonRelease-2>", self._pan_end)
-        print("Vis __init__: End")
+        logger.debug("Vis __init__: End")
 
     def _pan_start(self, event):
         self.canvas.config(cursor="fleur")
@@ -479,19 +484,19 @@ class TrafficSimulationVisualizer:
         return func
 
     def _update_canvas_dimensions(self):
-        print("Vis _update_canvas_dimensions: Start")
+        logger.debug("Vis _update_canvas_dimensions: Start")
         self.root.update_idletasks()
         new_width = self.canvas.winfo_width()
         new_height = self.canvas.winfo_height()
-        print(f"Vis _update_canvas_dimensions: new_width={new_width}, new_height={new_height}")
+        logger.debug("Vis _update_canvas_dimensions: new_width=%s, new_height=%s", new_width, new_height)
         if new_width > 1 and new_height > 1 and (new_width != self.canvas_width or new_height != self.canvas_height):
-            print(f"Vis _update_canvas_dimensions: Canvas resized to: {new_width}x{new_height}")
+            logger.debug("Vis _update_canvas_dimensions: Canvas resized to: %sx%s", new_width, new_height)
             self.canvas_width = new_width
             self.canvas_height = new_height
             self._calculate_map_center(preserve_logical_center=True)
-            print("Vis _update_canvas_dimensions: End (resized)")
+            logger.debug("Vis _update_canvas_dimensions: End (resized)")
             return True
-        print("Vis _update_canvas_dimensions: End (no resize)")
+        logger.debug("Vis _update_canvas_dimensions: End (no resize)")
         return False
 
     def _on_resize(self, event=None):
@@ -529,13 +534,13 @@ class TrafficSimulationVisualizer:
             self._calculate_map_center(preserve_logical_center=False)
 
     async def run(self):
-        print("Vis run: Start")
+        logger.debug("Vis run: Start")
         self.status_label.config(text="Simulation Status: Running")
         self._calculate_map_center(preserve_logical_center=False)
 
         interp_factor = 0.2
 
-        print("Vis run: Entering main loop")
+        logger.debug("Vis run: Entering main loop")
         frame_count = 0
         while self.running:
             frame_count += 1
@@ -581,9 +586,7 @@ class TrafficSimulationVisualizer:
                 await asyncio.sleep(0.03)
 
             except Exception as e:
-                print(f"!!!!!!!! ERROR IN VIS RUN LOOP !!!!!!!!")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error in visualizer run loop")
                 self.running = False
                 self.status_label.config(text=f"Simulation Status: ERROR - {e}")
                 break
@@ -595,25 +598,29 @@ class TrafficSimulationVisualizer:
             pass
 
     def _calculate_map_center(self, preserve_logical_center=False):
-        print(f"Vis _calculate_map_center: Start (preserve={preserve_logical_center})")
+        logger.debug("Vis _calculate_map_center: Start (preserve=%s)", preserve_logical_center)
         if not preserve_logical_center:
             if not self.objects or self.min_x == float('inf') or self.max_x == float('-inf'):
                 self.logical_center_x = 0
                 self.logical_center_y = 0
-                print("Vis _calculate_map_center: No objects/bounds, center set to (0,0)")
+                logger.debug("Vis _calculate_map_center: No objects/bounds, center set to (0,0)")
             else:
                 self.logical_center_x = (self.min_x + self.max_x) / 2
                 self.logical_center_y = (self.min_y + self.max_y) / 2
-                print(f"Vis _calculate_map_center: Bounds calculated, center set to ({self.logical_center_x:.1f},{self.logical_center_y:.1f})")
+                logger.debug("Vis _calculate_map_center: Bounds calculated, center set to (%.1f,%.1f)", self.logical_center_x, self.logical_center_y)
 
         canvas_center_x = self.canvas_width / 2
         canvas_center_y = self.canvas_height / 2
 
         self.offset_x = canvas_center_x
         self.offset_y = canvas_center_y
-        print(f"Vis _calculate_map_center: End - Offset=({self.offset_x:.1f},{self.offset_y:.1f}), Zoom={self.zoom_level:.2f}")
+        logger.debug("Vis _calculate_map_center: End - Offset=(%.1f,%.1f), Zoom=%.2f", self.offset_x, self.offset_y, self.zoom_level)
 
     def update_road_vehicle_counts(self):
+        if self.occupancy is not None:
+            for road_id, road_obj in self.road_objects.items():
+                road_obj.current_vehicles = self.occupancy.count_by_id(road_id)
+            return
         for road_obj in self.road_objects.values():
             road_obj.current_vehicles = 0
         for obj in self.objects:
@@ -630,14 +637,14 @@ class TrafficSimulationVisualizer:
 
     def draw_background(self):
         if self.zoom_level <= 0:
-            print("Vis draw_background: WARNING - zoom_level is zero or negative!")
+            logger.warning("Vis draw_background: zoom_level is zero or negative!")
             return
 
         base_grid_spacing = 50
         grid_spacing = max(0.1, base_grid_spacing * self.zoom_level)
 
         if abs(self.zoom_level) < 1e-9:
-            print("Vis draw_background: Zoom level too small, skipping grid draw.")
+            logger.debug("Vis draw_background: Zoom level too small, skipping grid draw.")
             return
 
         top_left_lx = self.logical_center_x + (0 - self.offset_x) / self.zoom_level
@@ -762,7 +769,7 @@ async def main():
     print("Main: Visualizer created")
 
     class DummyAgent: pass
-    class DummyVehicleAgent(DummyAgent): x, y, wait_times, parking_state, current_position, roads, movement_progress, target_parking = 50, 50, [0], "driving", 0, [(0,0,200,0, 2, 'R1')], 0.5, "P1"
+    class DummyVehicleAgent(DummyAgent): x, y, wait_stats, parking_state, current_position, roads, movement_progress, target_parking = 50, 50, RunningStats(), "driving", 0, [(0,0,200,0, 2, 'R1')], 0.5, "P1"
     class DummyParkingAgent(DummyAgent): current_occupancy, capacity, is_full = 1, 5, False
     class DummyTLAgent(DummyAgent): state = "GREEN"
     class DummyCrossingAgent(DummyAgent): is_occupied = False